@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the binary recording format against DataFrame.to_csv / pd.read_csv.
+
+Run from the repository folder:
+    python -m Benchmarks.bench_binary_recording --samples 10000000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from Press_Controller.Binary_Recording import Binary_Recording, write_recording
+from Press_Controller.Sample_Store import Sample_Store
+
+
+def timed(function):
+    t0 = time.perf_counter()
+    result = function()
+    return time.perf_counter() - t0, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=10000000)
+    parser.add_argument("--dir", default=None, help="folder for the test files (a temporary one by default)")
+    args = parser.parse_args()
+
+    n = args.samples
+    start_epoch = time.time()
+    time_sec = np.arange(n) / 80.0
+    force = np.random.default_rng(0).normal(2, 0.1, n)
+    df = pd.DataFrame({"Date": Sample_Store.epoch_to_date(start_epoch + time_sec),
+                       "Time_sec": time_sec,
+                       "Force_kN": force})
+
+    folder = args.dir or tempfile.mkdtemp()
+    csv_path = os.path.join(folder, "bench.csv")
+    bin_path = os.path.join(folder, "bench.prec")
+
+    csv_write, _ = timed(lambda: df.to_csv(csv_path, index=False))
+    bin_write, _ = timed(lambda: write_recording(bin_path, time_sec, force, start_epoch, sample_rate=80.0))
+    csv_read, _ = timed(lambda: pd.read_csv(csv_path))
+    bin_open, rec = timed(lambda: Binary_Recording(bin_path))
+    # Touch every value so the pages are really loaded
+    bin_read, _ = timed(lambda: (float(rec.time_sec.sum()), float(rec.force.sum())))
+
+    for name, write, read, path in (("csv", csv_write, csv_read, csv_path),
+                                    ("binary", bin_write, bin_open + bin_read, bin_path)):
+        size = os.path.getsize(path)
+        print("format={}, samples={}, write_s={:.3f}, write_samples_per_s={:.0f}, load_s={:.3f}, size_mb={:.1f}"
+              .format(name, n, write, n / write, read, size / 2**20))
+    print("binary open (memory map only) s={:.6f}".format(bin_open))
+
+    if args.dir is None:
+        os.remove(csv_path)
+        del rec
+        os.remove(bin_path)
+        os.rmdir(folder)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the filter stage: cost per reading, noise reduction on the recorded csv files and the delay every
+filter adds to a step of force.
+
+Run from the repository folder:
+    python -m Benchmarks.bench_filters --recordings Recordings
+"""
+import argparse
+import glob
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from Press_Controller.Filters import (Moving_Average, Median_Filter, Outlier_Rejection, Exponential_Smoothing,
+                                      Low_Pass, SCIPY_IMPORT)
+
+
+def filters():
+    return {"moving_average_15": lambda: Moving_Average(15),
+            "median_5": lambda: Median_Filter(5),
+            "outlier_7": lambda: Outlier_Rejection(7),
+            "exponential_0.2": lambda: Exponential_Smoothing(0.2),
+            "lowpass_5Hz": lambda: Low_Pass(5, 80)}
+
+
+def load_recordings(folder):
+    series = []
+    for path in sorted(glob.glob(os.path.join(folder, "*.csv"))):
+        df = pd.read_csv(path)
+        force = pd.to_numeric(df.get("Force_kN"), errors="coerce").dropna().to_numpy()
+        if len(force) > 1:
+            series.append(force)
+    return series
+
+
+def cost_per_reading(make, block, n=200000):
+    stream = np.random.default_rng(0).normal(0, 1, n)
+    f = make()
+    t0 = time.perf_counter()
+    for i in range(0, n, block):
+        f.process(stream[i:i + block])
+    return (time.perf_counter() - t0) / n * 1e6
+
+
+def step_delay(make, rate=80.0):
+    # Seconds until the output reaches 90% of a 1 kN step
+    x = np.concatenate((np.zeros(80), np.ones(400)))
+    y = make().process(x)
+    return (np.argmax(y[80:] >= 0.9)) / rate
+
+
+def noise_reduction(make, series):
+    # Ratio between the sample to sample variation after and before the filter (lower is smoother)
+    before, after = [], []
+    for force in series:
+        before.append(np.diff(force))
+        after.append(np.diff(make().process(force)))
+    before, after = np.concatenate(before), np.concatenate(after)
+    return float(np.std(after) / np.std(before))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--recordings", default="Recordings")
+    args = parser.parse_args()
+
+    series = load_recordings(args.recordings)
+    print("scipy lfilter:", SCIPY_IMPORT, "recordings:", len(series), "samples:", sum(len(s) for s in series))
+    for name, make in filters().items():
+        result = {"filter": name,
+                  "us_per_reading_block1": cost_per_reading(make, 1, 20000),
+                  "us_per_reading_block64": cost_per_reading(make, 64),
+                  "step_delay_90_s": step_delay(make),
+                  "noise_ratio": noise_reduction(make, series) if series else None}
+        print(", ".join("{}={}".format(k, round(v, 3) if isinstance(v, float) else v) for k, v in result.items()))
+
+
+if __name__ == "__main__":
+    main()
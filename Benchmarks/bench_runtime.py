@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Comparison of the two runtimes of the Press_Service (thread workers and asyncio) on the simulated press: CPU used
+by the process, rate and lateness of the control steps and of the recording, while both are running.
+
+Run from the repository folder (on the Raspberry Pi to compare the real costs):
+    python -m Benchmarks.bench_runtime --seconds 10 --record 0.01
+"""
+import argparse
+import resource
+import shutil
+import tempfile
+import time
+
+import matplotlib
+matplotlib.use("Agg")
+
+from Press_Controller.Metrics import METRICS
+from Press_Controller.Press_Controller import Press_Service
+
+
+def cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run(runtime, seconds, record_period, setpoint, folder):
+    service = Press_Service(is_Dummy=True, runtime=runtime)
+    service.set_folder(folder)
+    service.setup_init()
+    idle_start = cpu_seconds()
+    time.sleep(seconds / 2)
+    idle = (cpu_seconds() - idle_start) / (seconds / 2)
+
+    METRICS.reset()
+    METRICS.enable()
+    service.start_record(record_period)
+    service.start_force(setpoint)
+    steps = service.station().controller.steps
+    busy_start = cpu_seconds()
+    time.sleep(seconds)
+    busy = (cpu_seconds() - busy_start) / seconds
+    steps = service.station().controller.steps - steps
+    recording = service.pause_record()
+    snapshot = METRICS.snapshot()
+    METRICS.disable()
+    service.shutdown()
+
+    histograms = snapshot["histograms"]
+
+    def p99(name):
+        h = histograms.get(name)
+        return None if h is None else h["p99_us"]
+
+    return {"runtime": runtime,
+            "idle_cpu_percent": idle * 100,
+            "busy_cpu_percent": busy * 100,
+            "control_steps_per_s": steps / seconds,
+            "control_step_p99_us": p99("control_step"),
+            "control_late_p99_us": p99("late_force"),
+            "record_late_p99_us": p99("late_timer"),
+            "record_rate": recording["achieved_rate"] if recording else None,
+            "record_jitter_us": recording["jitter"] * 1e6 if recording else None,
+            "record_missed": recording["missed"] if recording else None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=5.0, help="duration of every measurement")
+    parser.add_argument("--record", type=float, default=0.0125, help="recording period in seconds")
+    parser.add_argument("--setpoint", type=float, default=3.0, help="force of the control in kN")
+    parser.add_argument("--runtimes", default="threads,asyncio")
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp(prefix="press_bench_")
+    try:
+        for runtime in args.runtimes.split(","):
+            row = run(runtime, args.seconds, args.record, args.setpoint, folder)
+            print(", ".join("{}={}".format(k, round(v, 3) if isinstance(v, float) else v) for k, v in row.items()),
+                  flush=True)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
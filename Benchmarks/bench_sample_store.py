@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the recording path: the old one-row DataFrame + pd.concat per sample against the Sample_Store.
+Every path runs in its own process so the peak RSS reported belongs to that path only.
+
+Run from the repository folder:
+    python -m Benchmarks.bench_sample_store --samples 1000000 --old-samples 20000
+
+The old path is O(n^2), so recording the full 1M samples through it takes hours on a desktop. By default it is
+stopped at --old-samples and the per-sample cost reported is the one measured at that length (it only gets worse).
+"""
+import argparse
+import multiprocessing as mp
+import resource
+import time
+
+import numpy as np
+import pandas as pd
+
+from Press_Controller.Sample_Store import Sample_Store
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def old_path(n, forces, out):
+    df = pd.DataFrame(columns=["Date", "Time_sec", "Force_kN"])
+    t0 = time.perf_counter()
+    for i in range(n):
+        df_temp = pd.DataFrame({"Date": [time.ctime()], "Time_sec": [i * 0.0125], "Force_kN": [forces[i]]})
+        df = pd.concat([df, df_temp], ignore_index=True)
+    elapsed = time.perf_counter() - t0
+    out.put({"path": "pd.concat", "samples": n, "total_s": elapsed, "per_sample_us": elapsed / n * 1e6,
+             "peak_rss_mb": peak_rss_mb()})
+
+
+def new_path(n, forces, out):
+    store = Sample_Store()
+    t0 = time.perf_counter()
+    for i in range(n):
+        store.append(i * 0.0125, forces[i], time.time())
+    elapsed = time.perf_counter() - t0
+    t1 = time.perf_counter()
+    df = store.to_dataframe()
+    convert = time.perf_counter() - t1
+    out.put({"path": "Sample_Store", "samples": n, "total_s": elapsed, "per_sample_us": elapsed / n * 1e6,
+             "to_dataframe_s": convert, "rows": len(df), "peak_rss_mb": peak_rss_mb()})
+
+
+def run(target, n, forces):
+    out = mp.Queue()
+    p = mp.Process(target=target, args=(n, forces, out))
+    p.start()
+    result = out.get()
+    p.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=1000000, help="samples recorded through the new path")
+    parser.add_argument("--old-samples", type=int, default=20000, help="samples recorded through the old path")
+    args = parser.parse_args()
+
+    forces = np.random.default_rng(0).normal(2, 0.1, max(args.samples, args.old_samples))
+    for target, n in ((old_path, args.old_samples), (new_path, args.samples)):
+        result = run(target, n, forces)
+        print(", ".join("{}={}".format(k, round(v, 3) if isinstance(v, float) else v) for k, v in result.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the force control on the simulated press (no Raspberry Pi needed): response to a step of force for
+several PID gains and how many times faster than real time the simulation runs.
+
+Run from the repository folder:
+    python -m Benchmarks.bench_simulation --setpoint 5 --duration 30
+"""
+import argparse
+
+import numpy as np
+
+from Press_Controller.Control import PID
+from Press_Controller.Simulator import Press_Simulation
+
+
+def gains():
+    return {"default": {},
+            "soft": {"kp": 1000, "ki": 250},
+            "stiff": {"kp": 4000, "ki": 1000},
+            "pd": {"kp": 2000, "ki": 500, "kd": 50}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--setpoint", type=float, default=5.0)
+    parser.add_argument("--duration", type=float, default=30.0, help="simulated seconds")
+    parser.add_argument("--noise", type=float, default=2000, help="noise of the load cell in raw counts")
+    args = parser.parse_args()
+
+    for name, kwargs in gains().items():
+        simulation = Press_Simulation(pid=PID(**kwargs), noise=args.noise)
+        result = simulation.run(setpoint=args.setpoint, duration=args.duration)
+        report = simulation.controller.report()
+        last = result["time"] > args.duration / 2
+        error = result["force"][last] - args.setpoint
+        row = {"gains": name,
+               "rise_time_s": report["rise_time"],
+               "overshoot_percent": report["overshoot_percent"],
+               "settle_time_s": report["settle_time"],
+               "steady_error_kN": float(np.mean(np.abs(error))) if error.size else None,
+               "control_steps": simulation.controller.steps,
+               "speedup": simulation.speedup}
+        print(", ".join("{}={}".format(k, round(v, 3) if isinstance(v, float) else v) for k, v in row.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Startup time of the press controller, every run in a new Python process so nothing is already imported:
+
+    heavy        import of pandas and matplotlib.pyplot alone, what the start used to load before the window
+    import       import of Press_Controller.Press_Controller
+    service      import, hardware (simulated press) ready, threads started and first reading of the load cell
+    gui          time to interactive of the window (window built, main loop running) and service ready; it needs a
+                 display and is skipped without one
+
+The times are the medians in seconds since the start of the measure (Startup.STARTUP), "process" is the whole
+process seen from outside (includes starting Python). "lazy" says if pandas and matplotlib stayed unloaded. The
+probes only import the standard library before the measure starts.
+
+Run from the repository folder (on the Raspberry Pi to see the real times):
+    python -m Benchmarks.bench_startup --repeat 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+cases = ("heavy", "import", "service", "gui")
+
+
+def lazy():
+    return "pandas" not in sys.modules and "matplotlib" not in sys.modules
+
+
+def probe(case):
+    """
+    One measure, run in the new process. It prints a json line with the times
+    """
+    from Press_Controller.Startup import STARTUP
+
+    if case == "heavy":
+        import pandas
+        import matplotlib.pyplot
+        STARTUP.mark("imports")
+        return {"marks": STARTUP.as_dict(), "lazy": False}
+
+    import Press_Controller.Press_Controller as ps
+    STARTUP.mark("imports")
+    if case == "import":
+        return {"marks": STARTUP.as_dict(), "lazy": lazy()}
+
+    if case == "service":
+        service = ps.Press_Service(is_Dummy=True, catalogue=False)
+        STARTUP.mark("hardware")
+        service.setup_init()
+        STARTUP.mark("ready")
+        service.station().balance.wait_new_sample(0, timeout=5.0)
+        STARTUP.mark("first_reading")
+        result = {"marks": STARTUP.as_dict(), "lazy": lazy()}
+        service.shutdown()
+        return result
+
+    interface = ps.Interface(is_Dummy=True, catalogue=False)
+    mark = STARTUP.mark
+
+    result = {}
+
+    def close_when_ready(name):
+        elapsed = mark(name)
+        if name == "ready":
+            # Called from the Tk main loop: the window can be closed from here
+            result["lazy"] = lazy()
+            interface.parent.after(100, interface.parent.destroy)
+        return elapsed
+
+    STARTUP.mark = close_when_ready
+    interface.setup()
+    result["marks"] = STARTUP.as_dict()
+    return result
+
+
+def run(case):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-m", "Benchmarks.bench_startup", "--probe", case],
+                            capture_output=True, text=True, timeout=120)
+    process = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(case + " failed:\n" + result.stderr[-2000:])
+    line = [line for line in result.stdout.splitlines() if line.startswith("{")][-1]
+    row = json.loads(line)
+    row["marks"]["process"] = process
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", default=",".join(cases))
+    parser.add_argument("--repeat", type=int, default=5, help="processes started for every case")
+    parser.add_argument("--probe", default=None, choices=cases, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.probe:
+        print(json.dumps(probe(args.probe)), flush=True)
+        return
+
+    for case in args.cases.split(","):
+        if case == "gui" and os.name != "nt" and not os.environ.get("DISPLAY"):
+            print("case=gui skipped, no display")
+            continue
+        rows = [run(case) for _ in range(args.repeat)]
+        names = []
+        for row in rows:
+            names += [name for name in row["marks"] if name not in names]
+        summary = {"case": case, "lazy": all(row["lazy"] for row in rows)}
+        for name in names:
+            summary[name] = float(statistics.median([row["marks"][name] for row in rows if name in row["marks"]]))
+        print(", ".join("{}={}".format(k, round(v, 3) if isinstance(v, float) else v) for k, v in summary.items()),
+              flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Benchmarks of the hot paths on the simulated hardware, at increasing recording lengths and sample rates:
+
+    update   publishing the readings to the listeners (GUI) and the rate the update thread achieves
+    timer    recording one sample (Sample_Store + writer queue) as the recording grows
+    force    one step of the force control on the simulated press
+    save     saving the recording (csv and binary) as it grows
+    plot     one refresh of the live plot (min/max decimation and redraw of the lines)
+    window   "last hour at 1 s" from the min/max/mean bins of the store, and the memory the store keeps
+
+Every result has the throughput, p50/p99 latency and the memory of the process. The results can be saved as json
+and compared with a previous run, the benchmark then fails if a p99 got worse than the tolerance:
+
+    python -m Benchmarks.bench_suite --json results.json
+    python -m Benchmarks.bench_suite --baseline results.json --tolerance 0.5
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import matplotlib
+matplotlib.use("Agg")
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from Press_Controller.Press_Controller import Press_Service, Station
+from Press_Controller.Live_Plot import Minmax_Decimator
+from Press_Controller.Sample_Store import Sample_Store
+from Press_Controller.Simulator import Press_Simulation
+
+
+def rss_mb():
+    """
+    Current resident memory of the process in MB
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        # ru_maxrss is the peak, in kB on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+def result(path, latencies, **params):
+    """
+    Summary of the latencies of one case
+    Args:
+        path: (str) name of the path
+        latencies: list of seconds
+        **params: parameters of the case and other measurements
+    Returns:
+        dict
+    """
+    latencies = np.asarray(latencies, dtype=np.float64)
+    row = {"path": path}
+    row.update(params)
+    row.update({"n": int(latencies.size),
+                "throughput_per_s": float(latencies.size / latencies.sum()) if latencies.sum() > 0 else None,
+                "p50_us": float(np.percentile(latencies, 50) * 1e6),
+                "p99_us": float(np.percentile(latencies, 99) * 1e6),
+                "max_us": float(latencies.max() * 1e6),
+                "rss_mb": rss_mb()})
+    return row
+
+
+def timed(function, n):
+    latencies = np.empty(n)
+    for i in range(n):
+        t0 = time.perf_counter()
+        function()
+        latencies[i] = time.perf_counter() - t0
+    return latencies
+
+
+def fill(samples, length, rate):
+    # Recording of `length` samples taken at `rate` Hz
+    t = np.arange(length) / rate
+    samples.extend(t, 1 + 0.01 * np.sin(t), time.time() + t, np.full(length, np.nan))
+
+
+def bench_update(rates, seconds):
+    for rate in rates:
+        service = Press_Service(is_Dummy=True, publish_rate=rate)
+        received = []
+        service.add_listener(lambda topic, value: received.append(topic))
+        latencies = timed(service.publish, 2000)
+        received.clear()
+        service.run()
+        time.sleep(seconds)
+        service.stop()
+        stats = service.update_worker.scheduler.stats()
+        yield result("update", latencies, rate_hz=rate,
+                     achieved_rate_hz=stats["achieved_rate"], missed=stats["missed"], jitter_s=stats["jitter"])
+        service.shutdown()
+
+
+def bench_timer(lengths, rate, folder):
+    station = Station(is_Dummy=True)
+    station.dir_name = folder
+    for length in lengths:
+        station.clear_record()
+        fill(station.samples, length, rate)
+        station.open_writer()
+        latencies = timed(station.record_sample, 2000)
+        station.close_writer()
+        yield result("timer", latencies, length=length, store_mb=len(station.samples) * 32 / 2**20)
+    station.stop_all()
+    station.balance.stop()
+
+
+def bench_force(rates, seconds):
+    for rate in rates:
+        simulation = Press_Simulation(sensor_rate=rate)
+        controller = simulation.controller
+        latencies = []
+        original = controller.poll
+
+        def poll(setpoint, timeout=1.0):
+            t0 = time.perf_counter()
+            output = original(setpoint, timeout)
+            latencies.append(time.perf_counter() - t0)
+            return output
+
+        controller.poll = poll
+        simulation.run(setpoint=5, duration=seconds)
+        yield result("force", latencies, sensor_rate_hz=rate, speedup=simulation.speedup)
+
+
+def bench_save(lengths, rate, folder):
+    station = Station(is_Dummy=True)
+    station.dir_name = folder
+    for length in lengths:
+        station.clear_record()
+        fill(station.samples, length, rate)
+        for save_format in ("csv", "binary"):
+            station.save_format = save_format
+            latencies = []
+            for _ in range(3):
+                t0 = time.perf_counter()
+                files = station.save_data()
+                latencies.append(time.perf_counter() - t0)
+                size = sum(os.path.getsize(f) for f in files)
+                for f in files:
+                    os.remove(f)
+            yield result("save", latencies, length=length, format=save_format, file_mb=size / 2**20)
+    station.stop_all()
+    station.balance.stop()
+
+
+def bench_plot(lengths, rates, fps=5, frames=50):
+    for length in lengths:
+        for rate in rates:
+            figure = Figure(figsize=(7, 3))
+            canvas = FigureCanvasAgg(figure)
+            ax = figure.add_subplot(111)
+            line, = ax.plot([], [], animated=True)
+            decimator = Minmax_Decimator()
+            t = np.arange(length) / rate
+            decimator.add(t, np.sin(t))
+            ax.set_xlim(0, (length + frames * rate / fps) / rate)
+            ax.set_ylim(-1.5, 1.5)
+            canvas.draw()
+            background = canvas.copy_from_bbox(ax.bbox)
+            new = max(1, int(rate / fps))
+            start = length
+
+            def frame():
+                nonlocal start
+                x = np.arange(start, start + new) / rate
+                start += new
+                decimator.add(x, np.sin(x))
+                line.set_data(*decimator.line_data())
+                canvas.restore_region(background)
+                ax.draw_artist(line)
+                canvas.blit(ax.bbox)
+
+            latencies = timed(frame, frames)
+            yield result("plot", latencies, length=length, rate_hz=rate, points=2 * len(decimator))
+
+
+def bench_window(lengths, rate):
+    for length in lengths:
+        samples = Sample_Store(max_samples=2 ** 20, pyramid=True)
+        fill(samples, length, rate)
+        latencies = timed(lambda: samples.window(3600, 1), 200)
+        store_mb = (samples.capacity * 32 + samples.pyramid.nbytes) / 2**20
+        yield result("window", latencies, length=length, rate_hz=rate, bins=len(samples.window(3600, 1)["time"]),
+                     store_mb=store_mb)
+
+
+def compare(rows, baseline, tolerance):
+    """
+    Compare the p99 of every case with a previous run
+    Returns:
+        List of the cases that got worse than the tolerance
+    """
+    def key(row):
+        return tuple(sorted((k, v) for k, v in row.items() if k in ("path", "length", "rate_hz", "sensor_rate_hz",
+                                                                    "format")))
+    previous = {key(row): row for row in baseline}
+    worse = []
+    for row in rows:
+        old = previous.get(key(row))
+        if old is not None and row["p99_us"] > old["p99_us"] * (1 + tolerance):
+            worse.append((row, old))
+    return worse
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paths", default="update,timer,force,save,plot,window")
+    parser.add_argument("--lengths", default="1000,100000,1000000", help="recording lengths in samples")
+    parser.add_argument("--rates", default="10,80,320", help="sample rates in Hz")
+    parser.add_argument("--seconds", type=float, default=2.0, help="duration of the timed runs")
+    parser.add_argument("--json", default=None, help="save the results in this file")
+    parser.add_argument("--baseline", default=None, help="json of a previous run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed increase of the p99 (0.5 = 50%%)")
+    args = parser.parse_args()
+
+    paths = args.paths.split(",")
+    lengths = [int(v) for v in args.lengths.split(",")]
+    rates = [float(v) for v in args.rates.split(",")]
+    folder = tempfile.mkdtemp(prefix="press_bench_")
+    benches = {"update": lambda: bench_update(rates, args.seconds),
+               "timer": lambda: bench_timer(lengths, rates[-1], folder),
+               "force": lambda: bench_force(rates, args.seconds * 10),
+               "save": lambda: bench_save(lengths, rates[-1], folder),
+               "plot": lambda: bench_plot(lengths, rates),
+               "window": lambda: bench_window(lengths, rates[-1])}
+    rows = []
+    try:
+        for path in paths:
+            for row in benches[path]():
+                rows.append(row)
+                print(", ".join("{}={}".format(k, round(v, 3) if isinstance(v, float) else v)
+                                for k, v in row.items()), flush=True)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"machine": platform.machine(), "python": platform.python_version(), "time": time.time(),
+                       "results": rows}, f, indent=1)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        worse = compare(rows, baseline, args.tolerance)
+        for row, old in worse:
+            print("REGRESSION:", row["path"], {k: v for k, v in row.items() if k in ("length", "rate_hz", "format")},
+                  "p99 {:.1f} us -> {:.1f} us".format(old["p99_us"], row["p99_us"]))
+        if worse:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+# Import relevant packages
+import threading
+import time
+
+import numpy as np
+
+from .Metrics import METRICS
+
+
+class Sample_Buffer:
+    """
+    Ring buffer of timestamped raw readings written by one acquisition thread. The writer never takes a lock: it
+    fills the slot and then publishes it by incrementing `count`, so readers only look at published slots
+    """
+    def __init__(self, size=4096):
+        """
+        Initialize the class with global variables
+        Args:
+            size: (int) number of readings kept. Windows asked to the buffer should be much smaller than this
+        """
+        self.size = int(size)
+        self.times = np.zeros(self.size, dtype=np.float64)
+        self.values = np.zeros(self.size, dtype=np.float64)
+        self.count = 0  # number of readings ever pushed
+        self.new_sample = threading.Condition()
+
+    def push(self, t, value):
+        """
+        Add a reading (only called by the acquisition thread)
+        Args:
+            t: (float) time.perf_counter() of the reading
+            value: (float) raw value
+        Returns:
+        """
+        i = self.count % self.size
+        self.times[i] = t
+        self.values[i] = value
+        self.count += 1
+        with self.new_sample:
+            self.new_sample.notify_all()
+
+    def push_block(self, times, values):
+        """
+        Add several readings at once (only called by the acquisition thread)
+        Args:
+            times: (array) time of every reading
+            values: (array) raw values
+        Returns:
+        """
+        n = len(values)
+        if n == 0:
+            return
+        idx = (self.count + np.arange(n)) % self.size
+        self.times[idx] = times
+        self.values[idx] = values
+        self.count += n
+        with self.new_sample:
+            self.new_sample.notify_all()
+
+    def latest(self):
+        """
+        Newest reading
+        Returns:
+            (time, value) or None if nothing was read yet
+        """
+        count = self.count
+        if count == 0:
+            return None
+        i = (count - 1) % self.size
+        return self.times[i], self.values[i]
+
+    def window(self, n):
+        """
+        Last n readings, oldest first
+        Args:
+            n: (int) number of readings
+        Returns:
+            (times, values) copies of the readings
+        """
+        count = self.count
+        n = min(n, count, self.size)
+        idx = (count - n + np.arange(n)) % self.size
+        return self.times[idx], self.values[idx]
+
+    def since(self, t):
+        """
+        Readings taken after time t (limited to the size of the buffer)
+        Args:
+            t: (float) time.perf_counter() value
+        Returns:
+            (times, values)
+        """
+        times, values = self.window(self.size)
+        keep = times > t
+        return times[keep], values[keep]
+
+    def wait(self, count, timeout=None):
+        """
+        Block until there are more than `count` readings
+        Args:
+            count: (int) value of self.count already seen by the caller
+            timeout: (float) seconds to wait at most
+        Returns:
+            The new count
+        """
+        with self.new_sample:
+            self.new_sample.wait_for(lambda: self.count > count, timeout)
+        return self.count
+
+    def effective_rate(self, n=80):
+        """
+        Sample rate achieved over the last n readings
+        Args:
+            n: (int) readings used for the estimation
+        Returns:
+            float samples per second, None if there are not enough readings
+        """
+        times, _ = self.window(n)
+        if len(times) < 2 or times[-1] == times[0]:
+            return None
+        return (len(times) - 1) / (times[-1] - times[0])
+
+
+class Acquisition_Engine:
+    """
+    Class with the only thread that reads the HX711. It reads continuously and keeps the readings with their time
+    in a Sample_Buffer, so nobody else has to wait for the sensor. The raw readings are kept in raw_buffer and the
+    readings after the filter stage in buffer
+    """
+    def __init__(self, hx, buffer_size=4096, block=1, filter=None, clock=time.perf_counter, sleep=time.sleep):
+        """
+        Initialize the class with global variables
+        Args:
+            hx: HX711 object (or Simulated_HX711) with the get_raw_data(readings) method
+            buffer_size: (int) readings kept in memory
+            block: (int) readings asked to the HX711 in every call. The time of the readings inside a block is
+        interpolated between the start and the end of the call
+            filter: Filter (see Filters.py) applied to the raw readings, None to keep them unchanged
+            clock: function that returns the time of the readings
+            sleep: function that sleeps a number of seconds, used to wait after a failed read
+        """
+        self.hx = hx
+        self.clock = clock
+        self.sleep = sleep
+        self.block = block
+        self.filter = filter
+        self.raw_buffer = Sample_Buffer(buffer_size)
+        self.buffer = Sample_Buffer(buffer_size)
+        self.errors = 0
+        self.thread = None
+        self.thread_status = 'stopped'
+
+    def start(self):
+        if self.thread_status != 'running':
+            self.thread_status = 'running'
+            self.thread = threading.Thread(target=self.thread_loop, daemon=True, )
+            self.thread.start()
+
+    def stop(self):
+        if self.thread_status == 'running':
+            self.thread_status = 'stopped'
+            self.thread.join()
+
+    def read_block(self):
+        """
+        Read one block from the sensor and push it into the buffer
+        Returns:
+        """
+        m0 = METRICS.start()
+        t0 = self.clock()
+        try:
+            raw = self.hx.get_raw_data(self.block)
+        except Exception as e:
+            self.errors += 1
+            METRICS.count("sensor_errors")
+            print("HX711 read failed:", e)
+            self.sleep(0.1)
+            return
+        t1 = self.clock()
+        METRICS.stop("sensor_read", m0)
+        if raw is False or raw is None:
+            self.errors += 1
+            METRICS.count("sensor_errors")
+            self.sleep(0.1)  # not ready or unplugged: do not spin
+            return
+        # The hx711 library returns False for readings that failed
+        values = [v for v in raw if v is not False and v is not None]
+        self.errors += len(raw) - len(values)
+        if len(values) < len(raw):
+            METRICS.count("sensor_errors", len(raw) - len(values))
+        if not values:
+            self.sleep(0.1)
+            return
+        METRICS.count("sensor_readings", len(values))
+        values = np.array(values, dtype=np.float64)
+        times = t0 + (t1 - t0) * np.arange(1, len(values) + 1) / len(values)
+        self.raw_buffer.push_block(times, values)
+        stage = self.filter
+        if stage is not None:
+            values = stage.process(values)
+        self.buffer.push_block(times, values)
+
+    def thread_loop(self):
+        while self.thread_status == 'running':
+            self.read_block()
+
+
+class Simulated_HX711:
+    """
+    Class with the same reading interface as the HX711, to test the acquisition outside the raspberry pi
+    """
+    def __init__(self, rate=80, value=None, noise=2000, seed=None, jitter=0.0, fail_rate=0.0,
+                 clock=time.perf_counter, sleep=time.sleep):
+        """
+        Initialize the class with global variables
+        Args:
+            rate: (float) samples per second of the simulated chip (10 or 80 for the HX711)
+            value: function of time that returns the raw value without noise, a constant ~1 kN by default
+            noise: (float) standard deviation of the noise in raw counts
+            seed: (int) seed of the random generator
+            jitter: (float) standard deviation in seconds of the time of the conversions
+            fail_rate: (float) probability of a failed reading (returned as False like the hx711 library)
+            clock: function that returns the current time in seconds
+            sleep: function that sleeps a number of seconds
+        """
+        self.rate = rate
+        self.value = value if value is not None else (lambda t: 167772)
+        self.noise = noise
+        self.jitter = jitter
+        self.fail_rate = fail_rate
+        self.clock = clock
+        self.sleep = sleep
+        self.rng = np.random.default_rng(seed)
+        self._next = None
+        self.stalled = False  # a stalled chip never has a reading ready (fault injection)
+
+    def get_raw_data(self, readings=1):
+        """
+        Wait like the real chip does and return the readings
+        Args:
+            readings: (int) number of readings
+        Returns:
+            list of int
+        """
+        period = 1 / self.rate
+        if self.stalled:
+            self.sleep(period)
+            return []
+        data = []
+        for _ in range(readings):
+            now = self.clock()
+            if self._next is None or self._next < now - period:
+                self._next = now
+            ready = self._next
+            if self.jitter:
+                ready += abs(self.rng.normal(0, self.jitter))
+            if ready > now:
+                self.sleep(ready - now)
+            self._next += period
+            if self.fail_rate and self.rng.random() < self.fail_rate:
+                data.append(False)
+                continue
+            raw = self.value(self.clock()) + self.rng.normal(0, self.noise)
+            data.append(int(np.clip(raw, -2**23, 2**23 - 1)))
+        return data
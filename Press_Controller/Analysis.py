@@ -0,0 +1,327 @@
+"""
+Analysis of the recordings (csv or binary) of a folder such as Recordings/:
+
+    python -m Press_Controller.Analysis Recordings --target 5 --csv summary.csv
+
+Every file is loaded with a normalized schema (Time_sec, Force_kN, Setpoint_kN, Epoch whatever the order of the
+columns, repeated header lines removed, the missing columns as NaN) and summarized with numpy: peak force, time to
+reach the target, stability and creep rate of the hold, and the statistics of every load cycle. The files are
+analysed in parallel by a process pool and the results are cached by the modification time of every file, so only
+new or changed files are read again.
+"""
+# Import relevant packages
+import argparse
+import fnmatch
+import glob
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .Binary_Recording import Binary_Recording, EXTENSION
+
+CACHE_NAME = ".press_analysis.json"
+
+
+def date_to_epoch(dates):
+    """
+    Convert the "Date" column (text of time.ctime()) to epoch seconds, parsing every distinct second only once
+    Args:
+        dates: array of str
+    Returns:
+        np.ndarray of float, NaN for the texts that can not be read
+    """
+    dates = np.asarray(dates, dtype=object)
+    if len(dates) == 0:
+        return np.empty(0)
+    unique, inverse = np.unique(dates.astype(str), return_inverse=True)
+    epochs = np.empty(len(unique))
+    for i, text in enumerate(unique):
+        try:
+            epochs[i] = time.mktime(time.strptime(text))
+        except ValueError:
+            epochs[i] = np.nan
+    return epochs[inverse]
+
+
+def load_recording(path):
+    """
+    Read a recording with the normalized schema
+    Args:
+        path: (str) csv or binary (.prec) file
+    Returns:
+        dict of numpy arrays: Time_sec, Force_kN, Setpoint_kN, Epoch
+    """
+    if path.endswith(EXTENSION):
+        recording = Binary_Recording(path)
+        time_sec = np.array(recording.time_sec, dtype=np.float64)
+        start = recording.header.get("start_epoch")
+        return {"Time_sec": time_sec,
+                "Force_kN": np.array(recording.force, dtype=np.float64),
+                "Setpoint_kN": np.array(recording.setpoint, dtype=np.float64),
+                "Epoch": time_sec + (np.nan if start is None else start)}
+
+    # Everything is read as text: a header line repeated in the middle of the file would break the types
+    import pandas as pd  # not needed by the binary recordings, nor by the service until a csv is read
+    df = pd.read_csv(path, dtype=str)
+    df.columns = [c.strip() for c in df.columns]
+    n = len(df)
+
+    def numeric(name):
+        if name not in df.columns:
+            return np.full(n, np.nan)
+        # to_numeric() finds the texts that are not numbers, float() reads the others without losing the last bit
+        column = df[name].where(pd.to_numeric(df[name], errors="coerce").notna())
+        return column.astype(np.float64).to_numpy()
+
+    time_sec = numeric("Time_sec")
+    keep = ~np.isnan(time_sec)  # repeated header lines and broken rows
+    data = {"Time_sec": time_sec[keep],
+            "Force_kN": numeric("Force_kN")[keep],
+            "Setpoint_kN": numeric("Setpoint_kN")[keep]}
+    if "Date" in df.columns and keep.any():
+        # The date only has a resolution of one second: the start is taken from the first row
+        dates = df["Date"].to_numpy()[keep]
+        start = date_to_epoch(dates[:1])[0] - data["Time_sec"][0]
+        data["Epoch"] = data["Time_sec"] + start
+    else:
+        data["Epoch"] = np.full(int(keep.sum()), np.nan)
+    return data
+
+
+def cycles(time_sec, force, level=None, hysteresis=0.1):
+    """
+    Split the recording in load cycles: a cycle starts every time the force goes up through level, after having
+    gone down through it (with a hysteresis, so the noise around the level does not start cycles)
+    Args:
+        time_sec: (array) time of the samples
+        force: (array) force of the samples
+        level: (float) force that separates loading and unloading, halfway between the minimum and the peak if None
+        hysteresis: (float) fraction of the range of the force the signal has to pass the level by
+    Returns:
+        dict of arrays, one value per cycle: start, duration, peak, minimum, mean
+    """
+    empty = {k: np.empty(0) for k in ("start", "duration", "peak", "minimum", "mean")}
+    valid = ~np.isnan(force)
+    time_sec, force = time_sec[valid], force[valid]
+    if len(force) < 3:
+        return empty
+    low, high = force.min(), force.max()
+    if level is None:
+        level = (low + high) / 2
+    band = (high - low) * hysteresis / 2
+    # State 1 above level + band, 0 below level - band, the previous state in between
+    state = np.where(force > level + band, 1, np.where(force < level - band, 0, -1))
+    known = np.flatnonzero(state >= 0)
+    if len(known) == 0:
+        return empty
+    last_known = np.maximum.accumulate(np.where(state >= 0, np.arange(len(state)), known[0]))
+    state = state[last_known]
+    starts = np.flatnonzero((state[:-1] == 0) & (state[1:] == 1)) + 1
+    if len(starts) < 2:
+        return empty
+    # Cycle i goes from starts[i] to starts[i + 1], the part after the last start is not a complete cycle
+    segment = force[starts[0]:starts[-1]]
+    offsets = starts[:-1] - starts[0]
+    return {"start": time_sec[starts[:-1]],
+            "duration": np.diff(time_sec[starts]),
+            "peak": np.maximum.reduceat(segment, offsets),
+            "minimum": np.minimum.reduceat(segment, offsets),
+            "mean": np.add.reduceat(segment, offsets) / np.diff(starts)}
+
+
+def summarize(data, target=None, tolerance=0.05):
+    """
+    Summary of one recording
+    Args:
+        data: dict of arrays of load_recording()
+        target: (float) force in kN the test aimed at. By default the highest setpoint, or the peak force if the
+    recording has no setpoint
+        tolerance: (float) fraction of the target that counts as on target
+    Returns:
+        dict with the summary, cycle statistics included
+    """
+    time_sec = data["Time_sec"]
+    force = data["Force_kN"]
+    setpoint = data["Setpoint_kN"]
+    valid = ~np.isnan(force)
+    summary = {"samples": int(len(time_sec)),
+               "start_epoch": float(data["Epoch"][0]) if len(time_sec) and not np.isnan(data["Epoch"][0]) else None,
+               "duration_s": float(time_sec[-1] - time_sec[0]) if len(time_sec) > 1 else 0.0,
+               "peak_force_kN": None, "peak_time_s": None, "target_kN": None, "time_to_target_s": None,
+               "hold_duration_s": None, "hold_mean_kN": None, "hold_std_kN": None, "hold_max_deviation_kN": None,
+               "creep_rate_kN_per_s": None, "cycles": 0}
+    if not valid.any():
+        return summary
+    peak = int(np.nanargmax(force))
+    summary["peak_force_kN"] = float(force[peak])
+    summary["peak_time_s"] = float(time_sec[peak] - time_sec[0])
+
+    if target is None:
+        target = float(np.nanmax(setpoint)) if not np.isnan(setpoint).all() else float(force[peak])
+    summary["target_kN"] = target
+    band = abs(target) * tolerance
+    reached = valid & (force >= target - band)
+    if reached.any():
+        first = int(np.argmax(reached))
+        summary["time_to_target_s"] = float(time_sec[first] - time_sec[0])
+        # Hold: from reaching the target to the last sample still on target
+        last = len(reached) - 1 - int(np.argmax(reached[::-1]))
+        hold = slice(first, last + 1)
+        t, f = time_sec[hold], force[hold]
+        keep = ~np.isnan(f)
+        t, f = t[keep], f[keep]
+        summary["hold_duration_s"] = float(t[-1] - t[0])
+        summary["hold_mean_kN"] = float(f.mean())
+        summary["hold_std_kN"] = float(f.std())
+        summary["hold_max_deviation_kN"] = float(np.abs(f - target).max())
+        if len(t) > 1 and t[-1] > t[0]:
+            # Least squares slope of the force during the hold
+            dt = t - t.mean()
+            summary["creep_rate_kN_per_s"] = float((dt * (f - f.mean())).sum() / (dt * dt).sum())
+
+    table = cycles(time_sec, force)
+    summary["cycles"] = int(len(table["start"]))
+    if summary["cycles"]:
+        summary["cycle_peak_mean_kN"] = float(table["peak"].mean())
+        summary["cycle_peak_std_kN"] = float(table["peak"].std())
+        summary["cycle_duration_mean_s"] = float(table["duration"].mean())
+        summary["cycle_table"] = {k: v.tolist() for k, v in table.items()}
+    return summary
+
+
+def analyse_file(path, target=None, tolerance=0.05):
+    """
+    Load and summarize one file (the function run by the process pool)
+    Returns:
+        dict with the summary and the file name
+    """
+    try:
+        summary = summarize(load_recording(path), target=target, tolerance=tolerance)
+        summary["error"] = None
+    except Exception as e:
+        summary = {"error": type(e).__name__ + ": " + str(e)}
+    summary["file"] = path
+    return summary
+
+
+class Analysis_Cache:
+    """
+    Class with the summaries already computed, kept in a json file. A summary is used again only if the file has
+    the same modification time and size and it was computed with the same options
+    """
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.changed = False
+        if path is not None and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.entries = json.load(f)
+            except ValueError:
+                print("Analysis cache not readable, it is built again:", path)
+
+    @staticmethod
+    def key(file, options):
+        stat = os.stat(file)
+        text = json.dumps([os.path.abspath(file), stat.st_mtime_ns, stat.st_size, options], sort_keys=True)
+        return hashlib.sha1(text.encode()).hexdigest()
+
+    def get(self, file, options):
+        return self.entries.get(self.key(file, options))
+
+    def put(self, file, options, summary):
+        self.entries[self.key(file, options)] = summary
+        self.changed = True
+
+    def save(self):
+        if self.path is None or not self.changed:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp, self.path)
+        self.changed = False
+
+
+def find_recordings(folder):
+    files = glob.glob(os.path.join(folder, "*.csv")) + glob.glob(os.path.join(folder, "*" + EXTENSION))
+    # The min/max/mean bins saved by export_window are not recordings
+    return sorted(file for file in files if not fnmatch.fnmatch(os.path.basename(file), "*_bins_*s.csv"))
+
+
+def analyse_folder(folder, target=None, tolerance=0.05, processes=None, cache=True):
+    """
+    Summarize every recording of a folder
+    Args:
+        folder: (str) folder with the csv and binary recordings
+        target: (float) force in kN the tests aimed at, see summarize()
+        tolerance: (float) fraction of the target that counts as on target
+        processes: (int) processes of the pool, one per CPU if None; 1 to analyse in this process
+        cache: (bool or str) keep the results in the folder (True), in the given file, or nowhere (False)
+    Returns:
+        pd.DataFrame with one row per file (the cycle tables are left out, see cycles())
+    """
+    import pandas as pd
+    if cache is True:
+        cache = os.path.join(folder, CACHE_NAME)
+    store = Analysis_Cache(cache or None)
+    options = {"target": target, "tolerance": tolerance}
+    files = find_recordings(folder)
+    results = {}
+    pending = []
+    for file in files:
+        cached = store.get(file, options)
+        if cached is not None:
+            results[file] = cached
+        else:
+            pending.append(file)
+
+    if pending:
+        if processes == 1 or len(pending) == 1:
+            summaries = [analyse_file(f, target, tolerance) for f in pending]
+        else:
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                summaries = list(pool.map(analyse_file, pending, [target] * len(pending),
+                                          [tolerance] * len(pending)))
+        for file, summary in zip(pending, summaries):
+            results[file] = summary
+            if summary["error"] is None:
+                store.put(file, options, summary)
+        store.save()
+
+    rows = []
+    for file in files:
+        row = {k: v for k, v in results[file].items() if k != "cycle_table"}
+        row["file"] = os.path.basename(file)
+        rows.append(row)
+    df = pd.DataFrame(rows)
+    if len(df):
+        df = df[["file"] + [c for c in df.columns if c != "file"]]
+    return df
+
+
+def main(argv=None):
+    import pandas as pd
+    parser = argparse.ArgumentParser(description="Summary of the recordings of a folder")
+    parser.add_argument("folder", nargs="?", default="Recordings")
+    parser.add_argument("--target", type=float, default=None, help="force in kN the tests aimed at")
+    parser.add_argument("--tolerance", type=float, default=0.05, help="fraction of the target that is on target")
+    parser.add_argument("--processes", type=int, default=None, help="processes of the pool, one per CPU by default")
+    parser.add_argument("--no-cache", action="store_true", help="read every file again")
+    parser.add_argument("--csv", default=None, help="save the summary in this file")
+    args = parser.parse_args(argv)
+
+    df = analyse_folder(args.folder, target=args.target, tolerance=args.tolerance, processes=args.processes,
+                        cache=not args.no_cache)
+    if args.csv:
+        df.to_csv(args.csv, index=False)
+    with pd.option_context("display.max_columns", None, "display.width", 160):
+        print(df)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+Asyncio runtime of the Press_Service, an alternative to the thread workers (Workers.py) to compare the latency and
+the CPU use of both models:
+
+    service = Press_Service(runtime="asyncio")
+
+One event loop runs in its own thread. The blocking HX711 reads are done in an executor and every new reading
+wakes the controller of the station; the controller (which also advances the test program), the recorder and the
+publishing of the readings are coroutines timed with asyncio. Stopping a task cancels its
+coroutine, and a cancelled controller stops the pulses before it ends.
+"""
+# Import relevant packages
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .Metrics import METRICS
+from .Scheduler import Fixed_Rate_Scheduler
+
+
+class Async_Runtime:
+    """
+    Class with the event loop that runs the periodic work of a Press_Service
+    """
+    def __init__(self, service, read_timeout=1.0):
+        """
+        Initialize the class with global variables
+        Args:
+            service: Press_Service
+            read_timeout: (float) seconds without new readings after which a controller stops the pulses
+        """
+        self.service = service
+        self.read_timeout = read_timeout
+        self.loop = None
+        self.thread = None
+        self.executors = {}  # station name -> thread that reads its sensor
+        self.tasks = {}  # (kind, station name) -> asyncio.Task
+        self.new_reading = {}  # station name -> asyncio.Event set by the sensor coroutine
+        self.publish_scheduler = None
+
+    @property
+    def running(self):
+        return self.loop is not None
+
+    def start(self):
+        """
+        Start the event loop and the tasks that the stations need
+        Returns:
+        """
+        if self.loop is not None:
+            return
+        self.loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        self.thread = threading.Thread(target=self._run_loop, args=(ready,), name="press-asyncio", daemon=True)
+        self.thread.start()
+        ready.wait()
+        print("Asyncio runtime started")
+        self.update()
+
+    def _run_loop(self, ready):
+        loop = self.loop
+        asyncio.set_event_loop(loop)
+        loop.call_soon(ready.set)
+        try:
+            loop.run_forever()
+            # Stopped, maybe long after stop() gave up on a loop that was blocked: the tasks end here
+            tasks = asyncio.all_tasks(loop)
+            for task in tasks:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            loop.run_until_complete(loop.shutdown_asyncgens())
+        finally:
+            loop.close()
+
+    def update(self):
+        """
+        Start or cancel the tasks after the stations changed (force control, recording). It can be called from
+        any thread
+        Returns:
+        """
+        loop = self.loop
+        if loop is not None:
+            loop.call_soon_threadsafe(self._sync)
+
+    def stop(self, timeout=2.0):
+        """
+        Cancel every task and close the event loop. The acquisition threads of the sensors are started again
+        Args:
+            timeout: (float) seconds to wait for the tasks and for the sensor read in progress
+        Returns:
+        """
+        if self.loop is None:
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout)
+        if self.thread.is_alive():
+            # Something blocks the loop (e.g. a control step that hangs): it is abandoned, a daemon thread that
+            # cancels its tasks and closes the loop if it is ever unblocked
+            print("The asyncio loop did not stop in", timeout, "sec, it is left running")
+        self.loop = None
+        self.tasks = {}
+        self.new_reading = {}
+        for name, executor in self.executors.items():
+            # The executor runs one job at a time: this one ends after the read in progress
+            done = executor.submit(lambda: None)
+            executor.shutdown(wait=False)
+            try:
+                done.result(timeout)
+            except Exception:
+                print("The sensor of", name, "is still being read, its acquisition thread is not started")
+                continue
+            station = self.service.stations_by_name.get(name)
+            if station is not None:
+                station.balance.engine.start()
+        self.executors = {}
+        print("Asyncio runtime stopped")
+
+    def states(self):
+        return {"/".join(k for k in key if k): "running" for key, task in self.tasks.items() if not task.done()}
+
+    def _sync(self):
+        # Only called in the loop, nothing to do in a loop that stop() already left
+        if asyncio.get_running_loop() is not self.loop:
+            return
+        wanted = {("publish", None)}
+        for name, station in self.service.stations_by_name.items():
+            wanted.add(("sensor", name))
+            if station.controlling:
+                wanted.add(("control", name))
+            if station.start_recording and station.record_scheduler is not None:
+                wanted.add(("record", name))
+        for key in list(self.tasks):
+            if key not in wanted:
+                self.tasks.pop(key).cancel()
+            elif self.tasks[key].done():
+                del self.tasks[key]
+        for key in wanted:
+            if key not in self.tasks:
+                self.tasks[key] = self.loop.create_task(self._coroutine(*key))
+
+    def _coroutine(self, kind, name):
+        if kind == "publish":
+            return self._publish()
+        station = self.service.station(name)
+        if kind == "sensor":
+            return self._sensor(station)
+        if kind == "control":
+            return self._control(station)
+        return self._record(station)
+
+    async def _tick(self, scheduler, name):
+        """
+        Sleep until the next deadline of a Fixed_Rate_Scheduler and serve it
+        Returns:
+            Time of the deadline
+        """
+        while True:
+            deadline = scheduler.next_deadline
+            if deadline is not None:
+                delay = deadline - scheduler.clock()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            served = scheduler.poll()
+            if served is not None:
+                if METRICS.enabled:
+                    METRICS.observe("late_" + name, scheduler.clock() - served)
+                return served
+
+    async def _publish(self):
+        self.publish_scheduler = Fixed_Rate_Scheduler(1 / self.service.publish_rate)
+        while True:
+            await self._tick(self.publish_scheduler, "update")
+            self.service.publish()
+
+    async def _sensor(self, station):
+        engine = station.balance.engine
+        executor = self.executors.get(station.name)
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="press-sensor-" + station.name)
+            self.executors[station.name] = executor
+        # The runtime reads the sensor instead of the acquisition thread
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(executor, engine.stop)
+        event = self.new_reading.setdefault(station.name, asyncio.Event())
+        while True:
+            count = engine.buffer.count
+            await loop.run_in_executor(executor, engine.read_block)
+            if engine.buffer.count != count:
+                event.set()
+
+    async def _control(self, station):
+        event = self.new_reading.setdefault(station.name, asyncio.Event())
+        period = 1 / self.service.control_rate
+        next_step = None
+        try:
+            while station.controlling:
+                try:
+                    await asyncio.wait_for(event.wait(), self.read_timeout)
+                except asyncio.TimeoutError:
+                    # No new reading: do not move blind
+                    station.controller.hold()
+                    continue
+                event.clear()
+                now = time.perf_counter()
+                if next_step is not None and now < next_step - period / 4:
+                    continue
+                if next_step is not None and METRICS.enabled:
+                    METRICS.observe("late_force", max(0.0, now - next_step))
+                # The steps keep the control rate on a fixed grid, the readings in between are skipped
+                next_step = now + period if next_step is None or now - next_step > period else next_step + period
+                m0 = METRICS.start()
+                station.control_step()
+                METRICS.stop("task_force", m0)
+        except asyncio.CancelledError:
+            station.controller.hold()
+            raise
+
+    async def _record(self, station):
+        while station.start_recording and station.record_scheduler is not None:
+            # The scheduler is read every time: a new recording creates a new one
+            await self._tick(station.record_scheduler, "timer")
+            if station.start_recording:
+                station.record_sample()
@@ -0,0 +1,214 @@
+"""
+Binary recording file (.prec)
+
+    8 bytes   magic b"PRSREC01"
+    4 bytes   little endian uint32 with the length of the json header (padding included)
+    n bytes   utf-8 json header: sample_rate, calibration, pins, start_epoch, columns... padded with spaces so the
+              records start at a multiple of 16 bytes
+    records   fixed width little endian records, see record_dtype
+
+The number of records is given by the file size, so a file that was cut by a crash can still be read (an incomplete
+last record is ignored) and records can be appended while recording.
+"""
+# Import relevant packages
+import json
+import os
+import struct
+import time
+
+import numpy as np
+
+from .Sample_Store import Sample_Store
+
+MAGIC = b"PRSREC01"
+EXTENSION = ".prec"
+record_dtype = np.dtype([("Time_sec", "<f8"), ("Force_kN", "<f8"), ("Setpoint_kN", "<f8")])
+
+
+def header_bytes(start_epoch, sample_rate=None, calibration=None, pins=None, **extra):
+    """
+    Build the header of a binary recording
+    Args:
+        start_epoch: (float) wall clock time at Time_sec = 0
+        sample_rate: (float) samples per second the recording was made with
+        calibration: (dict) calibration used to convert the raw values to kN
+        pins: (dict) pin configuration of the press
+        **extra: any other json serializable information
+    Returns:
+        bytes
+    """
+    header = {"version": 1,
+              "columns": list(record_dtype.names),
+              "dtypes": [record_dtype[name].str for name in record_dtype.names],
+              "start_epoch": start_epoch,
+              "sample_rate": sample_rate,
+              "calibration": calibration,
+              "pins": pins}
+    header.update(extra)
+    text = json.dumps(header).encode("utf-8")
+    # Records are aligned to 16 bytes
+    length = len(text) + (-(len(MAGIC) + 4 + len(text)) % 16)
+    return MAGIC + struct.pack("<I", length) + text.ljust(length, b" ")
+
+
+def records_bytes(time_sec, force, setpoint=None):
+    """
+    Encode columns of samples as binary records
+    Args:
+        time_sec: (array) seconds since the recording started
+        force: (array) force in kN
+        setpoint: (array) setpoint of the force controller in kN, NaN if not given
+    Returns:
+        bytes
+    """
+    rec = np.empty(len(time_sec), dtype=record_dtype)
+    rec["Time_sec"] = time_sec
+    rec["Force_kN"] = force
+    rec["Setpoint_kN"] = np.nan if setpoint is None else setpoint
+    return rec.tobytes()
+
+
+def read_header(path):
+    """
+    Read only the header of a binary recording
+    Args:
+        path: (str) file name
+    Returns:
+        (header dict, offset of the first record)
+    """
+    with open(path, "rb") as f:
+        magic = f.read(len(MAGIC))
+        if magic != MAGIC:
+            raise ValueError(path + " is not a binary press recording")
+        length, = struct.unpack("<I", f.read(4))
+        header = json.loads(f.read(length).decode("utf-8"))
+    return header, len(MAGIC) + 4 + length
+
+
+def write_recording(path, time_sec, force, start_epoch, setpoint=None, **metadata):
+    """
+    Write a complete binary recording
+    Args:
+        path: (str) file name
+        time_sec: (array) seconds since the recording started
+        force: (array) force in kN
+        start_epoch: (float) wall clock time at Time_sec = 0
+        setpoint: (array) setpoint of the force controller in kN
+        **metadata: sample_rate, calibration, pins...
+    Returns:
+    """
+    with open(path, "wb") as f:
+        f.write(header_bytes(start_epoch, **metadata))
+        f.write(records_bytes(time_sec, force, setpoint))
+
+
+class Binary_Recording:
+    """
+    Class to read a binary recording. The file is memory mapped and the columns are numpy views on it, nothing is
+    copied until the values are used
+    """
+    def __init__(self, path):
+        """
+        Initialize the class with global variables
+        Args:
+            path: (str) file name
+        """
+        self.path = path
+        self.header, self.offset = read_header(path)
+        # The layout of the records is the one written in the header
+        self.dtype = np.dtype(list(zip(self.header["columns"], self.header["dtypes"])))
+        n = (os.path.getsize(path) - self.offset) // self.dtype.itemsize
+        if n > 0:
+            self.data = np.memmap(path, dtype=self.dtype, mode="r", offset=self.offset, shape=(n,))
+        else:
+            self.data = np.empty(0, dtype=self.dtype)
+
+    def __len__(self):
+        return len(self.data)
+
+    @property
+    def time_sec(self):
+        return self.data["Time_sec"]
+
+    @property
+    def force(self):
+        return self.data["Force_kN"]
+
+    @property
+    def setpoint(self):
+        if "Setpoint_kN" not in self.dtype.names:
+            return np.full(len(self), np.nan)
+        return self.data["Setpoint_kN"]
+
+    @property
+    def start_epoch(self):
+        return self.header.get("start_epoch")
+
+    @property
+    def epoch(self):
+        """
+        Wall clock time of every sample (this one is computed, so it is a copy)
+        Returns:
+            np.ndarray
+        """
+        return self.start_epoch + self.time_sec
+
+    def to_dataframe(self):
+        """
+        Data frame with the same layout as the csv recordings
+        Returns:
+            pd.DataFrame
+        """
+        import pandas as pd  # only loaded when a recording is exported
+        if self.start_epoch is None:
+            date = np.full(len(self), "", dtype=object)
+        else:
+            date = Sample_Store.epoch_to_date(self.epoch)
+        return pd.DataFrame({"Date": date,
+                             "Time_sec": np.array(self.time_sec),
+                             "Force_kN": np.array(self.force),
+                             "Setpoint_kN": np.array(self.setpoint)},
+                            columns=list(Sample_Store.columns))
+
+
+def csv_to_binary(csv_path, binary_path=None, **metadata):
+    """
+    Convert a csv recording (any column order) to the binary format. The csv "Date" only has a resolution of one
+    second, so the start epoch is taken from the first row
+    Args:
+        csv_path: (str) csv file
+        binary_path: (str) output file, by default the csv name with the .prec extension
+        **metadata: sample_rate, calibration, pins...
+    Returns:
+        path of the binary file
+    """
+    import pandas as pd
+    if binary_path is None:
+        binary_path = os.path.splitext(csv_path)[0] + EXTENSION
+    df = pd.read_csv(csv_path, float_precision="round_trip")  # the same doubles as in the csv
+    df = df[pd.to_numeric(df["Time_sec"], errors="coerce").notna()]  # repeated header lines
+    time_sec = df["Time_sec"].to_numpy(dtype=np.float64)
+    force = df["Force_kN"].to_numpy(dtype=np.float64)
+    setpoint = None
+    if "Setpoint_kN" in df.columns:
+        setpoint = pd.to_numeric(df["Setpoint_kN"], errors="coerce").to_numpy(dtype=np.float64)
+    start_epoch = None
+    if len(df) > 0:
+        start_epoch = time.mktime(time.strptime(str(df["Date"].iloc[0]))) - time_sec[0]
+    write_recording(binary_path, time_sec, force, start_epoch, setpoint, **metadata)
+    return binary_path
+
+
+def binary_to_csv(binary_path, csv_path=None):
+    """
+    Convert a binary recording to the csv layout ("Date", "Time_sec", "Force_kN", "Setpoint_kN")
+    Args:
+        binary_path: (str) binary file
+        csv_path: (str) output file, by default the binary name with the .csv extension
+    Returns:
+        path of the csv file
+    """
+    if csv_path is None:
+        csv_path = os.path.splitext(binary_path)[0] + ".csv"
+    Binary_Recording(binary_path).to_dataframe().to_csv(csv_path, index=False)
+    return csv_path
@@ -0,0 +1,150 @@
+# Import relevant packages
+import json
+
+import numpy as np
+
+RAW_MIN = -2**23  # range of the 24 bit HX711
+RAW_MAX = 2**23 - 1
+
+
+class Calibration:
+    """
+    Class to convert raw HX711 values to kN. It keeps the tare offset and a table of calibration points
+    (raw value, known force) and compiles them into a lookup table, so converting a whole block of raw values is
+    a single np.interp
+    """
+    methods = ("linear", "piecewise", "polynomial")
+
+    def __init__(self, method="linear", gain=50 / 2**23, tare=0.0, points=None, degree=2, table_size=4097):
+        """
+        Initialize the class with global variables
+        Args:
+            method: (str) "linear" (gain and tare only), "piecewise" (straight lines between the points) or
+        "polynomial" (least squares fit of the points)
+            gain: (float) kN per raw count for the linear method
+            tare: (float) raw value with no load
+            points: list of (raw, kN) calibration points, the raw values without the tare
+            degree: (int) degree of the polynomial fit
+            table_size: (int) size of the lookup table used for the polynomial fit
+        """
+        if method not in self.methods:
+            raise ValueError("method has to be one of " + str(self.methods))
+        self.method = method
+        self.gain = gain
+        self.tare = tare
+        self.points = [tuple(p) for p in (points or [])]
+        self.degree = degree
+        self.table_size = table_size
+        self._table = None  # (xp, fp), replaced as a whole so convert() never sees half of a new table
+        self.compile()
+
+    def capture_tare(self, raw):
+        """
+        Use the current raw value (no load on the press) as zero
+        Args:
+            raw: (float) raw value of the sensor without load
+        Returns:
+        """
+        self.tare = float(raw)
+        self.compile()
+
+    def add_point(self, raw, force):
+        """
+        Add a calibration point
+        Args:
+            raw: (float) raw value of the sensor (tare is subtracted)
+            force: (float) known force in kN
+        Returns:
+        """
+        points = sorted(self.points + [(float(raw) - self.tare, float(force))])
+        self.check_points(points)
+        self.points = points
+        self.compile()
+
+    def clear_points(self):
+        self.points = []
+        self.compile()
+
+    @staticmethod
+    def check_points(points):
+        """
+        Check that the calibration points give a conversion: one point per raw value and the force always growing
+        (or always falling) with the raw value
+        Args:
+            points: list of (raw, kN) calibration points
+        Returns:
+        """
+        if len(points) < 2:
+            return
+        raw, force = np.array(sorted(points), dtype=np.float64).T
+        if np.any(np.diff(raw) == 0):
+            raise ValueError("Two calibration points have the same raw value")
+        steps = np.diff(force)
+        if np.any(steps > 0) and np.any(steps < 0):
+            raise ValueError("The force of the calibration points is not monotonic in the raw value")
+
+    def compile(self):
+        """
+        Build the lookup table (xp, fp) of the conversion from raw values (tare included) to kN
+        Returns:
+        """
+        self.check_points(self.points)
+        if self.method == "piecewise" and len(self.points) >= 2:
+            raw, force = np.array(sorted(self.points), dtype=np.float64).T
+            # Extend the first and last segment to the whole range of the sensor
+            lo = force[0] + (RAW_MIN - self.tare - raw[0]) * (force[1] - force[0]) / (raw[1] - raw[0])
+            hi = force[-1] + (RAW_MAX - self.tare - raw[-1]) * (force[-1] - force[-2]) / (raw[-1] - raw[-2])
+            xp = np.concatenate(([RAW_MIN - self.tare], raw, [RAW_MAX - self.tare]))
+            fp = np.concatenate(([lo], force, [hi]))
+        elif self.method == "polynomial" and len(self.points) > self.degree:
+            raw, force = np.array(self.points, dtype=np.float64).T
+            coefficients = np.polyfit(raw, force, self.degree)
+            xp = np.linspace(RAW_MIN, RAW_MAX, self.table_size) - self.tare
+            fp = np.polyval(coefficients, xp)
+        else:
+            # Linear conversion (also used until there are enough points for the other methods)
+            xp = np.array([RAW_MIN, RAW_MAX], dtype=np.float64) - self.tare
+            fp = xp * self.gain
+        self._table = (xp + self.tare, fp)
+
+    def convert(self, raw):
+        """
+        Convert raw values to kN
+        Args:
+            raw: (float or array) raw values
+        Returns:
+            float or np.ndarray in kN
+        """
+        xp, fp = self._table
+        return np.interp(raw, xp, fp, left=np.nan, right=np.nan)
+
+    def to_dict(self):
+        return {"method": self.method,
+                "gain": self.gain,
+                "tare": self.tare,
+                "points": self.points,
+                "degree": self.degree,
+                "table_size": self.table_size}
+
+    def save(self, path):
+        """
+        Save the calibration to a json file
+        Args:
+            path: (str) file name
+        Returns:
+        """
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        print("Calibration saved in:", path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read a calibration saved with save()
+        Args:
+            path: (str) file name
+        Returns:
+            Calibration
+        """
+        with open(path) as f:
+            return cls(**json.load(f))
@@ -0,0 +1,334 @@
+"""
+Catalogue of the test runs: one row per recording file in a SQLite database kept in the folder of the recordings
+(press_runs.sqlite), with the settings of the run (setpoint, frequency and duty cycle of the pulses, calibration,
+operator, station), how it ended and the summary of Analysis.summarize(). Past runs are found with indexed queries
+instead of reading every file:
+
+    python -m Press_Controller.Catalogue find Recordings --operator ana --target 5 --since 2020-04-29
+    python -m Press_Controller.Catalogue index Recordings
+
+The Press_Service adds the runs when their files are finished; "index" adds the files that were recorded before
+(or by another program) with what can be read from the files.
+"""
+# Import relevant packages
+import argparse
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from datetime import datetime
+
+import numpy as np
+
+from .Analysis import find_recordings, load_recording, summarize
+from .Binary_Recording import Binary_Recording, EXTENSION
+
+CATALOGUE_NAME = "press_runs.sqlite"
+DATABASE_EXTENSIONS = (".sqlite", ".sqlite3", ".db")
+
+# Columns of the runs table: settings of the run, then the summary (same names as in Analysis.summarize)
+run_columns = (("file", "TEXT UNIQUE NOT NULL"),
+               ("station", "TEXT"),
+               ("operator", "TEXT"),
+               ("outcome", "TEXT"),
+               ("profile", "TEXT"),
+               ("start_epoch", "REAL"),
+               ("end_epoch", "REAL"),
+               ("setpoint_kN", "REAL"),
+               ("record_period", "REAL"),
+               ("frequency", "REAL"),
+               ("dc", "REAL"),
+               ("calibration", "TEXT"),
+               ("format", "TEXT"),
+               ("file_size", "INTEGER"),
+               ("file_mtime", "REAL"),
+               ("samples", "INTEGER"),
+               ("duration_s", "REAL"),
+               ("peak_force_kN", "REAL"),
+               ("target_kN", "REAL"),
+               ("time_to_target_s", "REAL"),
+               ("hold_duration_s", "REAL"),
+               ("hold_mean_kN", "REAL"),
+               ("hold_std_kN", "REAL"),
+               ("hold_max_deviation_kN", "REAL"),
+               ("creep_rate_kN_per_s", "REAL"),
+               ("cycles", "INTEGER"),
+               ("cycle_peak_mean_kN", "REAL"),
+               ("notes", "TEXT"))
+column_names = tuple(name for name, _ in run_columns)
+indexed_columns = ("start_epoch", "setpoint_kN", "operator", "outcome", "station")
+
+
+def to_epoch(value):
+    """
+    Date of a query as epoch seconds
+    Args:
+        value: epoch (float), datetime or text "YYYY-MM-DD" / "YYYY-MM-DD HH:MM[:SS]"
+    Returns:
+        float or None
+    """
+    if value is None or isinstance(value, (int, float)):
+        return value
+    if isinstance(value, datetime):
+        return value.timestamp()
+    for date_format in ("%Y-%m-%d", "%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S"):
+        try:
+            return datetime.strptime(value, date_format).timestamp()
+        except ValueError:
+            pass
+    raise ValueError("Date not understood (YYYY-MM-DD [HH:MM[:SS]]): " + str(value))
+
+
+class Run_Catalogue:
+    """
+    Class with the SQLite catalogue of the runs of one folder. Every call opens its own connection, so the
+    catalogue can be used from any thread; the runs added by the service are summarized in a background thread
+    """
+    def __init__(self, path):
+        """
+        Initialize the class with global variables. The database is created when it is first used
+        Args:
+            path: (str) database file (an existing file or a name ending in .sqlite, .sqlite3 or .db), or the
+        folder of the recordings to use CATALOGUE_NAME in it, even if the folder does not exist yet
+        """
+        is_file = os.path.isfile(path) or os.path.splitext(path)[1].lower() in DATABASE_EXTENSIONS
+        if not is_file:
+            path = os.path.join(path, CATALOGUE_NAME)
+        self.path = path
+        self.executor = None
+        self._ready = False
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=10.0)
+        connection.row_factory = sqlite3.Row
+        if not self._ready:
+            with connection:
+                connection.execute("CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY, {})".format(
+                    ", ".join(name + " " + kind for name, kind in run_columns)))
+                for name in indexed_columns:
+                    connection.execute("CREATE INDEX IF NOT EXISTS runs_{0} ON runs ({0})".format(name))
+            self._ready = True
+        return connection
+
+    def _key(self, file):
+        # Files are kept relative to the catalogue, so the folder can be moved or mounted somewhere else
+        return os.path.relpath(os.path.abspath(file), os.path.dirname(os.path.abspath(self.path)))
+
+    def file_path(self, run):
+        """
+        Path of the data file of a run
+        Args:
+            run: dict of find() or get()
+        Returns:
+            path
+        """
+        return os.path.join(os.path.dirname(os.path.abspath(self.path)), run["file"])
+
+    def add_run(self, file, metadata=None, summary=None):
+        """
+        Add a run, or replace the row of the same file
+        Args:
+            file: (str) data file of the run
+            metadata: (dict) settings of the run, keys of run_columns (calibration can be a dict)
+            summary: (dict) result of Analysis.summarize(), computed from the file if None
+        Returns:
+            id of the run
+        """
+        metadata = dict(metadata or {})
+        if summary is None:
+            data = load_recording(file)
+            summary = summarize(data)
+            setpoint = data["Setpoint_kN"]
+            if "setpoint_kN" not in metadata and not np.isnan(setpoint).all():
+                metadata["setpoint_kN"] = float(np.nanmax(setpoint))
+        row = {k: v for k, v in summary.items() if k in column_names}
+        row.update({k: v for k, v in metadata.items() if k in column_names})
+        if isinstance(row.get("calibration"), dict):
+            row["calibration"] = json.dumps(row["calibration"], sort_keys=True)
+        if row.get("start_epoch") is not None and row.get("end_epoch") is None and row.get("duration_s"):
+            row["end_epoch"] = row["start_epoch"] + row["duration_s"]
+        stat = os.stat(file)
+        row.update(file=self._key(file), file_size=stat.st_size, file_mtime=stat.st_mtime,
+                   format="binary" if file.endswith(EXTENSION) else "csv")
+        names = list(row)
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                "INSERT INTO runs ({}) VALUES ({}) ON CONFLICT(file) DO UPDATE SET {}".format(
+                    ", ".join(names), ", ".join("?" * len(names)),
+                    ", ".join("{0} = excluded.{0}".format(n) for n in names if n != "file")),
+                [row[n] for n in names])
+            return connection.execute("SELECT id FROM runs WHERE file = ?", (row["file"],)).fetchone()[0]
+
+    def submit(self, file, metadata=None):
+        """
+        Add a run from a background thread: the file is read and summarized without blocking the caller
+        Args:
+            file: (str) data file of the run
+            metadata: (dict) settings of the run
+        Returns:
+            concurrent.futures.Future with the id of the run
+        """
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="press-catalogue")
+        future = self.executor.submit(self.add_run, file, metadata)
+
+        def report(done):
+            if done.exception() is not None:
+                print("Run not catalogued:", file, type(done.exception()).__name__, done.exception())
+
+        future.add_done_callback(report)
+        return future
+
+    def close(self):
+        """
+        Wait for the runs that are being added
+        Returns:
+        """
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    def find(self, since=None, until=None, target=None, tolerance=0.05, operator=None, outcome=None, station=None,
+             limit=None):
+        """
+        Runs that match all the given conditions, the newest first
+        Args:
+            since: start date (epoch, datetime or "YYYY-MM-DD") of the first run
+            until: start date of the last run
+            target: (float) setpoint in kN
+            tolerance: (float) fraction of the target the setpoint can differ by
+            operator: (str) operator of the run
+            outcome: (str) "completed", "stopped", "fault" or "recorded"
+            station: (str) name of the station
+            limit: (int) maximum number of runs
+        Returns:
+            list of dict, one per run
+        """
+        conditions = []
+        values = []
+        if since is not None:
+            conditions.append("start_epoch >= ?")
+            values.append(to_epoch(since))
+        if until is not None:
+            # A day alone includes the runs of the whole day
+            whole_day = isinstance(until, str) and len(until.strip()) == 10
+            conditions.append("start_epoch < ?" if whole_day else "start_epoch <= ?")
+            values.append(to_epoch(until) + (86400 if whole_day else 0))
+        if target is not None:
+            band = abs(target) * tolerance
+            conditions.append("setpoint_kN BETWEEN ? AND ?")
+            values += [target - band, target + band]
+        for name, value in (("operator", operator), ("outcome", outcome), ("station", station)):
+            if value is not None:
+                conditions.append(name + " = ?")
+                values.append(value)
+        query = "SELECT * FROM runs"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY start_epoch DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            values.append(int(limit))
+        with closing(self._connect()) as connection:
+            return [dict(row) for row in connection.execute(query, values)]
+
+    def get(self, run_id):
+        with closing(self._connect()) as connection:
+            row = connection.execute("SELECT * FROM runs WHERE id = ?", (run_id,)).fetchone()
+        if row is None:
+            raise ValueError("Unknown run: " + str(run_id))
+        return dict(row)
+
+    def load(self, run_id):
+        """
+        Data of a run
+        Args:
+            run_id: (int) id of the run
+        Returns:
+            dict of numpy arrays, see Analysis.load_recording()
+        """
+        return load_recording(self.file_path(self.get(run_id)))
+
+    def set_outcome(self, run_id, outcome, notes=None):
+        """
+        Change how a run ended (e.g. a sample that broke) and its notes
+        Returns:
+        """
+        with closing(self._connect()) as connection, connection:
+            if notes is None:
+                cursor = connection.execute("UPDATE runs SET outcome = ? WHERE id = ?", (outcome, run_id))
+            else:
+                cursor = connection.execute("UPDATE runs SET outcome = ?, notes = ? WHERE id = ?",
+                                            (outcome, notes, run_id))
+        if cursor.rowcount == 0:
+            raise ValueError("Unknown run: " + str(run_id))
+
+    def index_folder(self, folder=None):
+        """
+        Add the recordings of a folder that are not in the catalogue yet, or that changed since they were added
+        Args:
+            folder: (str) folder of the recordings, the folder of the catalogue if None
+        Returns:
+            Number of runs added
+        """
+        if folder is None:
+            folder = os.path.dirname(os.path.abspath(self.path))
+        with closing(self._connect()) as connection:
+            known = {row["file"]: (row["file_size"], row["file_mtime"])
+                     for row in connection.execute("SELECT file, file_size, file_mtime FROM runs")}
+        added = 0
+        for file in find_recordings(folder):
+            stat = os.stat(file)
+            if known.get(self._key(file)) == (stat.st_size, stat.st_mtime):
+                continue
+            metadata = {"outcome": "recorded"}
+            if file.endswith(EXTENSION):
+                header = Binary_Recording(file).header
+                metadata.update({k: header.get(k) for k in ("station", "operator", "calibration")})
+                if header.get("sample_rate"):
+                    metadata["record_period"] = 1 / header["sample_rate"]
+            try:
+                self.add_run(file, metadata)
+                added += 1
+            except Exception as e:
+                print("Run not catalogued:", file, type(e).__name__, e)
+        return added
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Catalogue of the test runs of a folder")
+    commands = parser.add_subparsers(dest="action", required=True)
+    index_parser = commands.add_parser("index", help="add the recordings that are not in the catalogue")
+    index_parser.add_argument("folder", nargs="?", default="Recordings")
+    find_parser = commands.add_parser("find", help="list the runs that match")
+    find_parser.add_argument("folder", nargs="?", default="Recordings")
+    find_parser.add_argument("--since", default=None, help="YYYY-MM-DD [HH:MM]")
+    find_parser.add_argument("--until", default=None, help="YYYY-MM-DD [HH:MM]")
+    find_parser.add_argument("--target", type=float, default=None, help="setpoint in kN")
+    find_parser.add_argument("--tolerance", type=float, default=0.05)
+    find_parser.add_argument("--operator", default=None)
+    find_parser.add_argument("--outcome", default=None)
+    find_parser.add_argument("--station", default=None)
+    find_parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    catalogue = Run_Catalogue(args.folder)
+    if args.action == "index":
+        t0 = time.perf_counter()
+        added = catalogue.index_folder()
+        print("Runs added:", added, "in", round(time.perf_counter() - t0, 3), "sec")
+        return
+    runs = catalogue.find(since=args.since, until=args.until, target=args.target, tolerance=args.tolerance,
+                          operator=args.operator, outcome=args.outcome, station=args.station, limit=args.limit)
+    for run in runs:
+        start = "-" if run["start_epoch"] is None else time.strftime("%Y-%m-%d %H:%M:%S",
+                                                                     time.localtime(run["start_epoch"]))
+        print("{id:>5}  {start}  {file}  station={station} operator={operator} outcome={outcome} "
+              "setpoint={setpoint_kN} peak={peak_force_kN} duration={duration_s}".format(start=start, **run))
+    print(len(runs), "runs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+# Import relevant packages
+import time
+
+import numpy as np
+
+from .Metrics import METRICS
+from .Scheduler import Fixed_Rate_Scheduler
+
+
+class PID:
+    """
+    Class with a PID controller. The derivative is taken on the measurement (no kick when the setpoint changes)
+    and low-pass filtered, the integral is not accumulated while the output is saturated (anti-windup) and a
+    feed-forward term proportional to the rate of change of the setpoint is added
+    """
+    def __init__(self, kp=2000.0, ki=500.0, kd=0.0, kff=0.0, output_limit=10000.0, derivative_tau=0.05):
+        """
+        Initialize the class with global variables
+        Args:
+            kp: (float) proportional gain (Hz per kN)
+            ki: (float) integral gain (Hz per kN*s)
+            kd: (float) derivative gain (Hz per kN/s)
+            kff: (float) feed-forward gain (Hz per kN/s of setpoint change)
+            output_limit: (float) maximum absolute output (Hz)
+            derivative_tau: (float) time constant in seconds of the derivative low-pass filter
+        """
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.kff = kff
+        self.output_limit = output_limit
+        self.derivative_tau = derivative_tau
+        self.reset()
+
+    def reset(self):
+        self.integral = 0.0
+        self.derivative = 0.0
+        self.last_measurement = None
+        self.last_setpoint = None
+        self.output = 0.0
+
+    def step(self, setpoint, measurement, dt, integrate=True):
+        """
+        Compute a new output
+        Args:
+            setpoint: (float) wanted force in kN
+            measurement: (float) measured force in kN
+            dt: (float) seconds since the last step
+            integrate: (bool) accumulate the error in the integral, False while the output is not applied (e.g.
+        holding inside the deadband)
+        Returns:
+            Output (signed, positive to increase the force)
+        """
+        error = setpoint - measurement
+        if self.last_measurement is None or dt <= 0:
+            self.last_measurement = measurement
+            self.last_setpoint = setpoint
+            dt = 0.0
+
+        feed_forward = 0.0
+        if dt > 0:
+            d_raw = -(measurement - self.last_measurement) / dt
+            self.derivative += dt / (self.derivative_tau + dt) * (d_raw - self.derivative)
+            feed_forward = self.kff * (setpoint - self.last_setpoint) / dt
+
+        unsaturated = self.kp * error + self.integral + self.kd * self.derivative + feed_forward
+        output = float(np.clip(unsaturated, -self.output_limit, self.output_limit))
+
+        # Anti-windup: integrate only when it does not push further into saturation
+        if integrate and (output == unsaturated or np.sign(error) != np.sign(unsaturated)):
+            self.integral += self.ki * error * dt
+            self.integral = float(np.clip(self.integral, -self.output_limit, self.output_limit))
+
+        self.last_measurement = measurement
+        self.last_setpoint = setpoint
+        self.output = output
+        return output
+
+
+class Response_Monitor:
+    """
+    Class that measures the response of the force to a change of setpoint: rise time, overshoot and settle time
+    """
+    def __init__(self, band=0.3, settle_hold=1.0):
+        """
+        Args:
+            band: (float) kN around the setpoint considered on target
+            settle_hold: (float) seconds the force has to stay inside the band to be settled
+        """
+        self.band = band
+        self.settle_hold = settle_hold
+        self.target = None
+        self.start(None, None, None)
+
+    def start(self, t, value, target):
+        """
+        A new setpoint was given
+        Args:
+            t: (float) time
+            value: (float) force when the setpoint changed
+            target: (float) new setpoint
+        Returns:
+        """
+        self.t0 = t
+        self.initial = value
+        self.target = target
+        self.peak = value
+        self.rise_10 = None
+        self.rise_90 = None
+        self.entered_band = None
+        self.settle_time = None
+
+    def update(self, t, value, target):
+        """
+        Add a measurement
+        Args:
+            t: (float) time
+            value: (float) measured force
+            target: (float) current setpoint
+        Returns:
+        """
+        if self.target is None or target != self.target:
+            self.start(t, value, target)
+            return
+        step = self.target - self.initial
+        if step == 0:
+            return
+        progress = (value - self.initial) / step
+        if (value - self.peak) * np.sign(step) > 0:
+            self.peak = value
+        if self.rise_10 is None and progress >= 0.1:
+            self.rise_10 = t
+        if self.rise_90 is None and progress >= 0.9:
+            self.rise_90 = t
+        if abs(value - self.target) <= self.band:
+            if self.entered_band is None:
+                self.entered_band = t
+            if self.settle_time is None and t - self.entered_band >= self.settle_hold:
+                self.settle_time = self.entered_band - self.t0
+        else:
+            self.entered_band = None
+            self.settle_time = None
+
+    def report(self):
+        """
+        Summary of the response to the last setpoint
+        Returns:
+            dict
+        """
+        if self.target is None or self.initial is None:
+            return None
+        step = self.target - self.initial
+        overshoot = 0.0
+        if step != 0:
+            overshoot = max(0.0, float((self.peak - self.target) * np.sign(step)))
+        return {"target": self.target,
+                "initial": self.initial,
+                "rise_time": None if self.rise_90 is None or self.rise_10 is None else
+                float(self.rise_90 - self.rise_10),
+                "overshoot_kN": overshoot,
+                "overshoot_percent": 100 * overshoot / abs(step) if step != 0 else 0.0,
+                "settle_time": None if self.settle_time is None else float(self.settle_time)}
+
+
+class Force_Controller:
+    """
+    Class that closes the loop between the load cell and the pulse/direction outputs. Every step waits for a new
+    reading of the sensor, runs the PID and sets the pulse frequency and the direction. The pulses are driven
+    through the backend of the pin, the frequency set on the pin by the operator (manual moves) is not changed
+    """
+    def __init__(self, balance, pulse, dir, pid=None, rate=40.0, deviation=0.3, min_frequency=50.0,
+                 dir_setup=0.001, clock=time.perf_counter, sleep=time.sleep):
+        """
+        Initialize the class with global variables
+        Args:
+            balance: Balance_Sensor
+            pulse: Output_Pin (or Dummy) of the pulses
+            dir: Output_Pin (or Dummy) of the direction. On moves the press down (less force)
+            pid: PID, a default one is created if None
+            rate: (float) maximum control steps per second, the loop never runs faster than the sensor
+            deviation: (float) kN around the setpoint where the pulses are stopped
+            min_frequency: (float) outputs below this frequency stop the pulses
+            dir_setup: (float) seconds between changing the direction and pulsing again
+            clock: function that returns the current time in seconds (the one of the sensor readings)
+            sleep: function that sleeps a number of seconds
+        """
+        self.balance = balance
+        self.pulse = pulse
+        self.dir = dir
+        self.pid = pid if pid is not None else PID()
+        self.rate = rate
+        self.deviation = deviation
+        self.min_frequency = min_frequency
+        self.dir_setup = dir_setup
+        self.clock = clock
+        self.sleep = sleep
+        self.monitor = Response_Monitor(band=deviation)
+        self.scheduler = None
+        self.reset()
+
+    def reset(self):
+        """
+        Start again from zero (integral, timing, direction)
+        Returns:
+        """
+        self.pid.reset()
+        self.scheduler = None
+        if self.rate:
+            # A virtual clock only advances while sleeping, so it cannot be busy waited
+            spin = 0.0005 if self.sleep is time.sleep else 0.0
+            self.scheduler = Fixed_Rate_Scheduler(1 / self.rate, spin=spin, clock=self.clock, sleep=self.sleep)
+        self.seen = self.balance.buffer.count
+        self.last_time = None
+        self.direction = None  # "up" (more force), "down" (less force) or None when stopped
+        self.steps = 0
+
+    def step(self, setpoint, timeout=1.0):
+        """
+        One iteration of the control loop
+        Args:
+            setpoint: (float) wanted force in kN
+            timeout: (float) seconds to wait for a new sensor reading
+        Returns:
+            Output of the PID (Hz, positive to increase the force)
+        """
+        if self.scheduler is not None:
+            self.scheduler.wait()
+        count = self.balance.wait_new_sample(self.seen, timeout)
+        if count == self.seen:
+            # No new reading: do not move blind
+            self.hold()
+            return 0.0
+        return self._update(setpoint, count)
+
+    def poll(self, setpoint, timeout=1.0):
+        """
+        Non-blocking step for a loop that serves several controllers: it only acts when the sensor has a new reading
+        Args:
+            setpoint: (float) wanted force in kN
+            timeout: (float) seconds without new readings after which the pulses are stopped
+        Returns:
+            Output of the PID, None if there was no new reading
+        """
+        count = self.balance.buffer.count
+        if count == self.seen:
+            if self.last_time is not None and self.clock() - self.last_time > timeout:
+                # No new reading: do not move blind
+                self.hold()
+            return None
+        return self._update(setpoint, count)
+
+    def _update(self, setpoint, count):
+        m0 = METRICS.start()
+        self.seen = count
+        t, _ = self.balance.buffer.latest()
+        measurement = self.balance.ave
+        dt = 0.0 if self.last_time is None else t - self.last_time
+        self.last_time = t
+
+        on_target = abs(setpoint - measurement) <= self.deviation
+        # On target the pulses stop: the integral is kept but does not grow (it would wind up while holding)
+        output = self.pid.step(setpoint, measurement, dt, integrate=not on_target)
+        self.monitor.band = self.deviation
+        self.monitor.update(t, measurement, setpoint)
+        if on_target:
+            self.hold()
+        else:
+            self.apply(output)
+        self.steps += 1
+        METRICS.stop("control_step", m0)
+        return output
+
+    def apply(self, output):
+        """
+        Map the output of the PID to the direction and the frequency of the pulses
+        Args:
+            output: (float) signed frequency in Hz
+        Returns:
+        """
+        frequency = abs(output)
+        if frequency < self.min_frequency:
+            self.hold()
+            return
+        direction = "up" if output > 0 else "down"
+        backend = self.pulse.pulses()
+        if direction != self.direction:
+            self.pulse.stop()
+            if direction == "down":
+                self.dir.on()
+            else:
+                self.dir.off()
+            self.sleep(self.dir_setup)
+            backend.frequency = frequency
+            backend.dc = self.pulse.dc
+            backend.start()
+            self.direction = direction
+        else:
+            backend.set_frequency(frequency)
+
+    def hold(self):
+        """
+        Stop the pulses
+        Returns:
+        """
+        if self.direction is not None:
+            self.pulse.stop()
+            self.direction = None
+
+    def report(self):
+        """
+        Settle time, rise time and overshoot of the last setpoint change
+        Returns:
+            dict
+        """
+        return self.monitor.report()
@@ -0,0 +1,218 @@
+# Import relevant packages
+import math
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+try:
+    from scipy.signal import lfilter
+    SCIPY_IMPORT = True
+except ImportError:
+    SCIPY_IMPORT = False
+
+
+class Filter:
+    """
+    Parent class of the streaming filters. A filter receives blocks of readings and keeps the state it needs
+    between blocks, so filtering a stream block by block gives the same result as filtering it at once
+    """
+    def process(self, block):
+        """
+        Filter a block of readings
+        Args:
+            block: (array) readings, oldest first
+        Returns:
+            np.ndarray with one filtered value per reading
+        """
+        raise NotImplementedError
+
+    def reset(self):
+        """
+        Forget the state
+        Returns:
+        """
+        pass
+
+
+class Moving_Average(Filter):
+    """
+    Average of the last n readings (the same as the old average of a burst, but updated every reading)
+    """
+    def __init__(self, n=15):
+        self.n = int(n)
+        self.reset()
+
+    def reset(self):
+        self.history = np.empty(0, dtype=np.float64)
+
+    def process(self, block):
+        block = np.asarray(block, dtype=np.float64)
+        data = np.concatenate((self.history, block))
+        csum = np.concatenate(([0.0], np.cumsum(data)))
+        end = np.arange(len(self.history) + 1, len(data) + 1)
+        start = np.maximum(end - self.n, 0)
+        out = (csum[end] - csum[start]) / (end - start)
+        self.history = data[-(self.n - 1):] if self.n > 1 else data[:0]
+        return out
+
+
+class Median_Filter(Filter):
+    """
+    Median of the last n readings, a single spike does not change the value
+    """
+    def __init__(self, n=5):
+        self.n = int(n)
+        self.reset()
+
+    def reset(self):
+        self.history = np.empty(0, dtype=np.float64)
+
+    def _windows(self, block):
+        block = np.asarray(block, dtype=np.float64)
+        data = np.concatenate((self.history, block))
+        # Until the window is full the first reading is repeated
+        pad = max(0, self.n - 1 - len(self.history))
+        if pad and len(data):
+            data = np.concatenate((np.full(pad, data[0]), data))
+        self.history = data[-(self.n - 1):] if self.n > 1 else data[:0]
+        return block, sliding_window_view(data, self.n)
+
+    def process(self, block):
+        block = np.asarray(block, dtype=np.float64)
+        if len(block) == 0:
+            return block
+        block, windows = self._windows(block)
+        return np.median(windows, axis=1)
+
+
+class Outlier_Rejection(Median_Filter):
+    """
+    Hampel filter: a reading that is more than k scaled MADs away from the median of the last n readings is
+    replaced by that median, the rest pass unchanged
+    """
+    def __init__(self, n=7, k=3.0):
+        super().__init__(n)
+        self.k = k
+
+    def process(self, block):
+        block = np.asarray(block, dtype=np.float64)
+        if len(block) == 0:
+            return block
+        block, windows = self._windows(block)
+        median = np.median(windows, axis=1)
+        mad = 1.4826 * np.median(np.abs(windows - median[:, None]), axis=1)
+        outlier = np.abs(block - median) > self.k * mad
+        outlier &= mad > 0
+        return np.where(outlier, median, block)
+
+
+class IIR_Filter(Filter):
+    """
+    Generic recursive filter y = b/a * x with state kept between blocks (direct form II transposed)
+    """
+    def __init__(self, b, a):
+        a = np.asarray(a, dtype=np.float64)
+        self.b = np.asarray(b, dtype=np.float64) / a[0]
+        self.a = a / a[0]
+        self.reset()
+
+    def reset(self):
+        self.zi = None
+
+    def _initial_state(self, x0):
+        """
+        State that gives a steady output equal to x0, so the filter does not start from 0 kN
+        """
+        order = max(len(self.a), len(self.b)) - 1
+        b = np.pad(self.b, (0, order + 1 - len(self.b)))
+        a = np.pad(self.a, (0, order + 1 - len(self.a)))
+        zi = np.zeros(order)
+        for i in range(order - 1, -1, -1):
+            zi[i] = (b[i + 1] - a[i + 1]) * x0 + (zi[i + 1] if i + 1 < order else 0.0)
+        return zi
+
+    def process(self, block):
+        block = np.asarray(block, dtype=np.float64)
+        if len(block) == 0:
+            return block
+        if self.zi is None:
+            self.zi = self._initial_state(block[0])
+        if SCIPY_IMPORT:
+            out, self.zi = lfilter(self.b, self.a, block, zi=self.zi)
+            return out
+        order = len(self.zi)
+        b = np.pad(self.b, (0, order + 1 - len(self.b)))
+        a = np.pad(self.a, (0, order + 1 - len(self.a)))
+        zi = self.zi
+        out = np.empty_like(block)
+        for n, x in enumerate(block):
+            y = b[0] * x + zi[0]
+            for i in range(order - 1):
+                zi[i] = b[i + 1] * x + zi[i + 1] - a[i + 1] * y
+            zi[order - 1] = b[order] * x - a[order] * y
+            out[n] = y
+        return out
+
+
+class Exponential_Smoothing(IIR_Filter):
+    """
+    y[n] = y[n-1] + alpha * (x[n] - y[n-1])
+    """
+    def __init__(self, alpha=0.2):
+        self.alpha = alpha
+        super().__init__([alpha], [1.0, alpha - 1.0])
+
+
+class Low_Pass(IIR_Filter):
+    """
+    Second order Butterworth low-pass filter
+    """
+    def __init__(self, cutoff=5.0, sample_rate=80.0):
+        """
+        Args:
+            cutoff: (float) cut-off frequency in Hz
+            sample_rate: (float) samples per second of the readings
+        """
+        self.cutoff = cutoff
+        self.sample_rate = sample_rate
+        # Bilinear transform of the analog prototype
+        k = math.tan(math.pi * cutoff / sample_rate)
+        norm = 1 / (1 + math.sqrt(2) * k + k * k)
+        b0 = k * k * norm
+        super().__init__([b0, 2 * b0, b0],
+                         [1.0, 2 * (k * k - 1) * norm, (1 - math.sqrt(2) * k + k * k) * norm])
+
+
+class Filter_Pipeline(Filter):
+    """
+    Chain of filters applied one after the other
+    """
+    def __init__(self, stages=None):
+        self.stages = list(stages or [])
+
+    def reset(self):
+        for stage in self.stages:
+            stage.reset()
+
+    def process(self, block):
+        out = np.asarray(block, dtype=np.float64)
+        for stage in self.stages:
+            out = stage.process(out)
+        return out
+
+
+def make_filter(name, **kwargs):
+    """
+    Create a filter by its name
+    Args:
+        name: (str) "average", "median", "outlier", "exponential" or "lowpass"
+        **kwargs: parameters of the filter
+    Returns:
+        Filter
+    """
+    filters = {"average": Moving_Average,
+               "median": Median_Filter,
+               "outlier": Outlier_Rejection,
+               "exponential": Exponential_Smoothing,
+               "lowpass": Low_Pass}
+    return filters[name](**kwargs)
@@ -0,0 +1,97 @@
+# Import relevant packages
+import queue
+
+from .Metrics import METRICS
+
+
+class Gui_Bridge:
+    """
+    Class that passes values from the worker threads to the Tk widgets. Workers only publish values in a queue;
+    the Tk main loop drains it every refresh period, keeps only the latest value of every topic and calls the
+    subscribers when that value changed. No widget is touched from a worker thread
+    """
+    def __init__(self, refresh_ms=100):
+        """
+        Initialize the class with global variables
+        Args:
+            refresh_ms: (int) milliseconds between two refreshes of the widgets
+        """
+        self.refresh_ms = refresh_ms
+        self.queue = queue.SimpleQueue()
+        self.subscribers = {}
+        self.rendered = {}  # last value given to the subscribers of every topic
+        self.root = None
+        self._after_id = None
+        self.published = 0
+        self.delivered = 0
+
+    def publish(self, topic, value):
+        """
+        Send a value to the GUI, it can be called from any thread and never blocks
+        Args:
+            topic: (str) name of the value, e.g. "force"
+            value: new value
+        Returns:
+        """
+        self.queue.put((topic, value))
+        self.published += 1
+
+    def subscribe(self, topic, callback):
+        """
+        Call callback(value) in the Tk thread when a new value of topic arrives
+        Args:
+            topic: (str) name of the value
+            callback: function with one argument
+        Returns:
+        """
+        self.subscribers.setdefault(topic, []).append(callback)
+
+    def start(self, root):
+        """
+        Start refreshing on the Tk main loop of root
+        Args:
+            root: tk.Tk (or any widget) that owns the main loop
+        Returns:
+        """
+        self.root = root
+        self._tick()
+
+    def stop(self):
+        if self.root is not None and self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+        self._after_id = None
+        self.root = None
+
+    def drain(self):
+        """
+        Take everything out of the queue and keep only the latest value of every topic
+        Returns:
+            dict topic: value
+        """
+        latest = {}
+        while True:
+            try:
+                topic, value = self.queue.get_nowait()
+            except queue.Empty:
+                return latest
+            latest[topic] = value
+
+    def refresh(self):
+        """
+        Deliver the new values to the subscribers (only the ones that changed)
+        Returns:
+        """
+        m0 = METRICS.start()
+        for topic, value in self.drain().items():
+            if topic in self.rendered and self.rendered[topic] == value:
+                continue
+            self.rendered[topic] = value
+            for callback in self.subscribers.get(topic, []):
+                callback(value)
+                self.delivered += 1
+        METRICS.stop("gui_refresh", m0)
+
+    def _tick(self):
+        self.refresh()
+        if self.root is not None:
+            self._after_id = self.root.after(self.refresh_ms, self._tick)
@@ -0,0 +1,317 @@
+# Import relevant packages
+import tkinter as tk
+
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+
+class Minmax_Decimator:
+    """
+    Class that reduces a growing series to at most 2 * max_bins points keeping the minimum and the maximum of every
+    time bin, so peaks are never lost on screen. Points are added incrementally; when there are too many bins their
+    width is doubled and neighbours are merged, so the cost does not grow with the length of the recording
+    """
+    def __init__(self, max_bins=700, bin_width=0.01):
+        """
+        Initialize the class with global variables
+        Args:
+            max_bins: (int) maximum number of bins, about the width of the plot in pixels
+            bin_width: (float) initial width of a bin in seconds
+        """
+        self.max_bins = max_bins
+        self.initial_width = bin_width
+        self.reset()
+
+    def reset(self):
+        self.bin_width = self.initial_width
+        self.index = np.empty(0, dtype=np.int64)
+        self.x_min = np.empty(0)  # x of the minimum of every bin
+        self.y_min = np.empty(0)
+        self.x_max = np.empty(0)  # x of the maximum of every bin
+        self.y_max = np.empty(0)
+
+    def __len__(self):
+        return len(self.index)
+
+    @staticmethod
+    def _reduce(index, x_min, y_min, x_max, y_max):
+        """
+        Merge the entries that have the same bin index (index has to be sorted)
+        """
+        starts = np.flatnonzero(np.concatenate(([True], index[1:] != index[:-1])))
+        ends = np.append(starts[1:], len(index))
+        out_min_y = np.minimum.reduceat(y_min, starts)
+        out_max_y = np.maximum.reduceat(y_max, starts)
+        # Position of the extremes inside every group
+        group = np.repeat(np.arange(len(starts)), ends - starts)
+        is_min = y_min == out_min_y[group]
+        is_max = y_max == out_max_y[group]
+        pos_min = np.minimum.reduceat(np.where(is_min, np.arange(len(index)), len(index)), starts)
+        pos_max = np.minimum.reduceat(np.where(is_max, np.arange(len(index)), len(index)), starts)
+        return index[starts], x_min[pos_min], out_min_y, x_max[pos_max], out_max_y
+
+    def add(self, x, y):
+        """
+        Add new points (x has to be increasing)
+        Args:
+            x: (array) time
+            y: (array) values
+        Returns:
+        """
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        keep = np.isfinite(y)
+        x, y = x[keep], y[keep]
+        if len(x) == 0:
+            return
+        index = np.floor(x / self.bin_width).astype(np.int64)
+        if len(self.index) == 0:
+            bins = self._reduce(index, x, y, x, y)
+        else:
+            bins = self._append(index, x, y)
+        self.index, self.x_min, self.y_min, self.x_max, self.y_max = bins
+        while len(self.index) > self.max_bins:
+            self.bin_width *= 2
+            self.index, self.x_min, self.y_min, self.x_max, self.y_max = self._reduce(
+                self.index // 2, self.x_min, self.y_min, self.x_max, self.y_max)
+
+    def _append(self, index, x, y):
+        # The last bin may still receive points, so it is merged again with the new ones
+        tail = self._reduce(np.concatenate((self.index[-1:], index)),
+                            np.concatenate((self.x_min[-1:], x)),
+                            np.concatenate((self.y_min[-1:], y)),
+                            np.concatenate((self.x_max[-1:], x)),
+                            np.concatenate((self.y_max[-1:], y)))
+        head = (self.index[:-1], self.x_min[:-1], self.y_min[:-1], self.x_max[:-1], self.y_max[:-1])
+        return tuple(np.concatenate((h, t)) for h, t in zip(head, tail))
+
+    def line_data(self):
+        """
+        Points to draw: the minimum and the maximum of every bin in time order
+        Returns:
+            (x, y) numpy arrays
+        """
+        first_min = self.x_min <= self.x_max
+        x = np.empty(2 * len(self.index))
+        y = np.empty(2 * len(self.index))
+        x[0::2] = np.where(first_min, self.x_min, self.x_max)
+        y[0::2] = np.where(first_min, self.y_min, self.y_max)
+        x[1::2] = np.where(first_min, self.x_max, self.x_min)
+        y[1::2] = np.where(first_min, self.y_max, self.y_min)
+        return x, y
+
+
+class Live_Plot:
+    """
+    Class with a window that plots the recording while it grows. Only the new samples are added to the lines and,
+    while the axes do not change, only the lines are redrawn over a saved background (blitting). The end of a long
+    test (last hour, last day...) is plotted from the min/max/mean bins of the store (Sample_Store.window())
+    """
+    # Name in the menu -> seconds shown: None for the samples since the window was opened, "all" for the whole test
+    spans = (("Since opened", None), ("Last 10 min", 600), ("Last hour", 3600), ("Last day", 86400),
+             ("Whole test", "all"))
+
+    def __init__(self, master, samples, fps=5, max_bins=700, max_tail=50000):
+        """
+        Initialize the class with global variables
+        Args:
+            master: Tk widget that owns the main loop
+            samples: Sample_Store of the recording
+            fps: (float) refreshes per second
+            max_bins: (int) maximum number of min/max pairs drawn per line
+            max_tail: (int) new samples read in one frame; with more (e.g. the first frame of a long test) the
+        lines start again from the bins of the store
+        """
+        self.samples = samples
+        self.fps = fps
+        self.max_bins = max_bins
+        self.max_tail = max_tail
+        self.paused = False
+        self.span = None
+        self.drawn_total = None  # samples.total of the last window drawn
+        self.seen = 0  # samples.total already plotted
+        self.force = Minmax_Decimator(max_bins)
+        self.setpoint = Minmax_Decimator(max_bins)
+
+        self.window = tk.Toplevel(master)
+        self.window.title("Plot time ")
+        self.window.geometry('750x400')
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        self.figure = Figure(figsize=(7, 3))
+        self.ax = self.figure.add_subplot(111)
+        self.ax.set_xlabel("Time (sec)")
+        self.ax.set_ylabel("Force (kN)")
+        self.ax.grid()
+        self.ax.set_xlim(0, 10)
+        self.ax.set_ylim(0, 1)
+        self.force_line, = self.ax.plot([], [], '-', color="Blue", animated=True)
+        self.setpoint_line, = self.ax.plot([], [], '--', color="Red", animated=True)
+
+        self.canvas = FigureCanvasTkAgg(self.figure, master=self.window)
+        self.canvas.get_tk_widget().pack(fill='both', expand=True)
+        self.background = None
+        self.canvas.mpl_connect("draw_event", self._on_draw)
+
+        controls = tk.Frame(self.window)
+        controls.pack()
+        self.btn_pause = tk.Button(controls, text="Pause", command=self.toggle_pause, width=10)
+        self.btn_pause.pack(side="left")
+        self.span_name = tk.StringVar(value=self.spans[0][0], master=self.window)
+        tk.OptionMenu(controls, self.span_name, *[name for name, _ in self.spans],
+                      command=self.set_span).pack(side="left")
+
+        self._after_id = None
+        self.canvas.draw()
+        self.frame()
+
+    def toggle_pause(self):
+        self.paused = not self.paused
+        self.btn_pause.configure(text="Resume" if self.paused else "Pause")
+
+    def set_span(self, name):
+        """
+        Change the part of the recording that is shown
+        Args:
+            name: (str) name of the span in Live_Plot.spans
+        Returns:
+        """
+        self.span = dict(self.spans)[name]
+        self.drawn_total = None
+        if self.span is None:
+            # Back to the samples since the window was opened: the limits grow again from the start
+            self.ax.set_xlim(0, 10)
+            self.ax.set_ylim(0, 1)
+            x, y = self.force.line_data()
+            self.force_line.set_data(x, y)
+            xs, ys = self.setpoint.line_data()
+            self.setpoint_line.set_data(xs, ys)
+            self._update_limits(x, np.concatenate((y, ys)))
+            self.canvas.draw_idle()
+
+    def close(self):
+        if self._after_id is not None:
+            self.window.after_cancel(self._after_id)
+            self._after_id = None
+        self.window.destroy()
+
+    def _on_draw(self, event):
+        # A full draw happened (new limits, resize): save the background without the lines
+        self.background = self.canvas.copy_from_bbox(self.ax.bbox)
+        self._draw_lines()
+
+    def _draw_lines(self):
+        self.ax.draw_artist(self.force_line)
+        self.ax.draw_artist(self.setpoint_line)
+
+    def _update_limits(self, x, y):
+        """
+        Grow the axes when the data goes out of them
+        Returns:
+            True if the limits changed (a full draw is needed)
+        """
+        changed = False
+        x0, x1 = self.ax.get_xlim()
+        if len(x) and x[-1] > x1:
+            self.ax.set_xlim(x0, x[-1] * 1.5)
+            changed = True
+        y0, y1 = self.ax.get_ylim()
+        if len(y):
+            lo, hi = np.min(y), np.max(y)
+            if lo < y0 or hi > y1:
+                margin = 0.1 * max(hi - lo, 1.0)
+                self.ax.set_ylim(min(y0, lo - margin), max(y1, hi + margin))
+                changed = True
+        return changed
+
+    def frame(self):
+        """
+        Add the new samples and redraw
+        Returns:
+        """
+        if not self.paused and self.span is not None:
+            self.frame_window()
+        elif not self.paused:
+            if self.add_new_samples():
+                x, y = self.force.line_data()
+                self.force_line.set_data(x, y)
+                xs, ys = self.setpoint.line_data()
+                self.setpoint_line.set_data(xs, ys)
+                if self._update_limits(x, np.concatenate((y, ys))) or self.background is None:
+                    self.canvas.draw_idle()
+                else:
+                    self.canvas.restore_region(self.background)
+                    self._draw_lines()
+                    self.canvas.blit(self.ax.bbox)
+        self._after_id = self.window.after(int(1000 / self.fps), self.frame)
+
+    def add_new_samples(self):
+        """
+        Add the samples recorded since the last frame to the lines. When there are more than max_tail, the lines
+        are built again from the bins of the store instead of reading all the samples in the Tk thread
+        Returns:
+            True if the lines changed
+        """
+        total = self.samples.total
+        if total < self.seen:
+            # The recording was cleared
+            self.force.reset()
+            self.setpoint.reset()
+            self.seen = 0
+        new = total - self.seen
+        if new <= 0:
+            return False
+        self.seen = total
+        if new <= self.max_tail:
+            time_sec, force, setpoint = self.samples.tail(new)
+            self.force.add(time_sec, force)
+            self.setpoint.add(time_sec, setpoint)
+            return True
+        self.force.reset()
+        self.setpoint.reset()
+        try:
+            bins = self.samples.window()
+        except RuntimeError:
+            # A store without Resolution_Pyramid: only its last samples
+            time_sec, force, setpoint = self.samples.tail(self.max_tail)
+            self.force.add(time_sec, force)
+            self.setpoint.add(time_sec, setpoint)
+            return True
+        # The start of the bins, not the centre, so the samples that come next are never before them
+        y = np.empty(2 * len(bins["time"]))
+        y[0::2] = bins["Force_kN_min"]
+        y[1::2] = bins["Force_kN_max"]
+        self.force.add(np.repeat(bins["time"], 2), y)
+        self.setpoint.add(bins["time"], bins["Setpoint_kN_mean"])
+        return True
+
+    def frame_window(self):
+        """
+        Draw the span of the recording from the bins of the store: the minimum and maximum of the force of every
+        bin and the mean of the setpoint
+        Returns:
+        """
+        total = self.samples.total
+        if total == self.drawn_total:
+            return
+        self.drawn_total = total
+        seconds = None if self.span == "all" else self.span
+        bins = self.samples.window(seconds, None if seconds is None else seconds / self.max_bins)
+        centre = bins["time"] + bins["resolution"] / 2
+        y = np.empty(2 * len(centre))
+        y[0::2] = bins["Force_kN_min"]
+        y[1::2] = bins["Force_kN_max"]
+        self.force_line.set_data(np.repeat(centre, 2), y)
+        self.setpoint_line.set_data(centre, bins["Setpoint_kN_mean"])
+        if len(centre):
+            end = bins["time"][-1] + bins["resolution"]
+            start = bins["time"][0] if seconds is None else max(0.0, end - seconds)
+            self.ax.set_xlim(start, max(end, start + bins["resolution"]))
+            values = np.concatenate((y, bins["Setpoint_kN_mean"]))
+            values = values[np.isfinite(values)]
+            if len(values):
+                lo, hi = values.min(), values.max()
+                margin = 0.1 * max(hi - lo, 0.1)
+                self.ax.set_ylim(lo - margin, hi + margin)
+        self.canvas.draw_idle()
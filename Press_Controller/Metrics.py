@@ -0,0 +1,310 @@
+"""
+Lightweight instrumentation of the hot paths: counters, timing histograms and gauges (e.g. queue depths).
+
+The instrumented code does:
+
+    t0 = METRICS.start()
+    ...work...
+    METRICS.stop("sensor_read", t0)
+
+When the metrics are disabled start() returns 0 and stop() returns at once, so the cost is a function call. They
+are enabled with METRICS.enable() or the environment variable PRESS_METRICS=1. They can be read with the "metrics"
+command of the service, appended to a file by a Metrics_Logger or scraped over http from a Metrics_Http_Server.
+"""
+# Import relevant packages
+import bisect
+import json
+import os
+import threading
+import time
+
+# Upper limits of the buckets of the histograms in seconds: 1 us to ~17 s, doubling
+BUCKETS = [1e-6 * 2 ** i for i in range(25)]
+
+
+class Histogram:
+    """
+    Class with the distribution of a duration in buckets of fixed limits, so adding a value is O(log buckets) and
+    the memory does not grow
+    """
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q):
+        """
+        Upper limit of the bucket that contains the percentile q
+        Args:
+            q: (float) percentile between 0 and 100
+        Returns:
+            Seconds, None without values
+        """
+        if self.count == 0:
+            return None
+        rank = q / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return BUCKETS[i] if i < len(BUCKETS) else self.max
+        return self.max
+
+    def summary(self):
+        return {"count": self.count,
+                "mean_us": self.total / self.count * 1e6 if self.count else None,
+                "p50_us": None if self.count == 0 else self.percentile(50) * 1e6,
+                "p99_us": None if self.count == 0 else self.percentile(99) * 1e6,
+                "max_us": self.max * 1e6}
+
+
+class Metrics:
+    """
+    Class with the counters, histograms and gauges of the program
+    """
+    def __init__(self, enabled=False):
+        """
+        Initialize the class with global variables
+        Args:
+            enabled: (bool) collect the metrics
+        """
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}
+        self.started = time.time()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self.lock:
+            self.counters = {}
+            self.histograms = {}
+            self.started = time.time()
+
+    def start(self):
+        """
+        Start timing
+        Returns:
+            Start time, 0 if the metrics are disabled
+        """
+        if not self.enabled:
+            return 0
+        return time.perf_counter()
+
+    def stop(self, name, t0):
+        """
+        Add the time since start() to a histogram
+        Args:
+            name: (str) name of the histogram
+            t0: value returned by start()
+        Returns:
+        """
+        if not t0:
+            return
+        self.observe(name, time.perf_counter() - t0)
+
+    def observe(self, name, value):
+        """
+        Add a duration to a histogram
+        Args:
+            name: (str) name of the histogram
+            value: (float) seconds
+        Returns:
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.add(value)
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def gauge(self, name, function):
+        """
+        Register a value that is read when the metrics are asked for (e.g. the size of a queue)
+        Args:
+            name: (str) name of the gauge
+            function: function without arguments that returns a number
+        Returns:
+        """
+        with self.lock:
+            self.gauges[name] = function
+
+    def remove_gauge(self, name):
+        """
+        Forget a gauge (e.g. of a station that is removed), nothing happens if it is not registered
+        Args:
+            name: (str) name of the gauge
+        Returns:
+        """
+        with self.lock:
+            self.gauges.pop(name, None)
+
+    def snapshot(self):
+        """
+        All the metrics
+        Returns:
+            dict
+        """
+        with self.lock:
+            functions = list(self.gauges.items())
+        gauges = {}
+        for name, function in functions:
+            try:
+                gauges[name] = function()
+            except Exception:
+                gauges[name] = None
+        elapsed = time.time() - self.started
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {name: h.summary() for name, h in self.histograms.items()}
+        return {"enabled": self.enabled,
+                "seconds": elapsed,
+                "counters": counters,
+                "rates": {name: value / elapsed for name, value in counters.items()} if elapsed > 0 else {},
+                "histograms": histograms,
+                "gauges": gauges}
+
+    def report(self, snapshot=None):
+        """
+        Metrics as text, one per line
+        Args:
+            snapshot: dict of snapshot() (e.g. received from a remote service), the current metrics if None
+        Returns:
+            str
+        """
+        if snapshot is None:
+            snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot["counters"].items()):
+            lines.append("{}: {} ({:.1f}/s)".format(name, value, snapshot["rates"].get(name, 0.0)))
+        for name, h in sorted(snapshot["histograms"].items()):
+            lines.append("{}: n={} p50={:.0f}us p99={:.0f}us max={:.0f}us".format(
+                name, h["count"], h["p50_us"] or 0, h["p99_us"] or 0, h["max_us"]))
+        for name, value in sorted(snapshot["gauges"].items()):
+            lines.append("{}: {}".format(name, value))
+        return "\n".join(lines)
+
+    def prometheus(self):
+        """
+        Metrics in the text format of Prometheus
+        Returns:
+            str
+        """
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot["counters"].items()):
+            lines.append("press_{}_total {}".format(name, value))
+        with self.lock:
+            histograms = list(self.histograms.items())
+        for name, h in sorted(histograms):
+            cumulative = 0
+            for limit, n in zip(BUCKETS, h.counts):
+                cumulative += n
+                lines.append('press_{}_seconds_bucket{{le="{:g}"}} {}'.format(name, limit, cumulative))
+            lines.append('press_{}_seconds_bucket{{le="+Inf"}} {}'.format(name, h.count))
+            lines.append("press_{}_seconds_sum {}".format(name, h.total))
+            lines.append("press_{}_seconds_count {}".format(name, h.count))
+        for name, value in sorted(snapshot["gauges"].items()):
+            if value is not None:
+                lines.append("press_{} {}".format(name, value))
+        return "\n".join(lines) + "\n"
+
+
+class Metrics_Logger:
+    """
+    Class that appends the metrics as a json line to a file every period seconds
+    """
+    def __init__(self, metrics, path, period=10.0):
+        self.metrics = metrics
+        self.path = path
+        self.period = period
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._thread_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def _thread_loop(self):
+        while not self.stopped.wait(self.period):
+            snapshot = self.metrics.snapshot()
+            snapshot["time"] = time.time()
+            with open(self.path, "a") as f:
+                f.write(json.dumps(snapshot) + "\n")
+
+
+class Metrics_Http_Server:
+    """
+    Class that serves the metrics on http://127.0.0.1:port/metrics (text format of Prometheus) and /metrics.json
+    """
+    def __init__(self, metrics, port=9105, host="127.0.0.1"):
+        self.metrics = metrics
+        self.address = (host, port)
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        import http.server  # only needed when the metrics are served
+
+        metrics = self.metrics
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, content_type = metrics.prometheus(), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, content_type = json.dumps(metrics.snapshot()), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(self.address, Handler)
+        self.address = self.server.server_address
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        print("Metrics served on http://{}:{}/metrics".format(*self.address))
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+METRICS = Metrics(enabled=os.environ.get("PRESS_METRICS", "0") not in ("", "0"))
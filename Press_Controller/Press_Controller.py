@@ -17,28 +17,48 @@ from tkinter import messagebox
 from tkinter import filedialog
 
 import numpy as np
-import pandas as pd
 
 from abc import ABCMeta
 from abc import abstractmethod
+import os
 import threading
 from datetime import datetime
 import time
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import matplotlib
-matplotlib.use("TkAgg")
+
+# pandas and matplotlib are only imported when a recording is exported or plotted (Sample_Store, Live_Plot): on a
+# Raspberry Pi they take seconds, before the window could appear
+from .Sample_Store import Sample_Store
+from .Recording_Writer import Recording_Writer, Writer_Pool
+from .Binary_Recording import write_recording, EXTENSION
+from .Scheduler import Fixed_Rate_Scheduler, wait_next
+from .Acquisition import Acquisition_Engine
+from .Filters import Filter_Pipeline, Moving_Average
+from .Calibration import Calibration
+from .Control import Force_Controller
+from .Profile import Profile, Profile_Executor
+from .Gui_Bridge import Gui_Bridge
+from .Pulse import Pulse_Backend, Simulated_Pulse, make_pulse_backend
+from .Simulator import Press_Simulator
+from .Metrics import METRICS
+from .Workers import Worker_Scheduler
+from .Async_Runtime import Async_Runtime
+from .Catalogue import Run_Catalogue, CATALOGUE_NAME
+from .Supervisor import Safety_Supervisor
+from .Startup import STARTUP
 
 
 class Output_Pin:
     """
-    Class to control the high and low, frequency and duty cycle for an specific channel output
+    Class to control the high and low, frequency and duty cycle for an specific channel output. The pulses are
+    given by a Pulse_Backend (see Pulse.py)
     """
-    def __init__(self, channel):
+    def __init__(self, channel, backend=None):
         """
         Initinialize the class with global variables
         Args:
             channel: (int) the GPIO pin to which the class will connect
+            backend: Pulse_Backend or its name ("rpi", "pigpio", "simulated") that gives the pulses. By default the
+        software PWM of RPi.GPIO
         """
 
         self.channel = channel
@@ -46,7 +66,7 @@ class Output_Pin:
         IO.setup(self.channel, IO.OUT)
         self.frequency = 10000
         self.dc = 50  # duty cycle
-        self.p = None
+        self.backend = backend
         # self.active = None
 
     def on(self):
@@ -65,53 +85,124 @@ class Output_Pin:
         IO.output(self.channel, IO.LOW)
         print("Turned: Off")
 
+    def pulses(self):
+        """
+        Pulse generator of the pin, created the first time it is needed
+        Returns:
+            Pulse_Backend
+        """
+        if not isinstance(self.backend, Pulse_Backend):
+            self.backend = make_pulse_backend(self.backend or "rpi", self.channel, frequency=self.frequency,
+                                              dc=self.dc)
+        return self.backend
+
     def start_PWM(self):
         """
-        Initialize the PWM
+        Initialize the PWM (only once, the same generator is used for every movement)
         Returns:
         """
-        if self.p is None:
-            self.p = IO.PWM(self.channel, self.frequency)  # channel, frequency
-            
-        else:
-            self.p = None
-            self.p = IO.PWM(self.channel, self.frequency)  # channel, frequency
+        self.pulses().setup()
         print("Ready to use")
-                    
+
     def move_PWM(self):
         """
         Start the PWM movement
         Returns:
         """
-        self.p.start(self.dc)
+        backend = self.pulses()
+        backend.frequency = self.frequency
+        backend.dc = self.dc
+        backend.start()
         print("Moving press...")
 
+    def move_pulses(self, count, start_frequency=None, ramp_pulses=0):
+        """
+        Give an exact number of pulses at self.frequency, with an acceleration ramp
+        Args:
+            count: (int) number of pulses
+            start_frequency: (float) frequency at the start and at the end of the ramps, no ramp if None
+            ramp_pulses: (int) pulses of every ramp
+        Returns:
+        """
+        self.pulses().dc = self.dc
+        self.pulses().send_pulses(count, self.frequency, start_frequency, ramp_pulses)
+
+    def set_frequency(self, frequency):
+        """
+        Change the frequency of the pulses, also while they are running
+        Args:
+            frequency: (float) frequency in Hz
+        Returns:
+        """
+        self.frequency = frequency
+        if isinstance(self.backend, Pulse_Backend):
+            self.backend.set_frequency(frequency)
+
+    def set_duty_cycle(self, dc):
+        self.dc = dc
+        if isinstance(self.backend, Pulse_Backend):
+            self.backend.set_duty_cycle(dc)
+
     def stop(self):
         """
         Stop the movement of the press by switchin off the channel output
         Returns:
         """
-
-        try:
-            self.p.stop()
+        if isinstance(self.backend, Pulse_Backend):
+            self.backend.stop()
             print("Stop moving")
-        except:
+        else:
             print("Nothing to move")
 
 
 class Input_Pin:
-    def __init__(self, channel):
+    """
+    Class of a digital input (ready signal of the drive, limit switches, emergency stop). The changes are detected
+    by the GPIO edge interrupts and given to the callbacks at once, nobody has to poll the pin
+    """
+    def __init__(self, channel, pull_down=True, bouncetime=20):
         """
         Initinialize the class with global variables
         Args:
             channel: (int) the GPIO input pin to which the class will connect
+            pull_down: (bool) pull-down resistor (the switch gives 3.3 V), pull-up if False (the switch gives GND)
+            bouncetime: (int) milliseconds after an edge in which the bounces of the contact are ignored
         """
         self.channel = channel
+        self.bouncetime = bouncetime
+        self.callbacks = []
+        self.lock = threading.Lock()
         IO.setmode(IO.BCM)
-        IO.setup(self.channel, IO.IN, pull_up_down=IO.PUD_DOWN)
-        IO.add_event_detect(self.channel, IO.RISING)  # , callback = self.my_callback)#, bouncetime=100)
-        # IO.add_event_callback(self.channel, self.my_callback)
-            
+        IO.setup(self.channel, IO.IN, pull_up_down=IO.PUD_DOWN if pull_down else IO.PUD_UP)
+        self.level = IO.input(self.channel)
+        IO.add_event_detect(self.channel, IO.BOTH, callback=self._edge, bouncetime=bouncetime)
+
+    def add_callback(self, callback):
+        """
+        Call callback(state) from the GPIO thread every time the input changes
+        Args:
+            callback: function with the new state (0 or 1)
+        Returns:
+        """
+        self.callbacks.append(callback)
+
+    def _edge(self, channel):
+        # RPi.GPIO calls back on the first edge and ignores the next ones for bouncetime: the level read now can be
+        # a bounce back to the old one, so it is read again once the contact has settled
+        self._dispatch()
+        timer = threading.Timer(self.bouncetime / 1000, self._dispatch)
+        timer.daemon = True
+        timer.start()
+
+    def _dispatch(self):
+        with self.lock:
+            level = IO.input(self.channel)
+            if level == self.level:
+                return
+            self.level = level
+            for callback in self.callbacks:
+                callback(level)
+
     def state(self):
         """
         Function to determine what is the state of the machine
@@ -121,31 +212,96 @@ class Input_Pin:
         x = IO.input(self.channel)
         return x
 
+    def close(self):
+        IO.remove_event_detect(self.channel)
+
 
 class Balance_Sensor:
     """
-    Class to conect the hx711 to the Raspberry Pi and read the sensor
+    Class to conect the hx711 to the Raspberry Pi and read the sensor. The readings are taken continuously by an
+    Acquisition_Engine thread and the values are computed from the last readings without waiting for the sensor
     """
-    def __init__(self):  # , dout_pin=21, pd_sck_pin=20, readings=10):
+    def __init__(self, hx=None, filter=None, calibration=None, dout_pin=21, pd_sck_pin=20, clock=time.perf_counter,
+                 sleep=time.sleep, start=True):
         """
          Initinialize the class with global variables. Careful with assignation of pins
+        Args:
+            hx: object with the HX711 reading interface (e.g. Simulated_HX711). If None the real HX711 is used
+            filter: Filter applied to the raw readings, by default the moving average of the last 15 readings
+            calibration: Calibration object or path of a saved calibration file. By default raw/2**23*50
+            dout_pin: (int) GPIO pin of the data output of the HX711
+            pd_sck_pin: (int) GPIO pin of the clock of the HX711
+            clock: function that gives the time of the readings
+            sleep: function that sleeps a number of seconds
+            start: (bool) start the acquisition thread. If False the readings are taken calling
+        engine.read_block() (e.g. in a simulation with a virtual clock)
         """
-        IO.setmode(IO.BCM)
-        self.dout_pin = 21
-        self.pd_sck_pin = 20
+        self.dout_pin = dout_pin
+        self.pd_sck_pin = pd_sck_pin
         self.readings = 15
-        self.ave = 0
-        
-        self.hx = HX711(dout_pin=self.dout_pin, pd_sck_pin=self.pd_sck_pin)  # create an object
-    
+
+        if calibration is None:
+            calibration = Calibration()
+        elif isinstance(calibration, str):
+            calibration = Calibration.load(calibration)
+        self.calibration = calibration
+
+        if hx is None:
+            IO.setmode(IO.BCM)
+            hx = HX711(dout_pin=self.dout_pin, pd_sck_pin=self.pd_sck_pin)  # create an object
+        self.hx = hx
+        if filter is None:
+            filter = Filter_Pipeline([Moving_Average(self.readings)])
+        self.engine = Acquisition_Engine(self.hx, filter=filter, clock=clock, sleep=sleep)
+        if start:
+            self.engine.start()
+
+    @property
+    def buffer(self):
+        return self.engine.buffer
+
+    def wait_new_sample(self, count=None, timeout=1.0):
+        """
+        Block until the acquisition thread has a reading newer than `count`
+        Args:
+            count: (int) number of readings already seen, by default the current one
+            timeout: (float) seconds to wait at most
+        Returns:
+            The new number of readings
+        """
+        if count is None:
+            count = self.buffer.count
+        return self.buffer.wait(count, timeout)
+
+    def sample_rate(self):
+        """
+        Sample rate achieved by the acquisition thread
+        Returns:
+            float samples per second
+        """
+        return self.buffer.effective_rate()
+
+    def set_filter(self, filter):
+        """
+        Change the filter stage of the readings
+        Args:
+            filter: Filter (see Filters.py), None to use the raw readings
+        Returns:
+        """
+        if filter is not None:
+            filter.reset()
+        self.engine.filter = filter
+
     def average_val(self):
         """
-        Function to read an specific amount of measurements and take the average value of these readings
+        Function that gives the latest filtered reading
         Returns:
             Average value
         """
-        ave = np.average(np.array(self.hx.get_raw_data(self.readings)))
-        return ave
+        last = self.buffer.latest()
+        if last is None:
+            return 0.0
+        return last[1]
         
     def corrected_value(self):
         """
@@ -153,40 +309,117 @@ class Balance_Sensor:
         Returns:
             Corrected value in kN
         """
-        ave_cor = (self.average_val()/(2**23))*50
-        self.ave = ave_cor
+        ave_cor = float(self.calibration.convert(self.average_val()))
         return ave_cor
 
+    def force_window(self, n):
+        """
+        Last n filtered readings converted to kN in a single operation
+        Args:
+            n: (int) number of readings
+        Returns:
+            (times, forces) numpy arrays
+        """
+        times, values = self.buffer.window(n)
+        return times, self.calibration.convert(values)
+
+    def tare(self):
+        """
+        Take the current reading as zero force
+        Returns:
+        """
+        self.calibration.capture_tare(self.average_val())
+        print("Tare:", self.calibration.tare)
+
+    @property
+    def ave(self):
+        """
+        Latest force in kN
+        Returns:
+        """
+        return self.corrected_value()
+
+    def stop(self):
+        """
+        Stop the acquisition thread
+        Returns:
+        """
+        self.engine.stop()
+
 
 class Dummy:
     """
-    Class that allow to test the interface and the program outside the raspberry pi
+    Class that allow to test the interface and the program outside the raspberry pi. It replaces the digital
+    pins; the sensor and the movement of the press are simulated by a Press_Simulator (see Simulator.py)
     """
 
-    def __init__(self, channel):
+    def __init__(self, channel, backend=None):
+        """
+        Args:
+            channel: (int) pin number, only informative
+            backend: Pulse_Backend of the pulses, a Simulated_Pulse that records them by default
+        """
         self.channel = channel
         self.frequency = 100
         self.dc = 50  # duty cycle
-        self.p = None
         self.activate = True
         self.ave = 0
+        self.backend = backend if backend is not None else Simulated_Pulse(channel)
+        self.callbacks = []
 
     def on(self):
+        changed = not self.activate
         self.activate = True
         print("Turn On LED")
+        if changed:
+            self._edge()
 
     def off(self):
+        changed = self.activate
         self.activate = False
         print("Turn Off LED")
+        if changed:
+            self._edge()
+
+    def add_callback(self, callback):
+        # As Input_Pin: on() and off() simulate the edges of an input
+        self.callbacks.append(callback)
+
+    def _edge(self):
+        for callback in self.callbacks:
+            callback(self.state())
+
+    def close(self):
+        pass
+
+    def pulses(self):
+        return self.backend
 
     def start_PWM(self):
+        self.backend.setup()
         print("Ready to use")
 
+    def set_frequency(self, frequency):
+        self.frequency = frequency
+        self.backend.set_frequency(frequency)
+
+    def set_duty_cycle(self, dc):
+        self.dc = dc
+        self.backend.set_duty_cycle(dc)
+
     def move_PWM(self):
         print("Frequency:", self.frequency, "Duty Cycle:", self.dc)
         print("moving press...")
+        self.backend.frequency = self.frequency
+        self.backend.dc = self.dc
+        self.backend.start()
+
+    def move_pulses(self, count, start_frequency=None, ramp_pulses=0):
+        self.backend.dc = self.dc
+        self.backend.send_pulses(count, self.frequency, start_frequency, ramp_pulses)
 
     def stop(self):
+        self.backend.stop()
         print("All Stop")
 
     def state(self):
@@ -196,34 +429,42 @@ class Dummy:
             x = 0
         return x
 
-    def corrected_value(self):
-        ave = np.random.randint(100)
-        time.sleep(0.5)
-        return ave
 
 
 class Read_Pin(object):
     """
-    Parent class that contain the threading methods
+    Parent class that contain the threading methods. The update, timer and force operations are run by Workers
+    (see Workers.py): pausing a thread leaves it waiting on a condition without using the CPU and the waits between
+    two runs are interrupted at once by pause() and stop()
     """
     __metaclass__ = ABCMeta
     
-    def __init__(self, **kwargs):
+    def __init__(self, update_period=None, timer_period=None, force_period=None, **kwargs):
         """
         Initialize the class with the threads
         Args:
+            update_period: (float) seconds between two updates, None if update() waits by itself
+            timer_period: (float) seconds between two timer() calls, None if timer() waits by itself
+            force_period: (float) seconds between two force() calls, None if force() waits by itself
             **kwargs:
         """
-        self.lock = threading.Lock()
-        self.time_lock = threading.Lock()
-        self.force_lock = threading.Lock()
-        self.thread = None
-        self.time_thread = None
-        self.force_thread = None
-        self.thread_status = 'stopped'  # status: 'stopped', 'running', 'paused'
-        self.time_thread_status = 'stopped'  # status: 'stopped', 'running', 'paused'
-        self. force_thread_status = 'stopped'
-        
+        self.workers = Worker_Scheduler()
+        self.update_worker = self.workers.add("update", self.update, period=update_period)
+        self.time_worker = self.workers.add("timer", self.timer, period=timer_period)
+        self.force_worker = self.workers.add("force", self.force, period=force_period)
+
+    @property
+    def thread_status(self):
+        return self.update_worker.state  # status: 'stopped', 'running', 'paused'
+
+    @property
+    def time_thread_status(self):
+        return self.time_worker.state
+
+    @property
+    def force_thread_status(self):
+        return self.force_worker.state
+
     @abstractmethod
     def setup_init(self):
         # Wildcard: Everything necessary to set up before a press start working.
@@ -244,118 +485,105 @@ class Read_Pin(object):
         # Wildcard: Single update operation that can be looped in a thread.
         pass
 
-    def thread_timer_loop(self):
-        while self.time_thread_status == 'running':
-            self.time_lock.acquire()
-            self.timer()
-            self.time_lock.release()
-
-    def thread_force_loop(self):
-        while self.force_thread_status == 'running':
-            self.force_lock.acquire()
-            self.force()
-            self.force_lock.release()
-
-    def thread_loop(self):
-        """
-        Main thread loop where the update function is the one that is executed recursively
-        Returns:
-        """
-        while self.thread_status == 'running':
-            self.lock.acquire()
-            self.update()
-            self.lock.release()
-
     def run_force(self):
-        if self.force_thread_status != 'running':
-            self.force_thread_status = 'running'
-            self.force_thread = threading.Thread(target=self.thread_force_loop, daemon=True, )
-            self.force_thread.start()
-            print('Thread started or resumed...')
-        else:
-            print('Thread already running.')
+        self.force_worker.start()
 
     def run_time(self):
-        if self.time_thread_status != 'running':
-            self.time_thread_status = 'running'
-            self.time_thread = threading.Thread(target=self.thread_timer_loop, daemon=True, )
-            self.time_thread.start()
-            print('Thread started or resumed...')
-        else:
-            print('Thread already running.')
+        self.time_worker.start()
 
     def run(self):
         if self.thread_status != 'running':
-            self.thread_status = 'running'
-            self.thread = threading.Thread(target=self.thread_loop, daemon=True, )
-            self.thread.start()
+            self.update_worker.start()
             print('Thread started or resumed...')
         else:
             print('Thread already running.')
 
     def stop(self):
-        if self.thread_status is not 'stopped':
-            self.thread_status = 'stopped'  # set flag to end thread loop
-            self.thread.join()  # wait for the thread to finish
+        if self.thread_status != 'stopped':
+            self.update_worker.stop()
             print('Thread stopped.')
         else:
             print('thread was not running.')
     
     def pause(self):
         if self.thread_status == 'running':
-            self.thread_status = 'paused'  # set flag to end thread loop
-            self.thread.join()  # wait for the thread to finish
+            self.update_worker.pause()
             print('Thread paused.')
         else:
             print('There is no thread running.')
 
-    def pause_time(self):
-        if self.time_thread_status == 'running':
-            self.time_thread_status = 'paused'  # set flag to end thread loop
-            self.time_thread.join()  # wait for the thread to finish
-            print('Thread paused.')
-        else:
-            print('There is no thread running.')
+    def pause_time(self, timeout=1.0):
+        if not self.time_worker.pause(timeout=timeout):
+            print("The recording did not finish in", timeout, "sec, it is left running")
 
-    def pause_force(self):
-        if self.force_thread_status == 'running':
-            self.force_thread_status = 'paused'  # set flag to end thread loop
-            self.force_thread.join()  # wait for the thread to finish
-            print('Thread paused.')
-        else:
-            print('There is no thread running.')
+    def pause_force(self, timeout=1.0):
+        """
+        Pause the force control. The pulses are already stopped by the caller, a step that hangs is not waited for
+        more than timeout
+        Args:
+            timeout: (float) seconds to wait for the step that is running
+        Returns:
+        """
+        if not self.force_worker.pause(timeout=timeout):
+            print("The force control step did not finish in", timeout, "sec, it is left running")
 
+    def stop_threads(self, timeout=2.0):
+        """
+        End all the threads
+        Args:
+            timeout: (float) seconds to wait for every thread
+        Returns:
+        """
+        late = self.workers.stop_all(timeout)
+        if late:
+            print("Threads still running:", ", ".join(late))
 
-class Interface(Read_Pin):
+
+class Station:
     """
-    Interface class that link the channel functionality of the Press_controller class with the the GUI
+    Class with one press (or load cell): its pins, sensor, force controller and recording. The stations do not
+    have threads of their own, the Press_Service runs all of them from the same threads
     """
     def __init__(self,
-                 *args,
+                 name="press",
                  Pulse_channel_out=4,
-                Enable_channel_out=24, 
-                Dir_channel_out=18, 
-                Active_channel_in=23,
-                balance_dt_pin=21,
-                balance_sck_pin=20,
-                is_Dummy=False,
-                 **kwargs):
+                 Enable_channel_out=24,
+                 Dir_channel_out=18,
+                 Active_channel_in=23,
+                 balance_dt_pin=21,
+                 balance_sck_pin=20,
+                 Limit_up_channel_in=None,
+                 Limit_down_channel_in=None,
+                 Estop_channel_in=None,
+                 calibration=None,
+                 is_Dummy=False,
+                 pulse_backend=None,
+                 simulator=None,
+                 writer_pool=None):
         """
-        Function to initialize each buttom from the GUI
+        Initialize the hardware and the recording of the station
         Args:
-            *args:
+            name: (str) name of the station
             Pulse_channel_out: (int) pin number for the Pulse channel
             Enable_channel_out: (int) pin number for the Enabling channel
             Dir_channel_out: (int) pin number for the direction channel
             Active_channel_in: (int) pin number for the active channel
-            balance_dt_pin: Already pass as intrinsic parameter in the class
-            balance_sck_pin: Already pass as intrinsic parameter in the class
+            balance_dt_pin: (int) pin number for the data output of the HX711
+            balance_sck_pin: (int) pin number for the clock of the HX711
+            Limit_up_channel_in: (int) pin number of the upper limit switch, None if there is none
+            Limit_down_channel_in: (int) pin number of the lower limit switch, None if there is none
+            Estop_channel_in: (int) pin number of the emergency stop, None if there is none. The limit switches and
+        the emergency stop are normally closed to GND (pull-up): the input goes to 1 when they open or a wire breaks
+            calibration: Calibration object or path of a calibration file for the load cell, None for the default
             is_Dummy: (boolean) that check if the program is running in a raspberry pi or if want to test the
         interface
-            **kwargs:
+            pulse_backend: Pulse_Backend or name ("rpi", "pigpio") of the generator of the pulses, RPi.GPIO by
+        default. The dummy always records the pulses (Simulated_Pulse)
+            simulator: Press_Simulator of the dummy, one with the default press model if None
+            writer_pool: Writer_Pool shared by the recordings of all the stations
         """
-
-        super().__init__(**kwargs)
+        self.name = name
+        self.simulator = None
         # Method to activate the dummy automatically
         self.dummy = is_Dummy
         if RPi_IMPORT is False:
@@ -363,167 +591,1297 @@ class Interface(Read_Pin):
 
         # Initialize the leds
         if self.dummy:
-            self.pulse = Dummy(Pulse_channel_out)
-            self.enable = Dummy(Enable_channel_out)
+            # The pulses move a simulated press that is read by a simulated load cell
+            self.simulator = simulator if simulator is not None else Press_Simulator()
             self.dir = Dummy(Dir_channel_out)
+            self.pulse = Dummy(Pulse_channel_out, backend=self.simulator.pulses(Pulse_channel_out, self.dir))
+            self.enable = Dummy(Enable_channel_out)
             self.active = Dummy(Active_channel_in)
-            self.balance = Dummy(1)
+            self.balance = Balance_Sensor(hx=self.simulator.load_cell(), calibration=calibration,
+                                          dout_pin=balance_dt_pin, pd_sck_pin=balance_sck_pin)
         else:
-            self.pulse = Output_Pin(Pulse_channel_out)
+            self.pulse = Output_Pin(Pulse_channel_out, backend=pulse_backend)
             self.enable = Output_Pin(Enable_channel_out)
             self.dir = Output_Pin(Dir_channel_out)
             self.active = Input_Pin(Active_channel_in)
-            self.balance = Balance_Sensor()
-    
-        self.sleep = 0.1
-
-        self.df = None
-        self.set_new_df()
+            self.balance = Balance_Sensor(calibration=calibration,
+                                          dout_pin=balance_dt_pin, pd_sck_pin=balance_sck_pin)
+
+        self.pins = {"pulse": Pulse_channel_out,
+                     "enable": Enable_channel_out,
+                     "dir": Dir_channel_out,
+                     "active": Active_channel_in,
+                     "balance_dt": balance_dt_pin,
+                     "balance_sck": balance_sck_pin}
+
+        # Functions listener(station, topic, value) called from the GPIO thread when an input changes
+        self.input_listeners = []
+        self.active.add_callback(lambda state: self.notify("active", state))
+
+        # Safety inputs: they stop the pulses from the edge interrupt, without waiting for any thread
+        self.safety_inputs = {}
+        self.faults = set()
+        self.faults_lock = threading.Lock()  # the faults change in the GPIO, supervisor and service threads
+        for input_name, channel in (("limit_up", Limit_up_channel_in), ("limit_down", Limit_down_channel_in),
+                                    ("estop", Estop_channel_in)):
+            if channel is None:
+                continue
+            if self.dummy:
+                pin = Dummy(channel)
+                pin.activate = False  # switch closed
+            else:
+                pin = Input_Pin(channel, pull_down=False)
+            pin.add_callback(lambda state, input_name=input_name: self.input_changed(input_name, state))
+            self.safety_inputs[input_name] = pin
+            self.pins[input_name] = channel
+            if pin.state():
+                self.faults.add(input_name)
 
-        self.fig = plt.figure("Press Data")
-        self.ax = plt.gca()
-        plt.close()
+        self.sleep = 0.1
 
-        self.btn = None
-        self.lbl = None
-        self.lbl_save = None
+        # The samples are streamed to disk while recording: memory keeps the last ones and, whatever the length of
+        # the test, all of it as min/max/mean bins at several resolutions
+        self.samples = Sample_Store(max_samples=2 ** 20, pyramid=True)
 
         self.start_recording = False
         self.initial_time = None
-
-        self.matplot_update = None
+        self.start_epoch = None
 
         self.sleep_record = 2
+        self.record_scheduler = None
         self.aim = 2
         self.deviation = 0.3
+        self.controller = Force_Controller(self.balance, self.pulse, self.dir, deviation=self.deviation)
+        self.controlling = False
+        self.profile_executor = None
 
         self.dir_name = "./"
+        self.file_prefix = ""  # the name of the station is added when there are several
+
+        # Samples are streamed to disk while recording
+        self.writer_pool = writer_pool
+        self.writer = None
+        self.writer_options = {"flush_interval": 1.0,
+                               "flush_size": 256,
+                               "fsync": "batch",
+                               "max_bytes": None,
+                               "max_seconds": None}
+        self.save_format = "csv"  # "csv" or "binary"
+
+        # Every finished file is added to the Run_Catalogue of the folder with how the run went
+        self.catalogue = None
+        self.operator = None
+        self.run = None
+
+    def notify(self, topic, value):
+        for listener in self.input_listeners:
+            listener(self, topic, value)
+
+    def input_changed(self, input_name, state):
+        """
+        Called when a limit switch or the emergency stop changes. When one trips the pulses are stopped at once
+        and the force control and the test program are ended; the emergency stop also disables the drive and stays
+        active until reset_faults() is called after releasing it
+        Args:
+            input_name: (str) "limit_up", "limit_down" or "estop"
+            state: (int) 1 tripped, 0 released
+        Returns:
+        """
+        m0 = METRICS.start()
+        if state:
+            self.trip(input_name, disable=input_name == "estop")
+            METRICS.stop("input_reaction", m0)
+            print(self.name, input_name, "tripped")
+        elif input_name != "estop":
+            with self.faults_lock:
+                self.faults.discard(input_name)
+        METRICS.count("input_events")
+        self.notify("faults", tuple(self.fault_list()))
+
+    def trip(self, fault, disable=False):
+        """
+        Stop the pulses at once and end the force control and the test program. The fault is kept in self.faults
+        Args:
+            fault: (str) name of the fault (input or condition of the Safety_Supervisor)
+            disable: (bool) also switch the enable of the drive off
+        Returns:
+        """
+        self.pulse.stop()
+        with self.faults_lock:
+            self.faults.add(fault)
+            if self.run is not None:
+                self.run["faults"].add(fault)
+        if disable:
+            self.enable.off()
+        if self.controlling:
+            self.controlling = False
+            self.profile_executor = None
+            self.controller.hold()
 
-    def set_new_df(self):
-        labels = {"Date", "Time_sec", "Force_kN"}
-        self.df = pd.DataFrame(columns=labels)
+    def reset_faults(self):
+        """
+        Clear the emergency stop once it has been released and the trips of the safety supervisor. The limit
+        switches clear by themselves when they are released
+        Returns:
+            List of the faults that are still active
+        """
+        estop = self.safety_inputs.get("estop")
+        if estop is not None and estop.state():
+            raise RuntimeError("Release the emergency stop first")
+        with self.faults_lock:
+            self.faults.intersection_update(("limit_up", "limit_down"))
+        faults = self.fault_list()
+        self.notify("faults", tuple(faults))
+        return faults
+
+    def fault_list(self):
+        """
+        Active faults, sorted
+        Returns:
+            list of str
+        """
+        with self.faults_lock:
+            return sorted(self.faults)
 
-    def update(self):
+    def check_move(self, down=None):
+        """
+        Refuse to move while the emergency stop is active or towards a limit switch that is pressed
+        Args:
+            down: (bool) direction of the move, None for the force control (any direction)
+        Returns:
+        """
+        if "estop" in self.faults:
+            raise RuntimeError("Emergency stop active")
+        latched = [fault for fault in self.fault_list() if fault not in ("limit_up", "limit_down")]
+        if latched:
+            raise RuntimeError("Safety trip active, reset the faults first: " + ", ".join(latched))
+        blocked = {True: ["limit_down"], False: ["limit_up"], None: ["limit_down", "limit_up"]}[down]
+        pressed = [name for name in blocked if name in self.faults]
+        if pressed:
+            raise RuntimeError("Limit switch pressed: " + ", ".join(pressed))
+
+    def record_sample(self):
+        """
+        Record the current reading of the sensor
+        Returns:
         """
-        Everything that is included in the thread
+        m0 = METRICS.start()
+        force = self.balance.ave
+        if self.initial_time is None:
+            self.initial_time = time.perf_counter()
+            self.start_epoch = time.time()
+        time_elapsed = time.perf_counter() - self.initial_time  # Time in seconds
+        epoch = time.time()
+        setpoint = self.current_setpoint()
+        self.samples.append(time_elapsed, force, epoch, setpoint)
+        writer = self.writer
+        if writer is not None:
+            writer.write(time_elapsed, force, epoch, setpoint)
+        METRICS.stop("record_append", m0)
+        METRICS.count("samples_recorded")
+
+    def recording_stats(self):
+        """
+        How well the recording rate was kept: achieved rate, jitter and missed samples
         Returns:
+            dict or None if nothing was recorded
+        """
+        if self.record_scheduler is None:
+            return None
+        return self.record_scheduler.stats()
 
+    def current_setpoint(self):
         """
-        self.balance.corrected_value()
-        val = np.round(self.balance.ave, decimals=5)
-        self.lbl.configure(text="Reading:   " + str(val))
-        
-        if self.active.state() == 1:
-            self.btn.configure(bg="green", text="READY")
+        Force the controller is aiming at
+        Returns:
+            Setpoint in kN, NaN if the force control is not running
+        """
+        if not self.controlling:
+            return np.nan
+        return self.aim
+
+    def run_profile(self, profile):
+        """
+        Start a test program (ramps, holds, releases, cycles). The setpoint of the force control follows the
+        program until it finishes
+        Args:
+            profile: Profile or path of a json file with the program
+        Returns:
+        """
+        if isinstance(profile, str):
+            profile = Profile.load(profile)
+        self.check_move()
+        self.controlling = False
+        self.profile_executor = Profile_Executor(profile, start_force=self.balance.ave,
+                                                 dt=1 / self.controller.rate)
+        print(self.name, "test program:", profile.name, "duration:", round(self.profile_executor.duration, 2), "sec")
+        if self.run is not None:
+            self.run["profile"] = profile.name
+        self.aim = self.profile_executor.setpoint()
+        self.controller.reset()
+        self.controlling = True
+
+    def control_step(self):
+        """
+        One step of the closed loop force control towards self.aim (it does not wait for the sensor)
+        Returns:
+        """
+        if self.profile_executor is not None:
+            setpoint = self.profile_executor.setpoint()
+            if setpoint is None:
+                print(self.name, "test program finished")
+                if self.run is not None:
+                    self.run["completed"] = True
+                self.profile_executor = None
+                self.controller.hold()
+                self.controlling = False
+                return
+            self.aim = setpoint
+        self.controller.deviation = self.deviation
+        self.controller.poll(self.aim)
+        if self.faults or not self.controlling:
+            # A switch tripped, or the control was stopped, while the step was running
+            self.controller.hold()
+
+    def start_force(self, aim):
+        """
+        Start (or change the setpoint of) the force control
+        Args:
+            aim: (float) force to apply in kN
+        Returns:
+        """
+        self.check_move()
+        self.profile_executor = None
+        self.aim = aim
+        print(self.name, "force to apply:", self.aim)
+        if not self.controlling:
+            self.controller.reset()
+        self.controlling = True
+
+    def stop_force(self):
+        """
+        Stop the force control and the pulses
+        Returns:
+            Response of the force to the last setpoint
+        """
+        if self.run is not None and self.controlling:
+            self.run["stopped"] = True
+        self.controlling = False
+        self.profile_executor = None
+        self.controller.hold()
+        report = self.controller.report()
+        print(self.name, "force control:", report)
+        return report
+
+    def start_record(self, period=None):
+        """
+        Start recording
+        Args:
+            period: (float) seconds between two samples, the last one used if None
+        Returns:
+        """
+        if period is not None:
+            if period <= 0:
+                raise ValueError("The recording period has to be bigger than 0")
+            self.sleep_record = period
+        self.record_scheduler = Fixed_Rate_Scheduler(self.sleep_record)
+        self.open_writer()
+        self.start_recording = True
+        print(self.name, "recording data every:", self.sleep_record, 'seconds')
+
+    def pause_record(self):
+        """
+        Pause the recording
+        Returns:
+            Statistics of the recording rate
+        """
+        self.start_recording = False
+        print(self.name, "recording Paused")
+        stats = self.recording_stats()
+        if stats is not None and stats["achieved_rate"] is not None:
+            print("Recording rate: {:.3f} Hz (target {:.3f} Hz), jitter: {:.6f} s, missed: {}".format(
+                stats["achieved_rate"], stats["target_rate"], stats["jitter"], stats["missed"]))
+        return stats
+
+    def new_file_name(self):
+        """
+        Name of the file for a new recording in the selected folder, with the date to the second. A number is added
+        if a file of the same second already exists so it is not overwritten
+        Returns:
+            path
+        """
+        now = datetime.now()
+        current_date = self.file_prefix + now.strftime("%d%m%Y_%H%M%S")
+        ext = EXTENSION if self.save_format == "binary" else ".csv"
+        file_dir = self.dir_name + "/" + current_date + ext
+        n = 1
+        while os.path.exists(file_dir) or os.path.exists(file_dir + ".partial"):
+            file_dir = self.dir_name + "/" + current_date + "_" + str(n) + ext
+            n += 1
+        return file_dir
+
+    def recording_metadata(self):
+        """
+        Information saved in the header of the binary recordings
+        Returns:
+            dict
+        """
+        return {"start_epoch": self.start_epoch,
+                "sample_rate": 1 / self.sleep_record if self.sleep_record else None,
+                "calibration": self.balance.calibration.to_dict(),
+                "pins": self.pins,
+                "station": self.name,
+                "operator": self.operator}
+
+    def new_run(self):
+        """
+        Information of the run that starts with a new file, completed while it is recorded
+        Returns:
+            dict
+        """
+        executor = self.profile_executor
+        return {"profile": None if executor is None else executor.profile.name,
+                "faults": set(),
+                "completed": False,
+                "stopped": False}
+
+    def catalogue_run(self, files):
+        """
+        Add the finished files of the run to the catalogue, summarized in the background
+        Args:
+            files: list of the finished files
+        Returns:
+        """
+        run, self.run = self.run, None
+        if self.catalogue is None or not files:
+            return
+        run = run or self.new_run()
+        if run["faults"]:
+            outcome = "fault"
+        elif run["completed"]:
+            outcome = "completed"
+        elif run["stopped"]:
+            outcome = "stopped"
         else:
-            self.btn.configure(bg="red", text="OFF")
-    
-    def timer(self):
+            outcome = "recorded"
+        metadata = {"station": self.name,
+                    "operator": self.operator,
+                    "outcome": outcome,
+                    "profile": run["profile"],
+                    "notes": ", ".join(sorted(run["faults"])) or None,
+                    "record_period": self.sleep_record,
+                    "frequency": self.pulse.frequency,
+                    "dc": self.pulse.dc,
+                    "calibration": self.balance.calibration.to_dict()}
+        for file in files:
+            self.catalogue.submit(file, metadata)
+
+    def open_writer(self):
         """
-        Function to record the readings from the press sensor
+        Start streaming the recorded samples to a new file
         Returns:
         """
-        if self.start_recording:
-            force = self.balance.ave
+        if self.writer is None:
             if self.initial_time is None:
                 self.initial_time = time.perf_counter()
-            time_elapsed = time.perf_counter() - self.initial_time  # Time in seconds
-            df_temp = pd.DataFrame({"Date": [time.ctime()], "Time_sec": [time_elapsed], "Force_kN": [force]})
-            self.df = pd.concat([self.df, df_temp], ignore_index=True)
-            time.sleep(self.sleep_record)
-
-    def create_matplotlib_window(self):
-        # Initialize an instance of Tk
-        parent_plt = tk.Tk()
-        parent_plt.title("Plot time ")
-        parent_plt.geometry('750x400')
-    
-        canvas_plt = tk.Canvas(parent_plt)
-        scroll_y = tk.Scrollbar(parent_plt, orient="vertical", command=canvas_plt.yview)
-        
-        matplot_window = tk.Frame(canvas_plt)
-        
-        fig = plt.figure(figsize=(7,3))
-        def _plotter():
-            # Clear all graphs drawn in figure
-            plt.clf()
-            plt.xlabel("Time (sec)")
-            plt.ylabel("Force (kN)")
-            plt.plot(self.df.Time_sec, self.df.Force_kN, '*--', color="Blue")
-            plt.grid()
-            fig.canvas.draw()
-
-        # Special type of "canvas" to allow for matplotlib graphing
-        canvas = FigureCanvasTkAgg(fig, master=matplot_window)
-        plot_widget = canvas.get_tk_widget()
-        # Add the plot to the tkinter widget
-        plot_widget.grid(row=0, column=0)
-        # Create a tkinter button at the bottom of the window and link it with the updateGraph function
-        tk.Button(matplot_window, text="Update", command=_plotter).grid(row=1, column=0)
-        
-        canvas_plt.create_window(0, 0, anchor='nw', window=matplot_window)
-        # make sure everything is displayed before configuring the scrollregion
-        canvas_plt.update_idletasks()
+                self.start_epoch = time.time()
+            self.writer = Recording_Writer(self.new_file_name(),
+                                           file_format=self.save_format,
+                                           metadata=self.recording_metadata(),
+                                           pool=self.writer_pool,
+                                           **self.writer_options)
+            self.writer.start()
+            self.run = self.new_run()
+
+    def close_writer(self):
+        """
+        Finish the file that is being streamed (remaining samples are written and the file is renamed)
+        Returns:
+            List with the saved files
+        """
+        writer, self.writer = self.writer, None  # the recording thread stops writing to it first
+        if writer is None:
+            return []
+        files = writer.close()
+        written = writer.samples_written
+        # A recording closed before any sample is not a run
+        self.catalogue_run(files if written else [])
+        return files
 
-        canvas_plt.configure(scrollregion=canvas_plt.bbox('all'), 
-                         yscrollcommand=scroll_y.set)
-                         
-        canvas_plt.pack(fill='both', expand=True, side='left')
-        scroll_y.pack(fill='y', side='right')
-        
-        parent_plt.mainloop()
+    def save_data(self):
+        """
+        Save the recording to be open as a csv in other software. The samples are already on disk if they were
+        streamed, so the file only has to be finished. If the recording continues it goes to a new file
+        Returns:
+            List with the saved files
+        """
+        if self.writer is not None:
+            files = self.close_writer()
+            if self.start_recording:
+                self.open_writer()
+            return files
+        file_dir = self.new_file_name()
+        if self.save_format == "binary":
+            time_sec, force, setpoint = self.samples.get_columns("Time_sec", "Force_kN", "Setpoint_kN")
+            write_recording(file_dir, time_sec, force, setpoint=setpoint, **self.recording_metadata())
+        else:
+            self.samples.to_dataframe().to_csv(file_dir, index=False)
+        print("Data saved in:", file_dir)
+        self.catalogue_run([file_dir])
+        return [file_dir]
 
-    def force(self):
-        actual_force = self.balance.ave
-        aim_force = self.aim
-        e = self.deviation
-        if actual_force > (aim_force + e):  # Go down
-            self.pulse.stop()
-            time.sleep(self.sleep)
+    def export_window(self, seconds=None, resolution=1.0):
+        """
+        Save the end of the recording as min/max/mean bins in a csv, e.g. the last day at 1 minute
+        Args:
+            seconds: (float) length of the window, the whole recording if None
+            resolution: (float) width of the bins in seconds
+        Returns:
+            path of the file
+        """
+        df = self.samples.window_dataframe(seconds, resolution)
+        file_dir = os.path.splitext(self.new_file_name())[0] + "_bins_{:g}s.csv".format(df.attrs["resolution"])
+        df.to_csv(file_dir, index=False)
+        print("Bins saved in:", file_dir)
+        return file_dir
+
+    def clear_record(self):
+        self.close_writer()
+        self.samples.clear()
+        print(self.name, "recordings erased")
+
+    def status(self):
+        """
+        Current state of the station
+        Returns:
+            dict
+        """
+        profile = None
+        executor = self.profile_executor
+        if executor is not None:
+            profile = {"name": executor.profile.name,
+                       "elapsed": executor.elapsed(),
+                       "duration": executor.duration}
+        return {"station": self.name,
+                "force": float(self.balance.ave),
+                "active": int(self.active.state()),
+                "sample_rate": self.balance.sample_rate(),
+                "aim": self.aim,
+                "force_control": "running" if self.controlling else "stopped",
+                "profile": profile,
+                "recording": self.start_recording,
+                "record_period": self.sleep_record,
+                "samples": len(self.samples),
+                "file": None if self.writer is None else self.writer.path,
+                "dir_name": self.dir_name,
+                "save_format": self.save_format,
+                "frequency": self.pulse.frequency,
+                "dc": self.pulse.dc,
+                "pulses_sent": self.pulse.pulses().pulses_sent,
+                "faults": self.fault_list(),
+                "pins": self.pins}
+
+    def move(self, down):
+        """
+        Move the press downwards or upwards
+        Args:
+            down: (bool) True to move down
+        Returns:
+        """
+        self.check_move(down)
+        self.pulse.stop()
+        time.sleep(self.sleep)
+        if down:
             self.dir.on()
-            time.sleep(self.sleep)
-            self.pulse.move_PWM()
-            self.pulse.stop()
+        else:
+            self.dir.off()
+        time.sleep(self.sleep)
+        self.check_move(down)  # a switch may have tripped meanwhile
+        self.pulse.move_PWM()
 
-        elif actual_force < (aim_force - e):  # Go up
-            self.pulse.stop()
-            time.sleep(self.sleep)
+    def move_steps(self, count, down, start_frequency=None, ramp_pulses=0):
+        """
+        Move the press an exact number of pulses (a displacement instead of a time), at the frequency of the pulses
+        Args:
+            count: (int) number of pulses
+            down: (bool) True to move down
+            start_frequency: (float) frequency at the start and at the end of the acceleration ramps, None for no ramp
+            ramp_pulses: (int) pulses of every ramp
+        Returns:
+        """
+        if self.controlling:
+            raise RuntimeError("Stop the force control before moving the press")
+        self.check_move(down)
+        self.pulse.stop()
+        if down:
+            self.dir.on()
+        else:
             self.dir.off()
-            time.sleep(self.sleep)
-            self.pulse.move_PWM()
-            self.pulse.stop()
+        time.sleep(self.controller.dir_setup)
+        self.check_move(down)
+        self.pulse.move_pulses(count, start_frequency, ramp_pulses)
 
+    def stop_all(self):
+        """
+        Stop the pulses, disable the drive and stop the force control and the recording
+        Returns:
+        """
+        self.pulse.stop()
+        self.enable.off()
+        if self.run is not None and self.controlling:
+            self.run["stopped"] = True
+        self.controlling = False
+        self.profile_executor = None
+        self.start_recording = False
+
+
+class Press_Service(Read_Pin):
+    """
+    Core of the press without any GUI: sensor acquisition, force control and recording of one or several
+    stations. It can run alone (headless, see Service.py) or be used by the Interface. Whatever the number of
+    stations there is one thread publishing the readings, one recording thread and one force control thread, plus
+    the acquisition thread of every sensor and one thread writing the files
+    """
+    # Methods that can be called by the clients of the service (GUI or IPC)
+    commands = ("status", "stations", "enable_on", "enable_off", "pulse_start", "pulse_stop", "move_down",
+                "move_up", "move_steps", "set_frequency", "set_duty_cycle", "tare", "start_force", "stop_force",
+                "start_program", "start_record", "pause_record", "clear_record", "save_data", "set_folder",
+                "set_format", "samples_total", "samples_tail", "samples_window", "export_window", "force_report",
+                "recording_stats", "stop_all", "metrics", "set_metrics", "reset_faults", "set_operator", "find_runs",
+                "set_run_outcome", "supervisor_status", "set_limits")
+
+    def __init__(self, *args, stations=None, publish_rate=20, control_rate=40, runtime="threads", catalogue=True,
+                 supervisor=True, **kwargs):
+        """
+        Function to initialize the stations
+        Args:
+            *args:
+            stations: list of Station or of dict with the arguments of Station (pins, calibration, name). If None
+        there is one station created with **kwargs
+            publish_rate: (float) readings per second given to the listeners
+            control_rate: (float) steps per second of the force control loop
+            runtime: (str) "threads" (Workers.py) or "asyncio" (Async_Runtime.py) to run the periodic work
+            catalogue: (bool) add the finished recordings to the Run_Catalogue of their folder (Catalogue.py)
+            supervisor: (bool or dict) run the Safety_Supervisor (Supervisor.py), a dict gives its options (period,
+        max_force, max_rate...)
+            **kwargs: arguments of the Station (pins, calibration, is_Dummy) when stations is None
+        """
+        super().__init__(update_period=1 / publish_rate, force_period=1 / control_rate)
+        if runtime not in ("threads", "asyncio"):
+            raise ValueError("The runtime has to be 'threads' or 'asyncio'")
+        self.runtime = Async_Runtime(self) if runtime == "asyncio" else None
+        self.supervisor = None
+        if supervisor:
+            self.supervisor = Safety_Supervisor(self, **(supervisor if isinstance(supervisor, dict) else {}))
+        self.writer_pool = Writer_Pool()
+        self.stations_by_name = {}
+        self.publish_rate = publish_rate
+        self.control_rate = control_rate
+        self.use_catalogue = catalogue
+        self.catalogues = {}  # folder -> Run_Catalogue
+
+        # Functions listener(topic, value) called with every new reading (e.g. the GUI)
+        self.listeners = []
+
+        METRICS.gauge("writer_queue", self.writer_pool.queue.qsize)
+        METRICS.gauge("writers", lambda: len(self.writer_pool.writers))
+
+        if stations is None:
+            stations = [kwargs]
+        for station in stations:
+            self.add_station(station)
+
+    def add_station(self, station):
+        """
+        Add a press or load cell
+        Args:
+            station: Station or dict with the arguments of Station
+        Returns:
+            Station
+        """
+        if isinstance(station, dict):
+            station = Station(writer_pool=self.writer_pool, **station)
+        try:
+            if station.name in self.stations_by_name:
+                raise ValueError("There is already a station called: " + station.name)
+            for other in self.stations_by_name.values():
+                shared = set(station.pins.values()) & set(other.pins.values())
+                if shared:
+                    raise ValueError("Pins {} of {} are already used by {}".format(sorted(shared), station.name,
+                                                                                  other.name))
+        except ValueError:
+            station.balance.stop()
+            raise
+        station.writer_pool = self.writer_pool
+        station.catalogue = self.catalogue_for(station.dir_name)
+        station.input_listeners.append(self._input_event)
+        self.stations_by_name[station.name] = station
+        for name, function in self._station_gauges(station).items():
+            METRICS.gauge(name, function)
+        if len(self.stations_by_name) > 1:
+            for s in self.stations_by_name.values():
+                s.file_prefix = s.name + "_"
+        return station
+
+    def remove_station(self, name):
+        """
+        Stop a station, finish its recording and take it out of the service
+        Args:
+            name: (str) name of the station
+        Returns:
+            Station
+        """
+        station = self.station(name)
+        if len(self.stations_by_name) == 1:
+            raise ValueError("The last station can not be removed")
+        station.stop_all()
+        # The threads go through the stations without a lock: the dict is replaced, not changed
+        self.stations_by_name = {k: s for k, s in self.stations_by_name.items() if k != name}
+        self._update_threads()
+        station.close_writer()
+        station.balance.stop()
+        if self._input_event in station.input_listeners:
+            station.input_listeners.remove(self._input_event)
+        for gauge in self._station_gauges(station):
+            METRICS.remove_gauge(gauge)
+        return station
+
+    @staticmethod
+    def _station_gauges(station):
+        return {station.name + "_sensor_rate": station.balance.sample_rate,
+                station.name + "_sensor_errors": lambda: station.balance.engine.errors,
+                station.name + "_samples": lambda: len(station.samples)}
+
+    def station(self, name=None):
+        """
+        Station by name
+        Args:
+            name: (str) name of the station, the first one if None
+        Returns:
+            Station
+        """
+        if name is None:
+            return next(iter(self.stations_by_name.values()))
+        try:
+            return self.stations_by_name[name]
+        except KeyError:
+            raise ValueError("Unknown station: " + str(name))
+
+    def stations(self):
+        return list(self.stations_by_name)
+
+    @property
+    def samples(self):
+        return self.station().samples
+
+    @property
+    def df(self):
+        """
+        Pandas data frame of the recording of the first station, only built when it is asked for
+        Returns:
+            pd.DataFrame
+        """
+        return self.samples.to_dataframe()
+
+    def setup_init(self):
+        """
+        Start the threads of the service
+        Returns:
+        """
+        if self.supervisor is not None:
+            self.supervisor.start()
+        if self.runtime is not None:
+            self.runtime.start()
         else:
-            self.pulse.stop()
+            self.run()
 
-    def save_data(self):
+    def add_listener(self, listener):
         """
-        Save the pandas data frame of the recording to be open as a csv in other software
+        Receive the new readings. The topics of the first station are "force", "active" and "faults", the ones of
+        every station are also given as "<name>/force", "<name>/active" and "<name>/faults"
+        Args:
+            listener: function(topic, value), it is called from the update thread so it must not block
         Returns:
         """
-        now = datetime.now()
-        current_date = now.strftime("%d%m%Y_%H%M")
-        file_dir = self.dir_name + "/" + current_date + ".csv"
-        self.df.to_csv(file_dir, index=False)
-        print("Data saved in:", file_dir)
-        
+        self.listeners.append(listener)
+
+    def update(self):
+        """
+        Everything that is included in the thread. It gives the latest readings of all the stations to the
+        listeners, the update worker runs it publish_rate times per second
+        Returns:
+
+        """
+        self.publish()
+
+    def publish(self):
+        """
+        Give the latest readings of all the stations to the listeners once
+        Returns:
+        """
+        for i, station in enumerate(self.stations_by_name.values()):
+            val = np.round(station.balance.ave, decimals=5)
+            state = station.active.state()
+            faults = tuple(station.fault_list())
+            for listener in self.listeners:
+                if i == 0:
+                    listener("force", val)
+                    listener("active", state)
+                    listener("faults", faults)
+                listener(station.name + "/force", val)
+                listener(station.name + "/active", state)
+                listener(station.name + "/faults", faults)
+
+    def _input_event(self, station, topic, value):
+        # An input changed (edge interrupt): the listeners get it now instead of at the next publish
+        first = station is self.station()
+        for listener in self.listeners:
+            if first:
+                listener(topic, value)
+            listener(station.name + "/" + topic, value)
+
+    def timer(self):
+        """
+        Record the readings of every station when its own period is due
+        Returns:
+        """
+        recording = [s for s in self.stations_by_name.values() if s.start_recording and s.record_scheduler]
+        ticked = wait_next([s.record_scheduler for s in recording], sleep=self.time_worker.sleep,
+                           cancelled=self.time_worker.stopping)
+        for station in recording:
+            if station.record_scheduler in ticked and station.start_recording:
+                station.record_sample()
+        if METRICS.enabled:
+            for scheduler in ticked:
+                METRICS.observe("late_timer", scheduler.last_tick - (scheduler.next_deadline - scheduler.period))
+
+    def force(self):
+        """
+        One step of the force control of every station that is controlling, the force worker runs it control_rate
+        times per second
+        Returns:
+        """
+        controlling = [s for s in self.stations_by_name.values() if s.controlling]
+        if not controlling:
+            # Nothing left to control (e.g. the test programs finished): pause the worker from inside
+            self.force_worker.pause(wait=False)
+            # A start_force() between the check and the pause found the worker running and did not start it
+            if any(s.controlling for s in self.stations_by_name.values()):
+                self.force_worker.start()
+            return
+        for station in controlling:
+            station.control_step()
+
+    def _update_threads(self):
+        # Start or stop the shared threads depending on what the stations are doing
+        if self.runtime is not None:
+            self.runtime.update()
+            return
+        stations = self.stations_by_name.values()
+        if any(s.controlling for s in stations):
+            self.run_force()
+        else:
+            self.pause_force()
+        if any(s.start_recording for s in stations):
+            self.run_time()
+        else:
+            self.pause_time()
+
+    # Commands of the service, all of them act on the first station if no station name is given
+
+    def status(self, station=None):
+        """
+        Current state of a station
+        Returns:
+            dict
+        """
+        status = self.station(station).status()
+        status["stations"] = self.stations()
+        status["runtime"] = "threads" if self.runtime is None else "asyncio"
+        status["supervisor"] = None if self.supervisor is None else self.supervisor.worker.state
+        return status
+
+    def enable_on(self, station=None):
+        self.station(station).enable.on()
+
+    def enable_off(self, station=None):
+        self.station(station).enable.off()
+
+    def pulse_start(self, station=None):
+        self.station(station).pulse.start_PWM()
+
+    def pulse_stop(self, station=None):
+        self.station(station).pulse.stop()
+
+    def move_down(self, station=None):
+        """
+        Move the press downwards
+        Returns:
+
+        """
+        self.station(station).move(down=True)
+
+    def move_up(self, station=None):
+        """
+        Move the press upwards
+        Returns:
+
+        """
+        self.station(station).move(down=False)
+
+    def move_steps(self, count, down=True, start_frequency=None, ramp_pulses=0, station=None):
+        """
+        Move the press an exact number of pulses
+        Args:
+            count: (int) number of pulses
+            down: (bool) True to move down
+            start_frequency: (float) frequency at the start and at the end of the ramps, None for no ramp
+            ramp_pulses: (int) pulses of every ramp
+            station: (str) name of the station
+        Returns:
+        """
+        self.station(station).move_steps(count, down, start_frequency, ramp_pulses)
+
+    def set_frequency(self, frequency, station=None):
+        pulse = self.station(station).pulse
+        print("before:", pulse.frequency)
+        pulse.set_frequency(frequency)
+        print("after:", pulse.frequency)
+
+    def set_duty_cycle(self, dc, station=None):
+        pulse = self.station(station).pulse
+        print("before:", pulse.dc)
+        pulse.set_duty_cycle(dc)
+        print("after", pulse.dc)
+
+    def tare(self, station=None):
+        self.station(station).balance.tare()
+
+    def start_force(self, aim, station=None):
+        """
+        Start (or change the setpoint of) the force control
+        Args:
+            aim: (float) force to apply in kN
+            station: (str) name of the station
+        Returns:
+        """
+        self.station(station).start_force(aim)
+        self._update_threads()
+
+    def stop_force(self, station=None):
+        """
+        Stop the force control and the pulses
+        Returns:
+            Response of the force to the last setpoint
+        """
+        report = self.station(station).stop_force()
+        self._update_threads()
+        return report
+
+    def start_program(self, path, station=None):
+        """
+        Run a test program saved in a json file
+        Args:
+            path: (str) file name
+            station: (str) name of the station
+        Returns:
+        """
+        self.station(station).run_profile(path)
+        self._update_threads()
+
+    def force_report(self, station=None):
+        """
+        Rise time, overshoot and settle time of the last force setpoint
+        Returns:
+            dict
+        """
+        return self.station(station).controller.report()
+
+    def start_record(self, period=None, station=None):
+        """
+        Start recording
+        Args:
+            period: (float) seconds between two samples, the last one used if None
+            station: (str) name of the station
+        Returns:
+        """
+        self.station(station).start_record(period)
+        self._update_threads()
+
+    def pause_record(self, station=None):
+        """
+        Pause the recording
+        Returns:
+            Statistics of the recording rate
+        """
+        stats = self.station(station).pause_record()
+        self._update_threads()
+        return stats
+
+    def recording_stats(self, station=None):
+        return self.station(station).recording_stats()
+
+    def clear_record(self, station=None):
+        self.station(station).clear_record()
+
+    def save_data(self, station=None):
+        return self.station(station).save_data()
+
+    def set_folder(self, dir_name, station=None):
+        """
+        Folder of the recordings
+        Args:
+            dir_name: (str) folder
+            station: (str) name of the station, all of them if None
+        Returns:
+        """
+        stations = self.stations_by_name.values() if station is None else [self.station(station)]
+        for s in stations:
+            s.dir_name = dir_name
+            s.catalogue = self.catalogue_for(dir_name)
+
+    def catalogue_for(self, dir_name):
+        """
+        Run_Catalogue of a folder of recordings, shared by the stations that save there
+        Args:
+            dir_name: (str) folder
+        Returns:
+            Run_Catalogue or None if the catalogue is not used
+        """
+        if not self.use_catalogue:
+            return None
+        key = os.path.abspath(dir_name)
+        if key not in self.catalogues:
+            self.catalogues[key] = Run_Catalogue(os.path.join(key, CATALOGUE_NAME))
+        return self.catalogues[key]
+
+    def set_operator(self, operator, station=None):
+        """
+        Name of the operator saved with the next runs
+        Args:
+            operator: (str) name, None to leave it empty
+            station: (str) name of the station, all of them if None
+        Returns:
+        """
+        stations = self.stations_by_name.values() if station is None else [self.station(station)]
+        for s in stations:
+            s.operator = operator
+
+    def find_runs(self, station=None, **conditions):
+        """
+        Runs of the catalogue of the folder of a station, see Run_Catalogue.find() for the conditions (since,
+        until, target, tolerance, operator, outcome, limit)
+        Returns:
+            list of dict, the newest run first
+        """
+        catalogue = self.station(station).catalogue
+        if catalogue is None:
+            raise RuntimeError("The run catalogue is not used")
+        return catalogue.find(**conditions)
+
+    def set_run_outcome(self, run_id, outcome, notes=None, station=None):
+        """
+        Change how a run of the catalogue ended (e.g. the sample broke) and its notes
+        Returns:
+        """
+        catalogue = self.station(station).catalogue
+        if catalogue is None:
+            raise RuntimeError("The run catalogue is not used")
+        catalogue.set_outcome(run_id, outcome, notes)
+
+    def set_format(self, save_format, station=None):
+        if save_format not in ("csv", "binary"):
+            raise ValueError("The format has to be 'csv' or 'binary'")
+        stations = self.stations_by_name.values() if station is None else [self.station(station)]
+        for s in stations:
+            s.save_format = save_format
+
+    def samples_total(self, station=None):
+        return self.station(station).samples.total
+
+    def samples_tail(self, n, station=None):
+        """
+        Last n recorded samples
+        Args:
+            n: (int) number of samples
+            station: (str) name of the station
+        Returns:
+            (time_sec, force, setpoint)
+        """
+        return self.station(station).samples.tail(n)
+
+    def samples_window(self, seconds=None, resolution=None, station=None):
+        """
+        End of the recording as min/max/mean bins, e.g. samples_window(3600, 1) for the last hour at 1 second
+        Args:
+            seconds: (float) length of the window, the whole recording if None
+            resolution: (float) width of the bins in seconds
+            station: (str) name of the station
+        Returns:
+            dict of numpy arrays, see Resolution_Pyramid.window()
+        """
+        return self.station(station).samples.window(seconds, resolution)
+
+    def export_window(self, seconds=None, resolution=1.0, station=None):
+        return self.station(station).export_window(seconds, resolution)
+
+    def reset_faults(self, station=None):
+        """
+        Clear the emergency stop of a station after it was released
+        Returns:
+            List of the faults that are still active
+        """
+        return self.station(station).reset_faults()
+
+    def supervisor_status(self):
+        """
+        State, limits and last trips of the Safety_Supervisor
+        Returns:
+            dict, None if there is no supervisor
+        """
+        return None if self.supervisor is None else self.supervisor.status()
+
+    def set_limits(self, station=None, **limits):
+        """
+        Change the limits of the Safety_Supervisor (max_force, max_rate, rate_window, sensor_timeout,
+        heartbeat_timeout), of one station or of all of them
+        Returns:
+            The limits now used
+        """
+        if self.supervisor is None:
+            raise RuntimeError("The safety supervisor is not used")
+        return self.supervisor.set_limits(station, **limits)
+
+    def metrics(self):
+        """
+        Counters, timing histograms and queue depths of the hot paths (see Metrics.py)
+        Returns:
+            dict
+        """
+        return METRICS.snapshot()
+
+    def set_metrics(self, enabled):
+        """
+        Start or stop collecting the metrics, the previous values are erased when they are started
+        Args:
+            enabled: (bool)
+        Returns:
+        """
+        if enabled:
+            METRICS.reset()
+            METRICS.enable()
+        else:
+            METRICS.disable()
+
+    def stop_all(self, station=None):
+        """
+        Stop the pulses, disable the drive and stop the force control and the recording
+        Args:
+            station: (str) name of the station, all of them if None
+        Returns:
+        """
+        print("Stop all")
+        stations = self.stations_by_name.values() if station is None else [self.station(station)]
+        for s in stations:
+            s.stop_all()
+        self._update_threads()
+        # The listeners see the new state at once
+        self.update_worker.trigger()
+
+    def shutdown(self):
+        """
+        Stop everything and release the hardware
+        Returns:
+        """
+        self.stop_all()
+        if self.runtime is not None:
+            self.runtime.stop()
+        self.stop_threads()
+        for station in self.stations_by_name.values():
+            station.close_writer()
+            station.balance.stop()
+            for gauge in self._station_gauges(station):
+                METRICS.remove_gauge(gauge)
+        METRICS.remove_gauge("writer_queue")
+        METRICS.remove_gauge("writers")
+        for catalogue in self.catalogues.values():
+            catalogue.close()
+        if self.supervisor is not None:
+            self.supervisor.stop()
+        if not all(s.dummy for s in self.stations_by_name.values()):
+            IO.cleanup()
+
+
+class Interface:
+    """
+    Interface class that link the channel functionality of the Press_controller class with the the GUI. It is a
+    client of a Press_Service: the service runs in the same process by default, or it can be a Service_Client
+    connected to a headless service (see Service.py)
+    """
+    def __init__(self, *args, service=None, **kwargs):
+        """
+        Function to initialize each buttom from the GUI
+        Args:
+            *args:
+            service: Press_Service or Service_Client. If None a Press_Service is created with **kwargs, in the
+        background while the window is built (see start_service())
+            **kwargs: pins, calibration and is_Dummy of the Press_Service
+        """
+        self.local = service is None
+        self.service = service
+        self.service_args = (args, kwargs)
+        self.service_thread = None
+        self.service_error = None
+        self.connected = False  # the window has the values of the service and its threads are started
+
+        self.btn = None
+        self.lbl = None
+        self.lbl_save = None
+        self.lbl_faults = None
+
+        # The service publishes the values, the Tk main loop renders them
+        self.gui_refresh_ms = 100
+        self.bridge = Gui_Bridge(self.gui_refresh_ms)
+
+        self.plot_fps = 5
+        self.parent = None
+
+    def show_force(self, val):
+        self.lbl.configure(text="Reading:   " + str(val))
+
+    def show_active(self, state):
+        if state == 1:
+            self.btn.configure(bg="green", text="READY")
+        else:
+            self.btn.configure(bg="red", text="OFF")
+
+    def show_faults(self, faults):
+        if faults:
+            self.lbl_faults.configure(text="STOPPED: " + ", ".join(faults).upper(), fg="red")
+        else:
+            self.lbl_faults.configure(text="", fg="black")
+
+    def start_service(self):
+        """
+        Create the Press_Service (pins, load cell and its acquisition thread) in a thread, the window does not wait
+        for the hardware. The GUI connects to it once it is ready
+        Returns:
+        """
+        args, kwargs = self.service_args
+
+        def create():
+            try:
+                self.service = Press_Service(*args, **kwargs)
+            except Exception as e:
+                print("The press could not be started:", e)
+                self.service_error = e
+            STARTUP.mark("hardware")
+
+        self.service_thread = threading.Thread(target=create, name="press-init", daemon=True)
+        self.service_thread.start()
+
+    def create_matplotlib_window(self):
+        """
+        Open a window with the live plot of the recording
+        Returns:
+            Live_Plot
+        """
+        from .Live_Plot import Live_Plot  # matplotlib is loaded the first time a plot is opened
+        return Live_Plot(self.parent, self.service.samples, fps=self.plot_fps)
+
+    def create_metrics_window(self):
+        """
+        Open a window with the metrics of the service (sensor rate, control and recording timings, queue depths),
+        refreshed every second
+        Returns:
+        """
+        metrics = self.call("metrics")
+        if metrics is None:
+            return
+        window = tk.Toplevel(self.parent)
+        window.title("Metrics")
+        enabled = tk.BooleanVar(value=bool(metrics["enabled"]), master=window)
+
+        def collect():
+            self.call("set_metrics", enabled.get())
+            if not self.local:
+                # The timings of the GUI are measured in this process
+                METRICS.reset()
+                if enabled.get():
+                    METRICS.enable()
+                else:
+                    METRICS.disable()
+
+        tk.Checkbutton(window, text="Collect metrics", variable=enabled, command=collect).pack(anchor=tk.W)
+        text = tk.Label(window, justify=tk.LEFT, anchor=tk.NW, font=("Courier", 9))
+        text.pack(fill='both', expand=True)
+
+        def refresh():
+            if not window.winfo_exists():
+                return
+            try:
+                report = METRICS.report(self.service.metrics())
+                if not self.local:
+                    report += "\n\nGUI\n" + METRICS.report()
+            except Exception as e:
+                report = "Metrics not available: " + str(e)
+            text.configure(text=report or "Nothing measured yet")
+            window.after(1000, refresh)
+
+        refresh()
+
+    def ready(self):
+        """
+        Check that the service can be used, the hardware may still be starting
+        Returns:
+            True if it is ready
+        """
+        if self.service_error is not None:
+            messagebox.showerror('Error', 'The press could not be started: ' + str(self.service_error))
+            return False
+        if not self.connected:
+            messagebox.showinfo('Starting', 'The press is still starting, try again in a moment')
+            return False
+        return True
+
+    def call(self, command, *args):
+        """
+        Run a command of the service and show the error if it fails
+        Args:
+            command: (str) name of the command
+            *args: arguments of the command
+        Returns:
+            Result of the command, None if it failed
+        """
+        if not self.ready():
+            return None
+        try:
+            return getattr(self.service, command)(*args)
+        except Exception as e:
+            print(command, "failed:", e)
+            messagebox.showerror('Error', str(e))
+            return None
+
     def setup(self):
         """
         create the interface with all the buttoms and functionalities
         Returns:
 
         """
+        if self.local and self.service is None and self.service_thread is None:
+            self.start_service()
         parent = tk.Tk()
+        self.parent = parent
         parent.title("Press Controller and sensor readings")
         parent.geometry('750x400')
-        
+
         canvas = tk.Canvas(parent)
         scroll_y = tk.Scrollbar(parent, orient="vertical", command=canvas.yview)
 
         mainframe = tk.Frame(canvas)
-               
 
-        fq = tk.IntVar(value=self.pulse.frequency, master=mainframe)
+        # The values of the service are filled in once it is ready (see connect())
+        fq = tk.IntVar(master=mainframe)
         def frequency():
             """
             If the user want to change the frequency, this function will change the frequency configuration of the
@@ -531,12 +1889,10 @@ class Interface(Read_Pin):
             Returns:
 
             """
-            print("before:", self.pulse.frequency)
-            self.pulse.frequency = fq.get()
-            print("after:", self.pulse.frequency)
+            self.call("set_frequency", fq.get())
 
         # Value saved here for the duty cycle
-        dc = tk.IntVar(value=self.pulse.dc, master=mainframe)
+        dc = tk.IntVar(master=mainframe)
         def duty_cycle():
             """
             If the user want to change the frequency, this function will change the frequency configuration of the
@@ -544,74 +1900,65 @@ class Interface(Read_Pin):
             Returns:
 
             """
-            print("before:", self.pulse.dc)
-            self.pulse.dc = dc.get()
-            print("after", self.pulse.dc)
-                
+            self.call("set_duty_cycle", dc.get())
+
         def dir_down():
             """
             Move the press downwards
             Returns:
 
             """
+            if not self.ready():
+                return
             try:
-                self.pulse.stop()
-                time.sleep(self.sleep)
-                self.dir.on()     
-                time.sleep(self.sleep)      
-                self.pulse.move_PWM()
+                self.service.move_down()
             except:
                 print("Click on start button to activate the press")
                 messagebox.showerror('Error', 'Click on start button to activate the press')
-            
+
         def dir_up():
             """
             Move the press upwards
             Returns:
 
             """
+            if not self.ready():
+                return
             try:
-                self.pulse.stop()
-                time.sleep(self.sleep)
-                self.dir.off()     
-                time.sleep(self.sleep)    
-                self.pulse.move_PWM()
+                self.service.move_up()
             except:
                 print("Click on start button to activate the press")
                 messagebox.showerror('Error', 'Click on start button to activate the press')
 
-        obj = tk.IntVar(value=self.aim, master=mainframe)
+        obj = tk.DoubleVar(master=mainframe)
 
         def set_force():
-            self.aim = obj.get()
-            print("force to apply:", self.aim)
-            self.run_force()
+            self.call("start_force", obj.get())
 
         def pause_set_force():
-            self.pause_force()
+            self.call("stop_force")
 
         def release_force():
             pass
 
-        sec = tk.IntVar(value=self.sleep_record, master=mainframe)
+        sec = tk.DoubleVar(master=mainframe)
 
         def set_time():
-            self.sleep_record = sec.get()
-            self.start_recording = True
-            self.run_time()
-            print("Recording data every:", self.sleep_record, 'seconds')
+            if sec.get() <= 0:
+                messagebox.showerror('Error', 'The recording period has to be bigger than 0')
+                return
+            self.call("start_record", sec.get())
 
         def pause_recordings():
-            self.start_recording = False
-            self.pause_time()
-            print("Recording Paused")
+            self.call("pause_record")
 
         def clear_recordings():
-            self.set_new_df()
+            self.call("clear_record")
             messagebox.showwarning('Warning', 'All the previous data is erased')
-            print("Recordings erased")
-        
+
         def plot_data():
+            if not self.ready():
+                return
             self.create_matplotlib_window()
             print("New window open, to see data")
 
@@ -620,13 +1967,13 @@ class Interface(Read_Pin):
 
         # Enable label and buttons
         tk.Label(mainframe, text="Enable").grid(column=1, row=2)
-        tk.Button(mainframe, text="On", command=self.enable.on, width=10).grid(column=2, row=2)
-        tk.Button(mainframe, text="Off", command=self.enable.off, width=10).grid(column=3, row=2)
+        tk.Button(mainframe, text="On", command=lambda: self.call("enable_on"), width=10).grid(column=2, row=2)
+        tk.Button(mainframe, text="Off", command=lambda: self.call("enable_off"), width=10).grid(column=3, row=2)
 
         # Pulse label and buttons
         tk.Label(mainframe, text="Pulse").grid(column=1, row=3)
-        tk.Button(mainframe, text="Start", command=self.pulse.start_PWM, width=10).grid(column=2, row=3)
-        tk.Button(mainframe, text="Stop", command=self.pulse.stop, width=10).grid(column=3, row=3)
+        tk.Button(mainframe, text="Start", command=lambda: self.call("pulse_start"), width=10).grid(column=2, row=3)
+        tk.Button(mainframe, text="Stop", command=lambda: self.call("pulse_stop"), width=10).grid(column=3, row=3)
 
         # direction label and buttons
         tk.Label(mainframe, text="Direction").grid(column=1, row=4)
@@ -651,12 +1998,21 @@ class Interface(Read_Pin):
         # Sensor reading
         self.lbl = tk.Label(mainframe, text="No reading", font=("Arial Bold", 10))
         self.lbl.grid(column=1, row=6, columnspan=4, sticky=tk.W + tk.E )
+        tk.Button(mainframe, text="Tare", command=lambda: self.call("tare"), width=10).grid(column=5, row=6)
 
         # Objective
         tk.Entry(mainframe, textvariable=obj, width=10).grid(column=1, row=7)
         tk.Button(mainframe, text="Set Force (kN)", command=set_force, width=10).grid(column=2, row=7)
         tk.Button(mainframe, text="Pause ", command=pause_set_force, width=10).grid(column=3, row=7)
 
+        def load_profile():
+            path = filedialog.askopenfilename(title="Test program", filetypes=[("json", "*.json")])
+            if not path:
+                return
+            self.call("start_program", path)
+
+        tk.Button(mainframe, text="Program..", command=load_profile, width=10).grid(column=4, row=7)
+
         ### Data Recording
         tk.Label(mainframe, text="Data recording (sec)", font=("Arial Bold", 12), height=3).grid(column=1, row=8)
 
@@ -667,15 +2023,17 @@ class Interface(Read_Pin):
         tk.Button(mainframe, text="Clear", command=clear_recordings, width=10).grid(column=4, row=9)
 
         def select_folder():
-            self.dir_name = filedialog.askdirectory()
-            self.lbl_save.configure(text=self.dir_name)
+            dir_name = filedialog.askdirectory()
+            if dir_name:
+                self.call("set_folder", dir_name)
+                self.lbl_save.configure(text=dir_name)
 
         # Saving Data
         tk.Button(mainframe, text="Browse..", command=select_folder).grid(column=2, row=8)
         self.lbl_save = tk.Label(mainframe, text="Select a folder")
         self.lbl_save.grid(column=3, row=8, columnspan=7, sticky=tk.W + tk.E)
 
-        tk.Button(mainframe, text="Save Data", command=self.save_data, width=10).grid(column=2,
+        tk.Button(mainframe, text="Save Data", command=lambda: self.call("save_data"), width=10).grid(column=2,
                                                                                       row=10,
                                                                                       columnspan=3,
                                                                                       sticky=tk.W + tk.E)
@@ -687,37 +2045,67 @@ class Interface(Read_Pin):
                                                                                                       sticky=tk.W + tk.E)
 
         # Close the window
-        def stop_all(): #TODO: still not working
-            print("Stop all")
-            self.pulse.stop()
-            time.sleep(0.3)
-            self.enable.off()
-            time.sleep(0.3)
-            self.pause_force()
-            time.sleep(0.3)
-            self.pause_time()
-            time.sleep(0.3)
-            self.stop()
-            #if self.dummy is False:
-            #    IO.cleanup()
-            #mainframe.quit()
+        def stop_all():
+            self.call("stop_all")
 
         tk.Button(mainframe, text="Stop all", bg="red", command=stop_all).grid(column=5, row=1, columnspan=2, sticky=tk.W + tk.E)
-        
+
+        tk.Button(mainframe, text="Metrics", command=self.create_metrics_window, width=10).grid(column=1, row=10)
+
+        # Limit switches and emergency stop
+        self.lbl_faults = tk.Label(mainframe, text="", font=("Arial Bold", 10))
+        self.lbl_faults.grid(column=2, row=11, columnspan=5, sticky=tk.W + tk.E)
+        tk.Button(mainframe, text="Reset faults", command=lambda: self.call("reset_faults"),
+                  width=10).grid(column=1, row=11)
+
         canvas.create_window(0, 0, anchor='nw', window=mainframe)
         # make sure everything is displayed before configuring the scrollregion
         canvas.update_idletasks()
 
-        canvas.configure(scrollregion=canvas.bbox('all'), 
+        canvas.configure(scrollregion=canvas.bbox('all'),
                          yscrollcommand=scroll_y.set)
-                         
+
         canvas.pack(fill='both', expand=True, side='left')
         scroll_y.pack(fill='y', side='right')
-        
+
 
         # run thread
-        self.run()
-        
+        self.bridge.refresh_ms = self.gui_refresh_ms
+        self.bridge.subscribe("force", self.show_force)
+        self.bridge.subscribe("active", self.show_active)
+        self.bridge.subscribe("faults", self.show_faults)
+        self.bridge.start(parent)
+        METRICS.gauge("gui_queue", self.bridge.queue.qsize)
+        STARTUP.mark("window")
+
+        def connect():
+            """
+            Wait for the service without blocking the window, then show its values and start its threads
+            Returns:
+            """
+            if self.service_thread is not None and self.service_thread.is_alive():
+                parent.after(20, connect)
+                return
+            if self.service is None:
+                self.lbl.configure(text="Press not available: " + str(self.service_error))
+                return
+            status = self.service.status()
+            fq.set(status["frequency"])
+            dc.set(status["dc"])
+            obj.set(status["aim"])
+            sec.set(status["record_period"])
+            self.service.add_listener(self.bridge.publish)
+            if self.local:
+                self.service.setup_init()
+            self.connected = True
+            STARTUP.mark("ready")
+            print(STARTUP.report())
+
+        parent.after_idle(lambda: STARTUP.mark("interactive"))
+        parent.after_idle(connect)
         parent.mainloop()
-        if self.dummy is False:
-            IO.cleanup()
+        self.bridge.stop()
+        if self.service_thread is not None:
+            self.service_thread.join()
+        if self.local and self.service is not None:
+            self.service.shutdown()
@@ -0,0 +1,202 @@
+"""
+A test program is a list of segments, e.g. saved as json:
+
+    {"name": "creep 5 kN",
+     "segments": [{"type": "ramp", "to": 5, "rate": 0.5},
+                  {"type": "hold", "duration": 3600},
+                  {"type": "cycle", "repeat": 100,
+                   "segments": [{"type": "ramp", "to": 8, "rate": 2},
+                                {"type": "hold", "duration": 5},
+                                {"type": "release", "to": 2, "rate": 2}]},
+                  {"type": "release", "rate": 1}]}
+
+ramp: go to "to" kN at "rate" kN/s, hold: keep the force "duration" seconds, release: like ramp but the force
+goes down ("to" is 0 kN by default), cycle: repeat the inner segments "repeat" times.
+"""
+# Import relevant packages
+import bisect
+import json
+import time
+
+
+class Profile:
+    """
+    Class with a test program made of ramp, hold, release and cycle segments
+    """
+    def __init__(self, segments, name="profile"):
+        """
+        Initialize the class with global variables
+        Args:
+            segments: list of dict with the segments
+            name: (str) name of the program
+        """
+        self.name = name
+        self.segments = segments
+        self.check(segments)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read a test program from a json file
+        Args:
+            path: (str) file name
+        Returns:
+            Profile
+        """
+        with open(path) as f:
+            data = json.load(f)
+        if isinstance(data, list):
+            return cls(data)
+        return cls(data["segments"], name=data.get("name", "profile"))
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump({"name": self.name, "segments": self.segments}, f, indent=2)
+
+    def check(self, segments):
+        for segment in segments:
+            kind = segment.get("type")
+            if kind in ("ramp", "release"):
+                if segment.get("rate", 0) <= 0:
+                    raise ValueError("Ramps need a rate bigger than 0 kN/s: " + str(segment))
+                if kind == "ramp" and "to" not in segment:
+                    raise ValueError("Ramps need the force to go to: " + str(segment))
+            elif kind == "hold":
+                if segment.get("duration", -1) < 0:
+                    raise ValueError("Holds need a duration: " + str(segment))
+            elif kind == "cycle":
+                if not segment.get("segments"):
+                    raise ValueError("Cycles need the segments to repeat: " + str(segment))
+                if int(segment.get("repeat", 1)) < 1:
+                    raise ValueError("Cycles need to repeat at least once: " + str(segment))
+                self.check(segment["segments"])
+            else:
+                raise ValueError("Unknown segment: " + str(segment))
+
+    def plan(self, start_force=0.0):
+        """
+        Start time of every segment, without computing the setpoints: the memory does not depend on the length of
+        the program (a cycle keeps its first repetition and one of the others, which are all the same)
+        Args:
+            start_force: (float) force in kN when the program starts
+        Returns:
+            Profile_Plan
+        """
+        return Profile_Plan(self.segments, float(start_force))
+
+
+class Profile_Plan:
+    """
+    Class with the segments of a program placed in time. The setpoint at any moment is found with a binary search
+    of the segment and, inside a cycle, the number of the repetition
+    """
+    def __init__(self, segments, start_force):
+        self.items = []  # (start, duration, kind, data)
+        t = 0.0
+        force = start_force
+        for segment in segments:
+            kind = segment["type"]
+            if kind == "cycle":
+                first = Profile_Plan(segment["segments"], force)
+                repeat = int(segment.get("repeat", 1))
+                # Every repetition after the first starts at the force where the previous one ended
+                steady = Profile_Plan(segment["segments"], first.end_force) if repeat > 1 else first
+                duration = first.duration + (repeat - 1) * steady.duration
+                self.items.append((t, duration, "cycle", (first, steady, repeat)))
+                force = first.end_force if repeat == 1 else steady.end_force
+            elif kind == "hold":
+                duration = float(segment["duration"])
+                self.items.append((t, duration, "line", (force, force)))
+            else:
+                target = float(segment.get("to", 0.0))
+                duration = abs(target - force) / segment["rate"]
+                self.items.append((t, duration, "line", (force, target)))
+                force = target
+            t += duration
+        self.starts = [item[0] for item in self.items]
+        self.duration = t
+        self.start_force = start_force
+        self.end_force = force
+
+    def setpoint(self, t):
+        """
+        Setpoint at a moment of the program
+        Args:
+            t: (float) seconds since the start
+        Returns:
+            Setpoint in kN, None after the end
+        """
+        if t > self.duration:
+            return None
+        i = bisect.bisect_right(self.starts, t) - 1
+        if i < 0:
+            return self.start_force
+        start, duration, kind, data = self.items[i]
+        t -= start
+        if kind == "line":
+            begin, end = data
+            if duration <= 0 or t >= duration:
+                return end
+            return begin + (end - begin) * t / duration
+        first, steady, repeat = data
+        if t <= first.duration:
+            return first.setpoint(t)
+        t -= first.duration
+        if steady.duration <= 0:
+            return steady.end_force
+        k = min(int(t // steady.duration), repeat - 2)
+        return steady.setpoint(min(t - k * steady.duration, steady.duration))
+
+
+class Profile_Executor:
+    """
+    Class that gives the setpoint of a test program at every moment, computed from the plan of the program when it
+    is asked for
+    """
+    def __init__(self, profile, start_force=0.0, dt=0.05, clock=time.perf_counter):
+        """
+        Initialize the class with global variables
+        Args:
+            profile: Profile
+            start_force: (float) force in kN when the program starts
+            dt: (float) resolution of the setpoint in seconds, it changes in steps of dt
+            clock: function that returns the current time in seconds
+        """
+        self.profile = profile
+        self.dt = dt
+        self.clock = clock
+        self.plan = profile.plan(start_force)
+        self.start_time = None
+
+    @property
+    def duration(self):
+        return self.plan.duration
+
+    def start(self):
+        self.start_time = self.clock()
+
+    def elapsed(self):
+        if self.start_time is None:
+            return 0.0
+        return self.clock() - self.start_time
+
+    @property
+    def finished(self):
+        return self.start_time is not None and self.elapsed() > self.duration
+
+    def setpoint(self, t=None):
+        """
+        Setpoint at a moment of the program (O(log segments))
+        Args:
+            t: (float) seconds since the start, now by default
+        Returns:
+            Setpoint in kN, None when the program has finished
+        """
+        if self.start_time is None:
+            self.start()
+        if t is None:
+            t = self.elapsed()
+        if t > self.duration:
+            return None
+        setpoint = self.plan.setpoint(int(t / self.dt) * self.dt)
+        return None if setpoint is None else float(setpoint)
@@ -0,0 +1,386 @@
+# Import relevant packages
+import threading
+import time
+
+import numpy as np
+
+try:
+    import RPi.GPIO as IO
+    RPi_IMPORT = True
+except ImportError:
+    RPi_IMPORT = False
+
+try:
+    import pigpio
+    PIGPIO_IMPORT = True
+except ImportError:
+    PIGPIO_IMPORT = False
+
+
+def ramp_segments(count, frequency, start_frequency=None, ramp_pulses=0, steps=10):
+    """
+    Split a move of an exact number of pulses in segments of constant frequency: an acceleration ramp from
+    start_frequency, the cruise at frequency and the same ramp down
+    Args:
+        count: (int) total number of pulses
+        frequency: (float) cruise frequency in Hz
+        start_frequency: (float) frequency at the start and the end of the move, no ramp if None
+        ramp_pulses: (int) pulses used to accelerate (and the same to decelerate)
+        steps: (int) number of frequency steps of every ramp
+    Returns:
+        List of (frequency, pulses)
+    """
+    count = int(count)
+    ramp = min(int(ramp_pulses), count // 2)
+    if start_frequency is None or ramp == 0 or start_frequency >= frequency:
+        return [(float(frequency), count)] if count > 0 else []
+    steps = max(1, min(steps, ramp))
+    frequencies = np.linspace(start_frequency, frequency, steps + 1)[:-1]
+    pulses = np.full(steps, ramp // steps)
+    pulses[-1] += ramp - pulses.sum()
+    up = [(float(f), int(n)) for f, n in zip(frequencies, pulses)]
+    segments = up + [(float(frequency), count - 2 * ramp)] + up[::-1]
+    return [(f, n) for f, n in segments if n > 0]
+
+
+class Pulse_Backend:
+    """
+    Parent class of the generators of the pulses of the drive. The pulses are given either continuously at a
+    frequency (velocity of the press) or as an exact number of pulses with an acceleration ramp (displacement)
+    """
+    def __init__(self, channel, frequency=10000, dc=50, clock=time.perf_counter):
+        """
+        Initialize the class with global variables
+        Args:
+            channel: (int) GPIO pin of the pulses
+            frequency: (float) frequency in Hz
+            dc: (float) duty cycle in %
+            clock: function that returns the current time in seconds
+        """
+        self.channel = channel
+        self.frequency = frequency
+        self.dc = dc
+        self.clock = clock
+        self.running = False
+        self.pulses_sent = 0.0  # counted exactly for the moves, estimated from the time while running continuously
+        self._since = None
+
+    def setup(self):
+        # Everything that has to be done once before the pulses are given
+        pass
+
+    def _account(self):
+        now = self.clock()
+        if self.running and self._since is not None:
+            self.pulses_sent += (now - self._since) * self.frequency
+        self._since = now
+
+    def start(self):
+        """
+        Give pulses continuously at self.frequency
+        Returns:
+        """
+        self._account()
+        self._start()
+        self.running = True
+
+    def set_frequency(self, frequency):
+        """
+        Change the frequency, also while the pulses are running
+        Args:
+            frequency: (float) frequency in Hz
+        Returns:
+        """
+        self._account()
+        self.frequency = frequency
+        if self.running:
+            self._set_frequency(frequency)
+
+    def set_duty_cycle(self, dc):
+        self.dc = dc
+        if self.running:
+            self._start()
+
+    def stop(self):
+        """
+        Stop the continuous pulses and the move that is running
+        Returns:
+        """
+        self._account()
+        self.running = False
+        self._stop()
+
+    def send_pulses(self, count, frequency=None, start_frequency=None, ramp_pulses=0):
+        """
+        Give an exact number of pulses, the call does not wait until they are given (see busy())
+        Args:
+            count: (int) number of pulses
+            frequency: (float) cruise frequency in Hz, self.frequency by default
+            start_frequency: (float) frequency at the start and the end of the move, no ramp if None
+            ramp_pulses: (int) pulses used to accelerate and to decelerate
+        Returns:
+            List of (frequency, pulses) segments that are given
+        """
+        if self.running:
+            self.stop()
+        segments = ramp_segments(count, frequency or self.frequency, start_frequency, ramp_pulses)
+        self._send(segments)
+        self.pulses_sent += sum(n for _, n in segments)
+        return segments
+
+    def busy(self):
+        """
+        True while a move of send_pulses() is being given
+        """
+        return False
+
+    def _start(self):
+        raise NotImplementedError
+
+    def _set_frequency(self, frequency):
+        raise NotImplementedError
+
+    def _stop(self):
+        raise NotImplementedError
+
+    def _send(self, segments):
+        raise NotImplementedError
+
+
+class RPi_GPIO_Pulse(Pulse_Backend):
+    """
+    Software PWM of RPi.GPIO. The timing depends on the load of the CPU, the moves of an exact number of pulses are
+    timed with sleep() so the count is only approximate
+    """
+    def __init__(self, channel, **kwargs):
+        super().__init__(channel, **kwargs)
+        self.p = None
+        self._move = None
+        self._cancel = threading.Event()
+
+    def setup(self):
+        # The PWM object is created only once and reused
+        if self.p is None:
+            IO.setup(self.channel, IO.OUT)
+            self.p = IO.PWM(self.channel, self.frequency)  # channel, frequency
+
+    def _start(self):
+        self.setup()
+        self.p.ChangeFrequency(self.frequency)
+        self.p.start(self.dc)
+
+    def _set_frequency(self, frequency):
+        self.p.ChangeFrequency(frequency)
+
+    def _stop(self):
+        self._cancel.set()
+        if self.p is not None:
+            self.p.stop()
+
+    def _send(self, segments):
+        self.setup()
+        self._cancel.clear()
+        self._move = threading.Thread(target=self._move_loop, args=(segments,), daemon=True)
+        self._move.start()
+
+    def _move_loop(self, segments):
+        self.p.start(self.dc)
+        for frequency, pulses in segments:
+            self.p.ChangeFrequency(frequency)
+            if self._cancel.wait(pulses / frequency):
+                break
+        self.p.stop()
+
+    def busy(self):
+        return self._move is not None and self._move.is_alive()
+
+
+class Pigpio_Pulse(Pulse_Backend):
+    """
+    Pulses timed by the DMA of the pigpio daemon (sudo pigpiod), the CPU load does not change them. The continuous
+    pulses use the hardware PWM on the pins that have it (12, 13, 18, 19); the moves are pigpio waveforms, so the
+    number of pulses is exact
+    """
+    hardware_pins = (12, 13, 18, 19)
+    max_repeat = 65535  # repetitions of a waveform in a wave chain loop
+
+    def __init__(self, channel, pi=None, **kwargs):
+        """
+        Args:
+            channel: (int) GPIO pin of the pulses
+            pi: pigpio.pi connection, a new one to the local daemon if None
+        """
+        if not PIGPIO_IMPORT:
+            raise ImportError("pigpio is not installed")
+        super().__init__(channel, **kwargs)
+        self.pi = pi if pi is not None else pigpio.pi()
+        if not self.pi.connected:
+            raise RuntimeError("The pigpio daemon is not running (sudo pigpiod)")
+        self.pi.set_mode(self.channel, pigpio.OUTPUT)
+
+    def _start(self):
+        if self.channel in self.hardware_pins:
+            self.pi.hardware_PWM(self.channel, int(self.frequency), int(self.dc * 10000))
+        else:
+            self.pi.set_PWM_frequency(self.channel, int(self.frequency))
+            self.pi.set_PWM_dutycycle(self.channel, int(self.dc * 255 / 100))
+
+    def _set_frequency(self, frequency):
+        self._start()
+
+    def _stop(self):
+        if self.pi.wave_tx_busy():
+            self.pi.wave_tx_stop()
+        if self.channel in self.hardware_pins:
+            self.pi.hardware_PWM(self.channel, 0, 0)
+        else:
+            self.pi.set_PWM_dutycycle(self.channel, 0)
+
+    def _send(self, segments):
+        self.pi.wave_clear()
+        waves = {}
+        chain = []
+        mask = 1 << self.channel
+        for frequency, pulses in segments:
+            if frequency not in waves:
+                period = int(round(1e6 / frequency))
+                high = max(1, int(period * self.dc / 100))
+                self.pi.wave_add_generic([pigpio.pulse(mask, 0, high), pigpio.pulse(0, mask, period - high)])
+                waves[frequency] = self.pi.wave_create()
+            while pulses > 0:
+                repeat = min(pulses, self.max_repeat)
+                # loop start, wave, loop end repeat times
+                chain += [255, 0, waves[frequency], 255, 1, repeat & 255, repeat >> 8]
+                pulses -= repeat
+        self.pi.wave_chain(chain)
+
+    def busy(self):
+        return bool(self.pi.wave_tx_busy())
+
+
+class Simulated_Pulse(Pulse_Backend):
+    """
+    Pulses that are only recorded, to test the control without the drive. The pulse train is kept as segments of
+    constant frequency, with the direction given by the direction pin. The segments that ended more than history
+    seconds ago are only kept in the total, so the memory and the cost of position() do not grow with the length of
+    a simulation
+    """
+    def __init__(self, channel, dir_pin=None, history=1.0, **kwargs):
+        """
+        Args:
+            channel: (int) pin number, only informative
+            dir_pin: object with state() (e.g. Dummy). State 1 (on) is down, -1 pulses, otherwise +1
+            history: (float) seconds of finished segments kept for position() and pulse_times()
+        """
+        super().__init__(channel, **kwargs)
+        self.dir_pin = dir_pin
+        self.history = history
+        self.segments = []  # [start, end (None while running), frequency, direction]
+        self.folded = None  # the segments that ended before this time are in folded_pulses
+        self.folded_pulses = 0.0
+        self.lock = threading.Lock()
+
+    def _direction(self):
+        if self.dir_pin is not None and self.dir_pin.state() == 1:
+            return -1
+        return 1
+
+    def _close(self, now):
+        if self.segments and self.segments[-1][1] is None:
+            self.segments[-1][1] = now
+        self._fold(now)
+
+    def _fold(self, now):
+        # Add the segments that ended more than history seconds ago to the total and forget them
+        keep = now - self.history
+        n = 0
+        for start, end, frequency, direction in self.segments:
+            if end is None or end > keep:
+                break
+            self.folded_pulses += direction * frequency * (end - start)
+            n += 1
+        if n:
+            del self.segments[:n]
+            self.folded = keep
+
+    def _start(self):
+        with self.lock:
+            now = self.clock()
+            self._close(now)
+            self.segments.append([now, None, float(self.frequency), self._direction()])
+
+    def _set_frequency(self, frequency):
+        self._start()
+
+    def _stop(self):
+        with self.lock:
+            now = self.clock()
+            self._close(now)
+            # A move that is still running is cut
+            for segment in self.segments:
+                if segment[1] > now:
+                    segment[1] = max(segment[0], now)
+
+    def _send(self, segments):
+        with self.lock:
+            t = max(self.clock(), self.segments[-1][1] if self.segments else 0.0)
+            direction = self._direction()
+            for frequency, pulses in segments:
+                end = t + pulses / frequency
+                self.segments.append([t, end, float(frequency), direction])
+                t = end
+
+    def busy(self):
+        return bool(self.segments) and self.segments[-1][1] is not None and self.segments[-1][1] > self.clock()
+
+    def position(self, t=None):
+        """
+        Signed number of pulses given until time t (positive up)
+        Args:
+            t: (float) time of the clock, now by default. It cannot be older than the history kept
+        Returns:
+            float
+        """
+        if t is None:
+            t = self.clock()
+        with self.lock:
+            if self.folded is not None and t < self.folded:
+                raise ValueError("The pulses before {} are not kept (history of {} s)".format(self.folded,
+                                                                                            self.history))
+            total = self.folded_pulses
+            for start, end, frequency, direction in self.segments:
+                if start >= t:
+                    continue
+                stop = t if end is None else min(end, t)
+                total += direction * frequency * (stop - start)
+        return total
+
+    def pulse_times(self):
+        """
+        Time of every pulse given in the history that is kept
+        Returns:
+            numpy array
+        """
+        now = self.clock()
+        with self.lock:
+            times = [start + np.arange(int(round(((now if end is None else min(end, now)) - start) * frequency)))
+                     / frequency for start, end, frequency, _ in self.segments]
+        if not times:
+            return np.empty(0)
+        return np.concatenate(times)
+
+
+def make_pulse_backend(name, channel, **kwargs):
+    """
+    Create a pulse backend by its name
+    Args:
+        name: (str) "rpi", "pigpio" or "simulated"
+        channel: (int) GPIO pin of the pulses
+        **kwargs: parameters of the backend
+    Returns:
+        Pulse_Backend
+    """
+    backends = {"rpi": RPi_GPIO_Pulse,
+                "pigpio": Pigpio_Pulse,
+                "simulated": Simulated_Pulse}
+    return backends[name](channel, **kwargs)
@@ -0,0 +1,276 @@
+# Import relevant packages
+import numpy as np
+
+
+class Resolution_Pyramid:
+    """
+    Class that keeps a recording at several time resolutions (e.g. 0.1 s, 1 s, 10 s, 1 min, 10 min, 1 h) as the
+    minimum, maximum and mean of every bin, so a test of any length can be plotted or exported without the raw
+    samples. Every level is a ring of a fixed number of bins: the memory does not grow with the recording and
+    a query reads at most that number of bins. Only the finest level is fed by the samples, the other levels are
+    fed by the bins of the level below when they are complete
+    """
+    def __init__(self, channels=("Force_kN", "Setpoint_kN"), resolutions=(0.1, 1, 10, 60, 600, 3600),
+                 capacity=4096):
+        """
+        Initialize the class with global variables
+        Args:
+            channels: (tuple of str) names of the values of every sample
+            resolutions: (tuple of float) width of the bins of every level in seconds, every one a whole multiple
+        of the previous one
+            capacity: (int) bins kept by every level, e.g. 4096 bins of 1 s are a bit more than one hour
+        """
+        self.channels = tuple(channels)
+        self.resolutions = tuple(float(r) for r in resolutions)
+        self.capacity = int(capacity)
+        self.ratios = [1]
+        for fine, coarse in zip(self.resolutions[:-1], self.resolutions[1:]):
+            ratio = int(round(coarse / fine))
+            if ratio < 2 or abs(ratio * fine - coarse) > 1e-9 * coarse:
+                raise ValueError("Every resolution has to be a multiple of the previous one")
+            self.ratios.append(ratio)
+        self.clear()
+
+    def clear(self):
+        """
+        Erase all the bins
+        Returns:
+        """
+        shape = (self.capacity, len(self.channels))
+        self._index = [np.empty(self.capacity, dtype=np.int64) for _ in self.resolutions]
+        self._stats = [{name: np.empty(shape) for name in ("count", "min", "max", "sum")} for _ in self.resolutions]
+        self._start = [0] * len(self.resolutions)
+        self._count = [0] * len(self.resolutions)
+        self._dropped = [0] * len(self.resolutions)  # bins that went out of the ring
+        self._open = [None] * len(self.resolutions)  # bin still receiving data: [index, count, min, max, sum]
+        self.samples = 0
+        self.last_time = None
+
+    @property
+    def nbytes(self):
+        return sum(i.nbytes + sum(a.nbytes for a in s.values()) for i, s in zip(self._index, self._stats))
+
+    def add(self, time_sec, *values):
+        """
+        Add one sample
+        Args:
+            time_sec: (float) time of the sample in seconds, not lower than the previous one
+            *values: (float) one value per channel, NaN if there is none
+        Returns:
+        """
+        index = int(time_sec // self.resolutions[0])
+        current = self._open[0]
+        if current is not None and index <= current[0]:
+            # Most samples fall in the open bin: plain Python, no array is touched
+            _, count, low, high, total = current
+            for c, v in enumerate(values):
+                if v == v:
+                    count[c] += 1
+                    total[c] += v
+                    if not low[c] <= v:
+                        low[c] = v
+                    if not high[c] >= v:
+                        high[c] = v
+        else:
+            if current is not None:
+                self._push(0, current)
+            valid = [1.0 if v == v else 0.0 for v in values]
+            self._open[0] = [index, valid, list(values), list(values), [v if v == v else 0.0 for v in values]]
+        self.samples += 1
+        self.last_time = time_sec if self.last_time is None else max(self.last_time, time_sec)
+
+    def extend(self, time_sec, values):
+        """
+        Add a block of samples
+        Args:
+            time_sec: (array) time of the samples, increasing
+            values: (array) shape (samples, channels)
+        Returns:
+        """
+        time_sec = np.asarray(time_sec, dtype=np.float64)
+        if len(time_sec) == 0:
+            return
+        values = np.asarray(values, dtype=np.float64).reshape(len(time_sec), len(self.channels))
+        index = np.floor(time_sec / self.resolutions[0]).astype(np.int64)
+        self._feed(0, index, *self._sample_stats(values))
+        self.samples += len(time_sec)
+        last = float(time_sec[-1])
+        self.last_time = last if self.last_time is None else max(self.last_time, last)
+
+    @staticmethod
+    def _sample_stats(values):
+        valid = ~np.isnan(values)
+        return valid.astype(np.float64), values, values, np.where(valid, values, 0.0)
+
+    @staticmethod
+    def _reduce(index, count, low, high, total):
+        # Merge the rows with the same index (the index is increasing)
+        starts = np.flatnonzero(np.concatenate(([True], index[1:] != index[:-1])))
+        if len(starts) == len(index):
+            return index, count, low, high, total
+        return (index[starts], np.add.reduceat(count, starts, axis=0), np.fmin.reduceat(low, starts, axis=0),
+                np.fmax.reduceat(high, starts, axis=0), np.add.reduceat(total, starts, axis=0))
+
+    def _with_open(self, level, index, count, low, high, total):
+        current = self._open[level]
+        if current is None:
+            return index, count, low, high, total
+        index = np.maximum.accumulate(np.concatenate(([current[0]], index)))  # a late sample stays in the open bin
+        rows = [np.concatenate((np.array([current[k]], dtype=np.float64), a))
+                for k, a in zip(range(1, 5), (count, low, high, total))]
+        return (index, *rows)
+
+    def _feed(self, level, index, count, low, high, total):
+        """
+        Add bins (or samples) to a level: the last bin stays open, the complete ones go to the ring and to the next
+        level
+        """
+        index, count, low, high, total = self._reduce(*self._with_open(level, index, count, low, high, total))
+        self._open[level] = [int(index[-1]), count[-1].tolist(), low[-1].tolist(), high[-1].tolist(),
+                             total[-1].tolist()]
+        if len(index) == 1:
+            return
+        closed = (index[:-1], count[:-1], low[:-1], high[:-1], total[:-1])
+        self._store(level, *closed)
+        if level + 1 < len(self.resolutions):
+            self._feed(level + 1, closed[0] // self.ratios[level + 1], *closed[1:])
+
+    def _push(self, level, complete):
+        """
+        Store one complete bin of a level and add it to the open bin of the next level, without numpy operations on
+        whole arrays (the path of add())
+        """
+        position = (self._start[level] + self._count[level]) % self.capacity
+        self._index[level][position] = complete[0]
+        stats = self._stats[level]
+        for name, row in zip(("count", "min", "max", "sum"), complete[1:]):
+            stats[name][position] = row
+        if self._count[level] == self.capacity:
+            self._start[level] = (self._start[level] + 1) % self.capacity
+            self._dropped[level] += 1
+        else:
+            self._count[level] += 1
+        if level + 1 == len(self.resolutions):
+            return
+        index = complete[0] // self.ratios[level + 1]
+        current = self._open[level + 1]
+        if current is not None and index <= current[0]:
+            for c in range(len(self.channels)):
+                current[1][c] += complete[1][c]
+                current[4][c] += complete[4][c]
+                low, high = complete[2][c], complete[3][c]
+                if low == low and not current[2][c] <= low:
+                    current[2][c] = low
+                if high == high and not current[3][c] >= high:
+                    current[3][c] = high
+            return
+        if current is not None:
+            self._push(level + 1, current)
+        self._open[level + 1] = [index] + [list(row) for row in complete[1:]]
+
+    def _store(self, level, index, count, low, high, total):
+        n = len(index)
+        if n > self.capacity:
+            self._dropped[level] += n - self.capacity
+            index, count, low, high, total = (a[-self.capacity:] for a in (index, count, low, high, total))
+            n = self.capacity
+        positions = (self._start[level] + self._count[level] + np.arange(n)) % self.capacity
+        self._index[level][positions] = index
+        stats = self._stats[level]
+        for name, rows in zip(("count", "min", "max", "sum"), (count, low, high, total)):
+            stats[name][positions] = rows
+        overflow = max(0, self._count[level] + n - self.capacity)
+        self._dropped[level] += overflow
+        self._start[level] = (self._start[level] + overflow) % self.capacity
+        self._count[level] = min(self._count[level] + n, self.capacity)
+
+    def _oldest(self, level):
+        # Time of the oldest bin of a level, None if it is empty
+        if self._count[level]:
+            return self._index[level][self._start[level]] * self.resolutions[level]
+        if self._open[level] is not None:
+            return self._open[level][0] * self.resolutions[level]
+        return None
+
+    def level_for(self, seconds=None, resolution=None):
+        """
+        Level that answers a query: the coarsest one not coarser than resolution (the finest one if None), or a
+        coarser one if it does not go back far enough
+        Args:
+            seconds: (float) length of the window that ends at the last sample, the whole recording if None
+            resolution: (float) width of the bins wanted in seconds
+        Returns:
+            (int) level
+        """
+        level = 0
+        if resolution is not None:
+            level = max([0] + [i for i, r in enumerate(self.resolutions) if r <= resolution * (1 + 1e-9)])
+        if self.last_time is None:
+            return level
+        begin = None if seconds is None else self.last_time - seconds
+        while level + 1 < len(self.resolutions) and self._dropped[level]:
+            oldest = self._oldest(level)
+            if begin is not None and oldest is not None and oldest <= begin:
+                break
+            level += 1
+        return level
+
+    def window(self, seconds=None, resolution=None):
+        """
+        Bins of the end of the recording, e.g. window(3600, 1) for the last hour at 1 second
+        Args:
+            seconds: (float) length of the window that ends at the last sample, the whole recording if None
+            resolution: (float) width of the bins wanted in seconds, see level_for()
+        Returns:
+            dict of numpy arrays: "time" (start of every bin), "samples" and, for every channel, "<name>_min",
+        "<name>_max" and "<name>_mean"; plus "resolution" (width of the bins given)
+        """
+        level = self.level_for(seconds, resolution)
+        width = self.resolutions[level]
+        first = None
+        if seconds is not None and self.last_time is not None:
+            first = int((self.last_time - seconds) // width)
+
+        # Complete bins of the level, found by binary search in the two parts of the ring
+        parts = []
+        start, count, cap = self._start[level], self._count[level], self.capacity
+        for lo, hi in ((start, min(start + count, cap)), (0, max(0, start + count - cap))):
+            if hi <= lo:
+                continue
+            index = self._index[level][lo:hi]
+            skip = 0 if first is None else int(np.searchsorted(index, first))
+            if skip < len(index):
+                parts.append(slice(lo + skip, hi))
+        stats = self._stats[level]
+        blocks = [(self._index[level][p], stats["count"][p], stats["min"][p], stats["max"][p], stats["sum"][p])
+                  for p in parts]
+
+        # The open bins of this level and of the finer ones hold the newest data
+        tail = [lv for lv in range(level + 1) if self._open[lv] is not None]
+        if tail:
+            divisor = np.array([int(np.prod(self.ratios[lv + 1:level + 1])) for lv in tail], dtype=np.int64)
+            index = np.array([self._open[lv][0] for lv in tail], dtype=np.int64) // divisor
+            rows = [np.array([self._open[lv][k] for lv in tail], dtype=np.float64) for k in range(1, 5)]
+            order = np.argsort(index, kind="stable")
+            merged = self._reduce(index[order], *(r[order] for r in rows))
+            if first is not None:
+                keep = merged[0] >= first
+                merged = tuple(a[keep] for a in merged)
+            blocks.append(merged)
+
+        if blocks:
+            index, count, low, high, total = (np.concatenate(a) for a in zip(*blocks))
+            # A bin that was complete at a finer level may also be in the open bin of this level
+            index, count, low, high, total = self._reduce(index, count, low, high, total)
+        else:
+            index = np.empty(0, dtype=np.int64)
+            count = low = high = total = np.empty((0, len(self.channels)))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(count > 0, total / count, np.nan)
+        result = {"time": index * width, "samples": count[:, 0].astype(np.int64), "resolution": width}
+        for c, name in enumerate(self.channels):
+            empty = count[:, c] == 0
+            result[name + "_min"] = np.where(empty, np.nan, low[:, c])
+            result[name + "_max"] = np.where(empty, np.nan, high[:, c])
+            result[name + "_mean"] = mean[:, c]
+        return result
@@ -0,0 +1,307 @@
+# Import relevant packages
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+from .Binary_Recording import header_bytes, records_bytes
+
+
+class Recording_Writer:
+    """
+    Class that streams the recorded samples to a csv or binary (.prec) file from a background thread. The samples are written in
+    batches to "<file>.partial" and the file is atomically renamed to its final name when it is closed, so a crash
+    loses at most the batch that was not flushed yet
+    """
+    header = "Date,Time_sec,Force_kN,Setpoint_kN\n"
+
+    def __init__(self, path, flush_interval=1.0, flush_size=256, fsync="batch", max_bytes=None, max_seconds=None,
+                 file_format="csv", metadata=None, pool=None):
+        """
+        Initialize the class with global variables
+        Args:
+            path: (str) final name of the csv file
+            flush_interval: (float) maximum seconds a sample waits in memory before it is written
+            flush_size: (int) number of samples that triggers a write before flush_interval is reached
+            fsync: (str) "batch" to fsync after every write, "close" to fsync only when a file is finished or
+        "never"
+            max_bytes: (int) rotate to a new file when the current one reaches this size
+            max_seconds: (float) rotate to a new file after this many seconds
+            file_format: (str) "csv" or "binary"
+            metadata: (dict) header of the binary files (start_epoch, sample_rate, calibration, pins)
+            pool: Writer_Pool that does the writing, by default the writer has its own thread
+        """
+        if fsync not in ("batch", "close", "never"):
+            raise ValueError("fsync has to be 'batch', 'close' or 'never'")
+        if file_format not in ("csv", "binary"):
+            raise ValueError("file_format has to be 'csv' or 'binary'")
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.fsync = fsync
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.file_format = file_format
+        self.metadata = dict(metadata or {})
+        self.metadata.setdefault("start_epoch", None)
+
+        self.pool = pool
+        self.queue = queue.Queue()
+        self.thread = None
+        self.accepting = False  # between start() and close()
+        self._closed = None  # set when a pooled writer finished
+        self.error = None
+        self.files = []  # finished files, in order
+
+        self._file = None
+        self._part = 0
+        self._part_path = None
+        self._part_bytes = 0
+        self._part_opened = None
+        self._batch = []
+        self._deadline = None
+        self.samples_written = 0
+
+    def start(self):
+        """
+        Open the first file and start the writing thread (or join the Writer_Pool)
+        Returns:
+        """
+        if self.thread is not None or self._closed is not None:
+            return
+        self._open_part()
+        self.accepting = True
+        self._deadline = time.monotonic() + self.flush_interval
+        if self.pool is not None:
+            self._closed = threading.Event()
+            self.pool.add(self)
+            return
+        self.thread = threading.Thread(target=self._thread_loop, daemon=True, )
+        self.thread.start()
+
+    @property
+    def running(self):
+        if self.pool is not None:
+            return self._closed is not None and not self._closed.is_set()
+        return self.thread is not None and self.thread.is_alive()
+
+    def _put(self, item):
+        if self.pool is not None:
+            self.pool.queue.put((self, item))
+        else:
+            self.queue.put(item)
+
+    def write(self, time_sec, force, epoch, setpoint=float("nan")):
+        """
+        Queue a sample to be written, it never blocks the recording thread
+        Args:
+            time_sec: (float) seconds since the recording started
+            force: (float) force in kN
+            epoch: (float) wall clock time of the sample
+            setpoint: (float) setpoint of the force controller in kN, NaN without force control
+        Returns:
+        """
+        if not self.accepting:
+            raise RuntimeError("The recording writer is not started or already closed: " + self.path)
+        self._put((time_sec, force, epoch, setpoint))
+
+    def flush(self, timeout=None):
+        """
+        Wait until every sample queued so far is on disk
+        Args:
+            timeout: (float) seconds to wait at most
+        Returns:
+            True if the samples were written
+        """
+        if not self.running:
+            return False
+        done = threading.Event()
+        self._put(done)
+        return done.wait(timeout)
+
+    def close(self):
+        """
+        Write the remaining samples, fsync and rename the file to its final name
+        Returns:
+            List with the paths of the finished files
+        """
+        self.accepting = False
+        if self.pool is not None:
+            if self.running:
+                self._put(None)
+                self._closed.wait()
+        elif self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+        return self.files
+
+    def _part_name(self):
+        if self._part == 0:
+            return self.path
+        root, ext = os.path.splitext(self.path)
+        return "{}_part{}{}".format(root, self._part, ext)
+
+    def _open_part(self):
+        self._part_path = self._part_name()
+        if self.file_format == "csv":
+            header = self.header.encode("utf-8")
+        else:
+            header = header_bytes(**self.metadata)
+        self._file = open(self._part_path + ".partial", "wb")
+        self._file.write(header)
+        self._part_bytes = len(header)
+        self._part_opened = time.monotonic()
+
+    def _close_part(self):
+        self._file.flush()
+        if self.fsync != "never":
+            os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+        os.replace(self._part_path + ".partial", self._part_path)
+        if self.fsync != "never":
+            # Make the rename itself durable
+            try:
+                fd = os.open(os.path.dirname(os.path.abspath(self._part_path)), os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+            except OSError:
+                pass
+        self.files.append(self._part_path)
+        print("Data saved in:", self._part_path)
+
+    def _rotate_due(self):
+        if self.max_bytes is not None and self._part_bytes >= self.max_bytes:
+            return True
+        if self.max_seconds is not None and time.monotonic() - self._part_opened >= self.max_seconds:
+            return True
+        return False
+
+    def _write_batch(self, batch):
+        if batch:
+            if self.file_format == "csv":
+                data = "".join("{},{!r},{!r},{}\n".format(time.ctime(e), float(t), float(f),
+                                                            "" if sp != sp else repr(float(sp)))
+                               for t, f, e, sp in batch).encode("utf-8")
+            else:
+                columns = np.array(batch, dtype=np.float64)
+                data = records_bytes(columns[:, 0], columns[:, 1], columns[:, 3])
+            self._file.write(data)
+            self._file.flush()
+            if self.fsync == "batch":
+                os.fsync(self._file.fileno())
+            self._part_bytes += len(data)
+            self.samples_written += len(batch)
+        if self._rotate_due():
+            self._close_part()
+            self._part += 1
+            self._open_part()
+
+    def _handle(self, item):
+        """
+        Process one queued item (only called by the writing thread)
+        Args:
+            item: sample tuple, Event of a flush, None to close or () when nothing arrived
+        Returns:
+            True when the file was closed
+        """
+        if item is None:
+            self._write_batch(self._batch)
+            self._batch = []
+            self._close_part()
+            return True
+        if isinstance(item, threading.Event):
+            self._write_batch(self._batch)
+            self._batch = []
+            item.set()
+            return False
+        if item:
+            self._batch.append(item)
+        if len(self._batch) >= self.flush_size or time.monotonic() >= self._deadline:
+            self._write_batch(self._batch)
+            self._batch = []
+            self._deadline = time.monotonic() + self.flush_interval
+        return False
+
+    def _thread_loop(self):
+        """
+        Collect the queued samples and write them when the batch is full or flush_interval has passed
+        Returns:
+        """
+        try:
+            while True:
+                try:
+                    item = self.queue.get(timeout=max(0.0, self._deadline - time.monotonic()))
+                except queue.Empty:
+                    item = ()
+                if self._handle(item):
+                    return
+        except Exception as e:
+            self.error = e
+            print("Recording writer stopped:", e)
+
+
+class Writer_Pool:
+    """
+    Class with one thread that writes the files of several Recording_Writer (e.g. one per station), instead of a
+    thread per file
+    """
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.writers = []
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def writer(self, path, **kwargs):
+        """
+        Create a Recording_Writer served by this pool
+        Args:
+            path: (str) final name of the file
+            **kwargs: options of the Recording_Writer
+        Returns:
+            Recording_Writer (not started)
+        """
+        return Recording_Writer(path, pool=self, **kwargs)
+
+    def add(self, writer):
+        with self.lock:
+            self.writers.append(writer)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._thread_loop, daemon=True, )
+                self.thread.start()
+
+    def _finish(self, writer):
+        self.writers.remove(writer)
+        writer._closed.set()
+
+    def _thread_loop(self):
+        while True:
+            with self.lock:
+                if not self.writers and self.queue.empty():
+                    self.thread = None
+                    return
+                deadline = min(w._deadline for w in self.writers) if self.writers else time.monotonic()
+            try:
+                work = [self.queue.get(timeout=max(0.0, deadline - time.monotonic()))]
+            except queue.Empty:
+                work = []
+            # Writers that did not receive samples still have to write their batch in time
+            now = time.monotonic()
+            work += [(w, ()) for w in self.writers if now >= w._deadline]
+            for writer, item in work:
+                if writer not in self.writers:
+                    continue
+                try:
+                    closed = writer._handle(item)
+                except Exception as e:
+                    writer.error = e
+                    print("Recording writer stopped:", e)
+                    closed = True
+                if closed:
+                    with self.lock:
+                        self._finish(writer)
@@ -0,0 +1,304 @@
+# Import relevant packages
+import threading
+import time
+
+import numpy as np
+
+from .Pyramid import Resolution_Pyramid
+
+
+class Sample_Store:
+    """
+    Class that keeps the recorded samples of the press in preallocated numpy columns. Appending a sample is O(1)
+    and the data is only converted to a pandas data frame when it is needed (saving, exporting). With a
+    Resolution_Pyramid the store also keeps the whole recording as min/max/mean bins, see window()
+    """
+    columns = ("Date", "Time_sec", "Force_kN", "Setpoint_kN")
+
+    def __init__(self, chunk_size=4096, max_samples=None, pyramid=None):
+        """
+        Initialize the class with global variables
+        Args:
+            chunk_size: (int) number of samples the columns grow by every time they are full
+            max_samples: (int) if given the store works as a ring buffer and only keeps the last max_samples samples
+            pyramid: Resolution_Pyramid with the channels Force_kN and Setpoint_kN fed with every sample, True for
+        the default one
+        """
+        self.chunk_size = int(chunk_size)
+        self.max_samples = None if max_samples is None else int(max_samples)
+        self.pyramid = Resolution_Pyramid() if pyramid is True else pyramid
+        self.epoch_offset = None  # epoch - Time_sec of the first sample, to date the bins of the pyramid
+        self.lock = threading.Lock()
+
+        self._time = None
+        self._force = None
+        self._epoch = None
+        self._setpoint = None
+        self._start = 0  # index of the oldest sample (only moves in ring mode)
+        self._count = 0  # number of valid samples
+        self.total = 0  # number of samples ever appended
+        self.clear()
+
+    def clear(self):
+        """
+        Erase all the samples and go back to the initial capacity
+        Returns:
+        """
+        size = self.max_samples if self.max_samples is not None else self.chunk_size
+        with self.lock:
+            self._time = np.empty(size, dtype=np.float64)
+            self._force = np.empty(size, dtype=np.float64)
+            self._epoch = np.empty(size, dtype=np.float64)
+            self._setpoint = np.empty(size, dtype=np.float64)
+            self._start = 0
+            self._count = 0
+            self.total = 0
+            self.epoch_offset = None
+            if self.pyramid is not None:
+                self.pyramid.clear()
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def capacity(self):
+        return len(self._time)
+
+    def _grow(self, needed):
+        """
+        Enlarge the columns by whole chunks so there is space for at least `needed` samples. The capacity is at least
+        doubled so the copies stay amortized O(1) per sample
+        Args:
+            needed: (int) minimum capacity
+        Returns:
+        """
+        needed = max(needed, 2 * len(self._time))
+        new_size = -(-needed // self.chunk_size) * self.chunk_size
+        for name in ("_time", "_force", "_epoch", "_setpoint"):
+            old = getattr(self, name)
+            new = np.empty(new_size, dtype=np.float64)
+            new[:self._count] = old[:self._count]
+            setattr(self, name, new)
+
+    def append(self, time_sec, force, epoch=None, setpoint=np.nan):
+        """
+        Add a single sample to the store
+        Args:
+            time_sec: (float) seconds since the recording started (monotonic clock)
+            force: (float) force in kN
+            epoch: (float) wall clock time of the sample, time.time() is used if not given
+            setpoint: (float) force the controller was aiming at in kN, NaN without force control
+        Returns:
+        """
+        if epoch is None:
+            epoch = time.time()
+        with self.lock:
+            if self.max_samples is None:
+                if self._count == len(self._time):
+                    self._grow(self._count + 1)
+                i = self._count
+                self._count += 1
+            else:
+                i = (self._start + self._count) % self.max_samples
+                if self._count == self.max_samples:
+                    self._start = (self._start + 1) % self.max_samples
+                else:
+                    self._count += 1
+            self._time[i] = time_sec
+            self._force[i] = force
+            self._epoch[i] = epoch
+            self._setpoint[i] = setpoint
+            self.total += 1
+            if self.epoch_offset is None:
+                self.epoch_offset = epoch - time_sec
+            if self.pyramid is not None:
+                self.pyramid.add(time_sec, force, setpoint)
+
+    def extend(self, time_sec, force, epoch, setpoint=None):
+        """
+        Add a block of samples to the store in a single copy
+        Args:
+            time_sec: (array) seconds since the recording started
+            force: (array) force in kN
+            epoch: (array) wall clock time of the samples
+            setpoint: (array) setpoint of the controller in kN, NaN if not given
+        Returns:
+        """
+        time_sec = np.asarray(time_sec, dtype=np.float64)
+        force = np.asarray(force, dtype=np.float64)
+        epoch = np.asarray(epoch, dtype=np.float64)
+        if setpoint is None:
+            setpoint = np.full(len(time_sec), np.nan)
+        setpoint = np.asarray(setpoint, dtype=np.float64)
+        n = len(time_sec)
+        with self.lock:
+            if self.epoch_offset is None and n:
+                self.epoch_offset = epoch[0] - time_sec[0]
+            if self.pyramid is not None:
+                self.pyramid.extend(time_sec, np.column_stack((force, setpoint)))
+            if self.max_samples is None:
+                if self._count + n > len(self._time):
+                    self._grow(self._count + n)
+                sl = slice(self._count, self._count + n)
+                self._time[sl] = time_sec
+                self._force[sl] = force
+                self._epoch[sl] = epoch
+                self._setpoint[sl] = setpoint
+                self._count += n
+            else:
+                if n >= self.max_samples:
+                    # Only the newest samples fit
+                    time_sec, force = time_sec[-self.max_samples:], force[-self.max_samples:]
+                    epoch, setpoint = epoch[-self.max_samples:], setpoint[-self.max_samples:]
+                    self._start, self._count = 0, 0
+                    m = self.max_samples
+                else:
+                    m = n
+                idx = (self._start + self._count + np.arange(m)) % self.max_samples
+                self._time[idx] = time_sec
+                self._force[idx] = force
+                self._epoch[idx] = epoch
+                self._setpoint[idx] = setpoint
+                overflow = max(0, self._count + m - self.max_samples)
+                self._start = (self._start + overflow) % self.max_samples
+                self._count = min(self._count + m, self.max_samples)
+            self.total += n
+
+    def _ordered(self, col):
+        """
+        Return the valid part of a column from the oldest to the newest sample. It has to be called with the lock
+        held. In chunked mode this is a view without copy (the samples already written never change); in ring mode
+        it is a copy, the next appends overwrite the oldest samples
+        Args:
+            col: (np.ndarray) internal column
+        Returns:
+            np.ndarray
+        """
+        end = self._start + self._count
+        if end <= len(col):
+            part = col[self._start:end]
+            return part if self.max_samples is None else part.copy()
+        return np.concatenate((col[self._start:], col[:end - len(col)]))
+
+    def get_columns(self, *names):
+        """
+        Several columns taken at the same moment, all of them with the same samples
+        Args:
+            *names: (str) "Time_sec", "Force_kN", "Setpoint_kN" or "Epoch"
+        Returns:
+            tuple of np.ndarray
+        """
+        with self.lock:
+            cols = {"Time_sec": self._time, "Force_kN": self._force, "Setpoint_kN": self._setpoint,
+                    "Epoch": self._epoch}
+            return tuple(self._ordered(cols[name]) for name in names)
+
+    def snapshot(self):
+        """
+        Consistent view of the three columns at this moment
+        Returns:
+            (time_sec, force, epoch) numpy arrays
+        """
+        return self.get_columns("Time_sec", "Force_kN", "Epoch")
+
+    def column(self, name):
+        """
+        Get a single column by its data frame name
+        Args:
+            name: (str) "Time_sec", "Force_kN", "Setpoint_kN" or "Epoch"
+        Returns:
+            np.ndarray
+        """
+        return self.get_columns(name)[0]
+
+    def last(self):
+        """
+        Most recent sample
+        Returns:
+            (time_sec, force, epoch) or None if the store is empty
+        """
+        with self.lock:
+            if self._count == 0:
+                return None
+            i = (self._start + self._count - 1) % len(self._time)
+            return self._time[i], self._force[i], self._epoch[i]
+
+    def tail(self, n):
+        """
+        Copy of the last n samples
+        Args:
+            n: (int) number of samples
+        Returns:
+            (time_sec, force, setpoint) numpy arrays
+        """
+        with self.lock:
+            n = min(n, self._count)
+            idx = (self._start + self._count - n + np.arange(n)) % len(self._time)
+            return self._time[idx], self._force[idx], self._setpoint[idx]
+
+    def window(self, seconds=None, resolution=None):
+        """
+        Minimum, maximum and mean of the end of the recording in bins, e.g. window(3600, 1) for the last hour at
+        1 second. The time it takes does not depend on the length of the recording
+        Args:
+            seconds: (float) length of the window, the whole recording if None
+            resolution: (float) width of the bins in seconds, see Resolution_Pyramid.level_for()
+        Returns:
+            dict of numpy arrays, see Resolution_Pyramid.window()
+        """
+        if self.pyramid is None:
+            raise RuntimeError("The store has no Resolution_Pyramid")
+        with self.lock:
+            return self.pyramid.window(seconds, resolution)
+
+    def window_dataframe(self, seconds=None, resolution=None):
+        """
+        Pandas data frame of window() to export a long recording: "Date", "Time_sec" (start of every bin),
+        "Samples" and the min/max/mean of Force_kN and Setpoint_kN
+        Returns:
+            pd.DataFrame, with the width of the bins in df.attrs["resolution"]
+        """
+        import pandas as pd  # only loaded when a recording is exported
+        bins = self.window(seconds, resolution)
+        if self.epoch_offset is None:
+            dates = np.full(len(bins["time"]), None, dtype=object)
+        else:
+            dates = self.epoch_to_date(bins["time"] + self.epoch_offset)
+        df = pd.DataFrame({"Date": dates,
+                           "Time_sec": bins["time"],
+                           "Samples": bins["samples"]})
+        for name in self.pyramid.channels:
+            for stat in ("min", "max", "mean"):
+                df[name + "_" + stat] = bins[name + "_" + stat]
+        df.attrs["resolution"] = bins["resolution"]
+        return df
+
+    @staticmethod
+    def epoch_to_date(epoch):
+        """
+        Convert epoch seconds to the same text that time.ctime() gives, formatting every distinct second only once
+        Args:
+            epoch: (array) wall clock times
+        Returns:
+            np.ndarray of str
+        """
+        seconds = np.floor(np.asarray(epoch)).astype(np.int64)
+        if len(seconds) == 0:
+            return np.array([], dtype=object)
+        unique, inverse = np.unique(seconds, return_inverse=True)
+        text = np.array([time.ctime(s) for s in unique], dtype=object)
+        return text[inverse]
+
+    def to_dataframe(self):
+        """
+        Build the pandas data frame of the recording ("Date", "Time_sec", "Force_kN", "Setpoint_kN")
+        Returns:
+            pd.DataFrame
+        """
+        import pandas as pd  # only loaded when a recording is exported
+        time_sec, force, epoch, setpoint = self.get_columns("Time_sec", "Force_kN", "Epoch", "Setpoint_kN")
+        return pd.DataFrame({"Date": self.epoch_to_date(epoch),
+                             "Time_sec": np.array(time_sec),
+                             "Force_kN": np.array(force),
+                             "Setpoint_kN": np.array(setpoint)},
+                            columns=list(self.columns))
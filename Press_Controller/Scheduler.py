@@ -0,0 +1,176 @@
+# Import relevant packages
+import math
+import time
+
+
+class Fixed_Rate_Scheduler:
+    """
+    Class that paces a loop at a fixed rate. The deadlines are computed from the start time (start + k * period)
+    instead of sleeping a fixed time after the work, so the time spent working does not make the loop drift
+    """
+    def __init__(self, period, spin=0.0005, clock=time.perf_counter, sleep=time.sleep):
+        """
+        Initialize the class with global variables
+        Args:
+            period: (float) seconds between two ticks, e.g. 1/80 for the maximum rate of the HX711
+            spin: (float) the last part of the wait is done busy waiting to reduce the wake up jitter of sleep()
+            clock: function that returns the current time in seconds
+            sleep: function that sleeps a number of seconds
+        """
+        if period <= 0:
+            raise ValueError("The period has to be bigger than 0")
+        self.period = float(period)
+        self.spin = spin
+        self.clock = clock
+        self.sleep = sleep
+        self.reset()
+
+    def reset(self):
+        """
+        Forget the start time and the statistics, the next wait() starts a new schedule
+        Returns:
+        """
+        self.start_time = None
+        self.k = 0  # index of the next deadline
+        self.ticks = 0
+        self.missed = 0
+        self.last_tick = None
+        # Running statistics of the lateness (time of the tick - deadline)
+        self._mean = 0.0
+        self._m2 = 0.0
+        self.max_lateness = 0.0
+
+    @property
+    def next_deadline(self):
+        if self.start_time is None:
+            return None
+        return self.start_time + self.k * self.period
+
+    def wait(self, cancelled=None):
+        """
+        Sleep until the next deadline. If the loop is so late that whole periods were missed, they are counted and
+        skipped instead of running them all at once
+        Args:
+            cancelled: function checked after the sleep (e.g. with a sleep that can be interrupted); if it returns
+        True the wait ends without serving the deadline
+        Returns:
+            The time of the deadline that was served, None if it was cancelled
+        """
+        now = self.clock()
+        deadline = self._next(now)
+        remaining = deadline - now
+        if remaining > self.spin:
+            self.sleep(remaining - self.spin)
+            if cancelled is not None and cancelled():
+                return None
+        while self.clock() < deadline:
+            pass
+        return self._tick(deadline)
+
+    def poll(self):
+        """
+        Non-blocking version of wait() for loops that serve several schedules (see wait_next)
+        Returns:
+            The time of the deadline that was served, None if it has not arrived yet
+        """
+        now = self.clock()
+        deadline = self._next(now)
+        if now < deadline:
+            return None
+        return self._tick(deadline)
+
+    def _next(self, now):
+        # Deadline to serve, skipping the periods that were completely missed
+        if self.start_time is None:
+            self.start_time = now
+            self.k = 0
+        deadline = self.start_time + self.k * self.period
+        if now > deadline + self.period:
+            skipped = int(math.floor((now - deadline) / self.period))
+            self.missed += skipped
+            self.k += skipped
+            deadline = self.start_time + self.k * self.period
+        return deadline
+
+    def _tick(self, deadline):
+        tick = self.clock()
+        self._add_lateness(tick - deadline)
+        self.last_tick = tick
+        self.ticks += 1
+        self.k += 1
+        return deadline
+
+    def _add_lateness(self, value):
+        # Welford's online algorithm
+        n = self.ticks + 1
+        delta = value - self._mean
+        self._mean += delta / n
+        self._m2 += delta * (value - self._mean)
+        self.max_lateness = max(self.max_lateness, value)
+
+    def achieved_rate(self):
+        """
+        Ticks per second measured from the first to the last tick
+        Returns:
+            float
+        """
+        if self.ticks < 2:
+            return None
+        return (self.ticks - 1) / (self.last_tick - self.start_time)
+
+    def jitter(self):
+        """
+        Standard deviation of the lateness of the ticks in seconds
+        Returns:
+            float
+        """
+        if self.ticks < 2:
+            return 0.0
+        return math.sqrt(self._m2 / (self.ticks - 1))
+
+    def stats(self):
+        """
+        Summary of how well the rate was kept
+        Returns:
+            dict
+        """
+        return {"period": self.period,
+                "target_rate": 1 / self.period,
+                "achieved_rate": self.achieved_rate(),
+                "ticks": self.ticks,
+                "missed": self.missed,
+                "mean_lateness": self._mean,
+                "max_lateness": self.max_lateness,
+                "jitter": self.jitter()}
+
+
+def wait_next(schedulers, max_wait=0.1, sleep=None, cancelled=None):
+    """
+    One thread serving several Fixed_Rate_Scheduler (e.g. the recordings of several stations): sleep until the
+    earliest deadline and tick the schedulers that are due
+    Args:
+        schedulers: list of Fixed_Rate_Scheduler with the same clock
+        max_wait: (float) maximum seconds to sleep, so schedulers added or removed meanwhile are noticed
+        sleep: function that sleeps a number of seconds, the one of the first scheduler by default
+        cancelled: function checked after the sleep, if it returns True nothing is ticked
+    Returns:
+        List with the schedulers that ticked
+    """
+    if not schedulers:
+        (sleep or time.sleep)(max_wait)
+        return []
+    first = schedulers[0]
+    sleep = sleep or first.sleep
+    now = first.clock()
+    deadline = min(now if s.next_deadline is None else s.next_deadline for s in schedulers)
+    remaining = deadline - now
+    if remaining > max_wait:
+        sleep(max_wait)
+        return []
+    if remaining > first.spin:
+        sleep(remaining - first.spin)
+        if cancelled is not None and cancelled():
+            return []
+    while first.clock() < deadline:
+        pass
+    return [s for s in schedulers if s.poll() is not None]
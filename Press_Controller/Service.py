@@ -0,0 +1,445 @@
+"""
+Headless service of the press. The acquisition, the force control and the recording run in a Press_Service
+without any window; other programs (the GUI, scripts) send it commands through a local socket.
+
+The protocol is one json object per line:
+
+    request:  {"cmd": "start_force", "args": [2.5], "id": 7}
+    response: {"ok": true, "result": null, "id": 7}  or  {"ok": false, "error": "...", "id": 7}
+
+The "id" is optional, the response repeats the one of its request.
+
+Only the commands listed in Press_Service.commands are accepted. From the command line:
+
+    python -m Press_Controller.Service serve --dummy --record 0.5
+    python -m Press_Controller.Service send status
+    python -m Press_Controller.Service send start_force 2.5
+    python -m Press_Controller.Service send metrics
+"""
+# Import relevant packages
+import argparse
+import json
+import os
+import signal
+import socket
+import socketserver
+import threading
+import time
+
+import numpy as np
+
+from .Metrics import METRICS, Metrics_Logger, Metrics_Http_Server
+from .Startup import STARTUP
+
+DEFAULT_SOCKET = "/tmp/press_controller.sock"
+
+
+def to_json(value):
+    """
+    Convert the results of the service (numpy values and arrays, tuples) to something json can write
+    """
+    if isinstance(value, np.ndarray):
+        return [None if not np.isfinite(v) else float(v) for v in value.tolist()]
+    if isinstance(value, (tuple, list)):
+        return [to_json(v) for v in value]
+    if isinstance(value, dict):
+        return {k: to_json(v) for k, v in value.items()}
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    return value
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            line = line.strip()
+            if not line:
+                continue
+            response = self.server.owner.execute(line)
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+
+
+class _Unix_Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _Tcp_Server(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class Service_Server:
+    """
+    Class that gives access to a Press_Service through a Unix socket or a TCP port of localhost
+    """
+    def __init__(self, service, path=DEFAULT_SOCKET, port=None, mode=0o600):
+        """
+        Initialize the class with global variables
+        Args:
+            service: Press_Service
+            path: (str) file of the Unix socket, not used if port is given
+            port: (int) TCP port on 127.0.0.1 (e.g. where Unix sockets are not available)
+            mode: (int) permissions of the Unix socket, only its user can send commands by default (0o660 for its
+        group too)
+        """
+        self.service = service
+        self.path = path
+        self.port = port
+        self.mode = mode
+        self.server = None
+        self.thread = None
+
+    def execute(self, line):
+        """
+        Run one request
+        Args:
+            line: (bytes) json request
+        Returns:
+            dict with the response
+        """
+        request = {}
+        try:
+            request = json.loads(line)
+            command = request.get("cmd")
+            if command not in self.service.commands:
+                raise ValueError("Unknown command: " + str(command))
+            result = getattr(self.service, command)(*request.get("args", []), **request.get("kwargs", {}))
+            response = {"ok": True, "result": to_json(result)}
+        except Exception as e:
+            response = {"ok": False, "error": type(e).__name__ + ": " + str(e)}
+        if isinstance(request, dict) and "id" in request:
+            response["id"] = request["id"]
+        return response
+
+    def start(self):
+        """
+        Start answering the requests in a thread
+        Returns:
+        """
+        if self.port is not None:
+            self.server = _Tcp_Server(("127.0.0.1", self.port), _Handler)
+        else:
+            if os.path.exists(self.path):
+                if self.in_use(self.path):
+                    raise RuntimeError("Another service is listening on " + self.path)
+                os.remove(self.path)  # left by a service that did not close
+            umask = os.umask(0o777 & ~self.mode)  # no moment with the socket open to everybody
+            try:
+                self.server = _Unix_Server(self.path, _Handler)
+            finally:
+                os.umask(umask)
+            os.chmod(self.path, self.mode)
+        self.server.owner = self
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        print("Service listening on:", self.address())
+
+    @staticmethod
+    def in_use(path):
+        """
+        Check if a service answers on a Unix socket
+        Args:
+            path: (str) file of the socket
+        Returns:
+            bool
+        """
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        probe.settimeout(1.0)
+        try:
+            probe.connect(path)
+            return True
+        except OSError:
+            return False
+        finally:
+            probe.close()
+
+    def address(self):
+        if self.port is not None:
+            return "127.0.0.1:" + str(self.port)
+        return self.path
+
+    def stop(self):
+        if self.server is None:
+            return
+        self.server.shutdown()
+        self.server.server_close()
+        self.server = None
+        if self.port is None and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class Remote_Samples:
+    """
+    Class with the part of the Sample_Store the live plot needs, read from the service
+    """
+    def __init__(self, client):
+        self.client = client
+
+    @property
+    def total(self):
+        return self.client.call("samples_total")
+
+    def tail(self, n):
+        time_sec, force, setpoint = self.client.call("samples_tail", n)
+        return (np.asarray(time_sec, dtype=np.float64),
+                np.asarray([np.nan if v is None else v for v in force], dtype=np.float64),
+                np.asarray([np.nan if v is None else v for v in setpoint], dtype=np.float64))
+
+    def window(self, seconds=None, resolution=None):
+        bins = self.client.call("samples_window", seconds, resolution)
+        return {k: v if k == "resolution" else np.asarray([np.nan if x is None else x for x in v], dtype=np.float64)
+                for k, v in bins.items()}
+
+
+class Service_Client:
+    """
+    Class that sends commands to a running service. It can be used like the Press_Service by the Interface:
+    client.start_force(2.5), client.status()...
+    """
+    def __init__(self, path=DEFAULT_SOCKET, port=None, timeout=10.0, poll=0.1):
+        """
+        Initialize the class with global variables
+        Args:
+            path: (str) file of the Unix socket, not used if port is given
+            port: (int) TCP port on 127.0.0.1
+            timeout: (float) seconds to wait for a response
+            poll: (float) seconds between two readings sent to the listeners
+        """
+        self.path = path
+        self.port = port
+        self.timeout = timeout
+        self.poll = poll
+        self.lock = threading.Lock()
+        self.sock = None
+        self.file = None
+        self.request_id = 0
+        self.samples = Remote_Samples(self)
+        self.listeners = []
+        self.listen_thread = None
+
+    @property
+    def commands(self):
+        from .Press_Controller import Press_Service
+        return Press_Service.commands
+
+    def connect(self):
+        if self.port is not None:
+            sock = socket.create_connection(("127.0.0.1", self.port), timeout=self.timeout)
+        else:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.path)
+            except OSError:
+                sock.close()
+                raise
+        self.sock = sock
+        self.file = sock.makefile("rwb")
+
+    def disconnect(self):
+        """
+        Close the socket, the next call connects again
+        """
+        if self.sock is not None:
+            self.file.close()
+            self.sock.close()
+            self.sock = None
+
+    def close(self):
+        self.listeners = []
+        self.disconnect()
+
+    def call(self, command, *args, **kwargs):
+        """
+        Run a command in the service
+        Args:
+            command: (str) name of the command
+            *args: arguments of the command
+        Returns:
+            Result of the command
+        """
+        with self.lock:
+            self.request_id += 1
+            request = json.dumps({"cmd": command, "args": to_json(list(args)), "kwargs": to_json(kwargs),
+                                  "id": self.request_id})
+            if self.sock is None:
+                self.connect()
+            try:
+                self.file.write(request.encode() + b"\n")
+                self.file.flush()
+                line = self.file.readline()
+                if not line:
+                    raise ConnectionError("The service closed the connection")
+                response = json.loads(line)
+                if response.get("id") != self.request_id:
+                    raise ConnectionError("Response to another request: " + str(response.get("id")))
+            except Exception:
+                # A late response would be read by the next call: start again with a new connection
+                self.disconnect()
+                raise
+        if not response["ok"]:
+            raise RuntimeError(response["error"])
+        return response["result"]
+
+    def __getattr__(self, name):
+        if name.startswith("_") or name not in self.commands:
+            raise AttributeError(name)
+        return lambda *args, **kwargs: self.call(name, *args, **kwargs)
+
+    def add_listener(self, listener):
+        """
+        Receive the new readings of the service, like Press_Service.add_listener. The status is asked every poll
+        seconds
+        Args:
+            listener: function(topic, value)
+        Returns:
+        """
+        self.listeners.append(listener)
+        if self.listen_thread is None:
+            self.listen_thread = threading.Thread(target=self._listen_loop, daemon=True)
+            self.listen_thread.start()
+
+    def _listen_loop(self):
+        while self.listeners:
+            try:
+                status = self.call("status")
+            except (OSError, RuntimeError) as e:
+                print("Service not available:", e)
+                time.sleep(1.0)
+                continue
+            for listener in list(self.listeners):
+                listener("force", round(status["force"], 5))
+                listener("active", status["active"])
+                listener("faults", tuple(status["faults"]))
+            time.sleep(self.poll)
+        self.listen_thread = None
+
+
+def serve(args):
+    if args.port is None and Service_Server.in_use(args.socket):
+        # Checked before the hardware is set up: the running service keeps the pins and the HX711
+        raise SystemExit("Error: another service is listening on " + args.socket)
+    from .Press_Controller import Press_Service
+    STARTUP.mark("imports")
+
+    if args.stations:
+        # json list with the arguments of every Station, e.g. [{"name": "A", "Pulse_channel_out": 4, ...}, ...]
+        with open(args.stations) as f:
+            stations = json.load(f)
+        for station in stations:
+            station.setdefault("is_Dummy", args.dummy)
+            station.setdefault("calibration", args.calibration)
+            station.setdefault("pulse_backend", args.pulse_backend)
+        service = Press_Service(stations=stations, runtime=args.runtime, catalogue=not args.no_catalogue)
+    else:
+        service = Press_Service(is_Dummy=args.dummy, calibration=args.calibration, pulse_backend=args.pulse_backend,
+                                runtime=args.runtime, catalogue=not args.no_catalogue)
+    STARTUP.mark("hardware")
+    service.set_format(args.format)
+    if args.dir:
+        service.set_folder(args.dir)
+    if args.operator:
+        service.set_operator(args.operator)
+    server = Service_Server(service, path=args.socket, port=args.port, mode=args.socket_mode)
+    server.start()
+    exporters = []
+    if args.metrics or args.metrics_log or args.metrics_port:
+        service.set_metrics(True)
+    if args.metrics_log:
+        exporters.append(Metrics_Logger(METRICS, args.metrics_log, period=args.metrics_period))
+    if args.metrics_port:
+        exporters.append(Metrics_Http_Server(METRICS, port=args.metrics_port))
+    for exporter in exporters:
+        exporter.start()
+    service.setup_init()
+    STARTUP.mark("ready")
+    print(STARTUP.report())
+    if args.record:
+        service.start_record(args.record)
+    if args.program:
+        service.start_program(args.program)
+    elif args.force is not None:
+        service.start_force(args.force)
+
+    finished = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: finished.set())
+    signal.signal(signal.SIGTERM, lambda *_: finished.set())
+    while not finished.wait(0.5):
+        if args.program and args.exit_after_program and service.station().profile_executor is None:
+            break
+    print("Closing the service")
+    server.stop()
+    for exporter in exporters:
+        exporter.stop()
+    service.shutdown()  # the recording being streamed is finished here
+
+
+def send(args):
+    client = Service_Client(path=args.socket, port=args.port)
+    values = []
+    for value in args.args:
+        try:
+            values.append(json.loads(value))
+        except ValueError:
+            values.append(value)  # plain strings such as file names
+    try:
+        if args.station is not None:
+            result = client.call(args.command, *values, station=args.station)
+        else:
+            result = client.call(args.command, *values)
+    except (OSError, RuntimeError) as e:
+        raise SystemExit("Error: " + str(e))
+    finally:
+        client.close()
+    print(json.dumps(result, indent=2))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless service of the press controller")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="Unix socket of the service")
+    parser.add_argument("--port", type=int, default=None, help="use a TCP port on 127.0.0.1 instead of a socket")
+    commands = parser.add_subparsers(dest="action", required=True)
+
+    serve_parser = commands.add_parser("serve", help="run the acquisition, control and recording")
+    serve_parser.add_argument("--dummy", action="store_true", help="simulated hardware")
+    serve_parser.add_argument("--socket-mode", type=lambda value: int(value, 8), default=0o600,
+                              help="permissions of the Unix socket in octal, 660 to let its group send commands")
+    serve_parser.add_argument("--calibration", default=None, help="calibration file of the load cell")
+    serve_parser.add_argument("--pulse-backend", default=None, choices=("rpi", "pigpio"),
+                              help="generator of the pulses, RPi.GPIO software PWM by default")
+    serve_parser.add_argument("--stations", default=None, help="json file with the pins of several stations")
+    serve_parser.add_argument("--runtime", default="threads", choices=("threads", "asyncio"),
+                              help="run the periodic work in threads or in an asyncio event loop")
+    serve_parser.add_argument("--dir", default=None, help="folder of the recordings")
+    serve_parser.add_argument("--format", default="csv", choices=("csv", "binary"))
+    serve_parser.add_argument("--operator", default=None, help="operator saved with the runs in the catalogue")
+    serve_parser.add_argument("--no-catalogue", action="store_true",
+                              help="do not add the recordings to the run catalogue of the folder")
+    serve_parser.add_argument("--record", type=float, default=None, help="start recording every N seconds")
+    serve_parser.add_argument("--force", type=float, default=None, help="start the force control (kN)")
+    serve_parser.add_argument("--program", default=None, help="run a test program (json)")
+    serve_parser.add_argument("--exit-after-program", action="store_true",
+                              help="close the service when the test program finishes")
+    serve_parser.add_argument("--metrics", action="store_true", help="collect the metrics of the hot paths")
+    serve_parser.add_argument("--metrics-log", default=None, help="append the metrics to this file (json lines)")
+    serve_parser.add_argument("--metrics-period", type=float, default=10.0, help="seconds between two logs")
+    serve_parser.add_argument("--metrics-port", type=int, default=None,
+                              help="serve the metrics on http://127.0.0.1:PORT/metrics")
+
+    send_parser = commands.add_parser("send", help="send a command to a running service")
+    send_parser.add_argument("command")
+    send_parser.add_argument("--station", default=None, help="name of the station, the first one by default")
+    send_parser.add_argument("args", nargs="*", help="arguments, parsed as json when possible")
+
+    args = parser.parse_args(argv)
+    if args.action == "serve":
+        serve(args)
+    else:
+        send(args)
+
+
+if __name__ == "__main__":
+    main()
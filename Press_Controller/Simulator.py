@@ -0,0 +1,296 @@
+"""
+Simulation of the press to test the control, the recording and the plots without the Raspberry Pi.
+
+The pulses of the drive move a pump that pushes oil into the cylinder: every pulse moves the piston mm_per_pulse
+(pulses up increase the force, the direction pin on moves the press down). The piston follows the pump with a
+first order lag of the oil column, oil leaks back in proportion to the force, and the force is the stiffness of
+the specimen and the frame times the compression. The load cell is a Simulated_HX711 reading that force.
+
+Press_Simulator gives the simulated parts to a Station (real time, used by the Dummy mode). Press_Simulation runs
+the force controller in a single thread with a Virtual_Clock, faster than real time:
+
+    simulation = Press_Simulation()
+    result = simulation.run(setpoint=5, duration=20)
+    print(simulation.controller.report(), simulation.speedup)
+"""
+# Import relevant packages
+import math
+import threading
+import time
+
+import numpy as np
+
+from .Acquisition import Simulated_HX711
+from .Pulse import Simulated_Pulse
+
+
+class Virtual_Clock:
+    """
+    Clock of a simulation. Without speed the time only advances when someone sleeps, so a simulation runs as fast
+    as the computer can; with speed it follows the real time multiplied by speed
+    """
+    def __init__(self, start=0.0, speed=None):
+        """
+        Initialize the class with global variables
+        Args:
+            start: (float) initial time in seconds
+            speed: (float) times faster than the real time, None for a time that only advances with sleep()
+        """
+        self.speed = speed
+        self._time = start
+        self._real_start = time.perf_counter()
+        self.lock = threading.Lock()
+
+    def now(self):
+        if self.speed is None:
+            return self._time
+        return self._time + (time.perf_counter() - self._real_start) * self.speed
+
+    def sleep(self, seconds):
+        if seconds <= 0:
+            return
+        if self.speed is None:
+            with self.lock:
+                self._time += seconds
+        else:
+            time.sleep(seconds / self.speed)
+
+    __call__ = now
+
+
+class Hydraulic_Press_Model:
+    """
+    Class with the physics of the press: pump, oil column, cylinder and specimen
+    """
+    def __init__(self, mm_per_pulse=0.0005, stiffness=2.0, gap=0.0, initial_force=1.0, lag=0.05, leak=0.002,
+                 stroke=100.0, counts_per_kN=2**23 / 50, tare_counts=0.0):
+        """
+        Initialize the class with global variables
+        Args:
+            mm_per_pulse: (float) movement of the piston for every pulse of the drive
+            stiffness: (float) kN/mm of the specimen and the frame
+            gap: (float) mm the piston moves before it touches the specimen
+            initial_force: (float) kN of the preload when there is no gap
+            lag: (float) time constant in seconds of the oil column, the piston follows the pump with this delay
+            leak: (float) mm/s the piston goes back per kN of force
+            stroke: (float) mm of travel of the cylinder
+            counts_per_kN: (float) raw counts of the load cell per kN (the inverse of the gain of the calibration)
+            tare_counts: (float) raw counts of the load cell without force
+        """
+        self.mm_per_pulse = mm_per_pulse
+        self.stiffness = stiffness
+        self.gap = gap
+        self.lag = lag
+        self.leak = leak
+        self.stroke = stroke
+        self.counts_per_kN = counts_per_kN
+        self.tare_counts = tare_counts
+        self.contact = stroke / 2  # position of the specimen
+        start = self.contact - gap if gap > 0 else self.contact + initial_force / stiffness
+        self.initial_position = start
+        self.pulse = None
+        self.reset()
+
+    def reset(self):
+        self.position = self.initial_position  # mm, up is positive
+        self.target = self.initial_position  # where the pump has pushed the piston
+        self.leaked = 0.0
+        self.last_time = None
+        self.last_pulses = None
+
+    def attach(self, pulse):
+        """
+        Drive the model with the pulses of a Simulated_Pulse
+        Args:
+            pulse: Simulated_Pulse
+        Returns:
+        """
+        self.pulse = pulse
+        self.last_pulses = None
+
+    @property
+    def force(self):
+        """
+        Force in kN on the specimen
+        """
+        return self.stiffness * max(0.0, self.position - self.contact)
+
+    def update(self, t):
+        """
+        Advance the model until time t
+        Args:
+            t: (float) time of the clock
+        Returns:
+            Force in kN
+        """
+        if self.last_time is None:
+            self.last_time = t
+        dt = t - self.last_time
+        if dt <= 0:
+            return self.force
+        pulses = self.pulse.position(t) if self.pulse is not None else 0.0
+        if self.last_pulses is None:
+            self.last_pulses = pulses
+        self.target += (pulses - self.last_pulses) * self.mm_per_pulse - self.leak * self.force * dt
+        self.last_pulses = pulses
+        alpha = 1.0 - math.exp(-dt / self.lag) if self.lag > 0 else 1.0
+        self.position += (self.target - self.position) * alpha
+        # End of the stroke
+        self.position = min(max(self.position, 0.0), self.stroke)
+        self.target = min(max(self.target, 0.0), self.stroke)
+        self.last_time = t
+        return self.force
+
+    def raw(self, t):
+        """
+        Raw value of the load cell at time t (value function of the Simulated_HX711)
+        """
+        return self.tare_counts + self.update(t) * self.counts_per_kN
+
+
+class Press_Simulator:
+    """
+    Class that builds the simulated sensor and pulses of a station around one Hydraulic_Press_Model
+    """
+    def __init__(self, model=None, clock=time.perf_counter, sleep=time.sleep, rate=80, noise=2000, jitter=0.0,
+                 fail_rate=0.0, seed=None):
+        """
+        Initialize the class with global variables
+        Args:
+            model: Hydraulic_Press_Model, the default one if None
+            clock: function that returns the current time in seconds
+            sleep: function that sleeps a number of seconds
+            rate: (float) readings per second of the HX711
+            noise: (float) standard deviation of the noise in raw counts
+            jitter: (float) standard deviation of the time of the readings in seconds
+            fail_rate: (float) probability of a failed reading
+            seed: (int) seed of the random generator, for reproducible runs
+        """
+        self.model = model if model is not None else Hydraulic_Press_Model()
+        self.clock = clock
+        self.sleep = sleep
+        self.hx_options = {"rate": rate, "noise": noise, "jitter": jitter, "fail_rate": fail_rate, "seed": seed}
+        self.hx = None
+        self.pulse = None
+        self.force_offset = 0.0  # kN added to the reading of the load cell (fault injection)
+
+    def raw(self, t):
+        return self.model.raw(t) + self.force_offset * self.model.counts_per_kN
+
+    def load_cell(self):
+        """
+        Returns:
+            Simulated_HX711 that reads the force of the model
+        """
+        if self.hx is None:
+            self.hx = Simulated_HX711(value=self.raw, clock=self.clock, sleep=self.sleep, **self.hx_options)
+        return self.hx
+
+    def pulses(self, channel, dir_pin):
+        """
+        Args:
+            channel: (int) pin number of the pulses, only informative
+            dir_pin: object with state() of the direction (e.g. Dummy)
+        Returns:
+            Simulated_Pulse that moves the model
+        """
+        if self.pulse is None:
+            self.pulse = Simulated_Pulse(channel, dir_pin=dir_pin, clock=self.clock)
+            self.model.attach(self.pulse)
+        return self.pulse
+
+
+class Press_Simulation:
+    """
+    Class that runs the force control of a simulated press in one thread with a Virtual_Clock: the sensor is read,
+    the controller steps at its rate and the time jumps to the next reading, so minutes of test take a fraction of
+    a second
+    """
+    def __init__(self, model=None, pid=None, rate=40.0, deviation=0.3, sensor_rate=80, noise=2000, jitter=0.0,
+                 fail_rate=0.0, filter=None, seed=0):
+        """
+        Initialize the class with global variables
+        Args:
+            model: Hydraulic_Press_Model, the default one if None
+            pid: PID of the controller, the default one if None
+            rate: (float) control steps per second
+            deviation: (float) kN around the setpoint where the pulses are stopped
+            sensor_rate: (float) readings per second of the HX711
+            noise: (float) standard deviation of the noise in raw counts
+            jitter: (float) standard deviation of the time of the readings in seconds
+            fail_rate: (float) probability of a failed reading
+            filter: Filter of the readings, the one of Balance_Sensor by default
+            seed: (int) seed of the random generator
+        """
+        from .Press_Controller import Balance_Sensor, Dummy
+        from .Control import Force_Controller
+
+        self.clock = Virtual_Clock()
+        self.simulator = Press_Simulator(model, clock=self.clock.now, sleep=self.clock.sleep, rate=sensor_rate,
+                                         noise=noise, jitter=jitter, fail_rate=fail_rate, seed=seed)
+        self.model = self.simulator.model
+        self.dir = Dummy("dir")
+        self.pulse = Dummy("pulse", backend=self.simulator.pulses("pulse", self.dir))
+        self.balance = Balance_Sensor(hx=self.simulator.load_cell(), filter=filter, clock=self.clock.now,
+                                      sleep=self.clock.sleep, start=False)
+        self.controller = Force_Controller(self.balance, self.pulse, self.dir, pid=pid, rate=rate,
+                                           deviation=deviation, clock=self.clock.now, sleep=self.clock.sleep)
+        self.wall_time = 0.0
+        self.simulated_time = 0.0
+
+    @property
+    def speedup(self):
+        """
+        Simulated seconds per second of computation of the last run
+        """
+        if self.wall_time == 0:
+            return None
+        return self.simulated_time / self.wall_time
+
+    def run(self, setpoint=None, duration=10.0, profile=None):
+        """
+        Run the force control
+        Args:
+            setpoint: (float) constant setpoint in kN
+            duration: (float) simulated seconds, the duration of the profile if a profile is given
+            profile: Profile to follow instead of a constant setpoint
+        Returns:
+            dict of numpy arrays: time, force (real), measured (load cell), setpoint, frequency (signed output)
+        """
+        from .Profile import Profile_Executor
+
+        executor = None
+        if profile is not None:
+            executor = Profile_Executor(profile, start_force=self.model.force, dt=1 / self.controller.rate,
+                                        clock=self.clock.now)
+            duration = executor.duration
+        self.controller.reset()
+        start = self.clock.now()
+        end = start + duration
+        period = 1 / self.controller.rate
+        next_step = start
+        rows = []
+        wall = time.perf_counter()
+        while self.clock.now() < end:
+            self.balance.engine.read_block()  # sleeps until the next reading
+            now = self.clock.now()
+            if now < next_step:
+                continue
+            next_step += period * max(1, math.floor((now - next_step) / period) + 1)
+            target = setpoint
+            if executor is not None:
+                target = executor.setpoint()
+                if target is None:
+                    break
+            output = self.controller.poll(target)
+            rows.append((now - start, self.model.force, self.balance.ave, target,
+                         self.controller.pid.output if output is not None else np.nan))
+        self.controller.hold()
+        self.wall_time = time.perf_counter() - wall
+        self.simulated_time = self.clock.now() - start
+        columns = np.array(rows, dtype=np.float64).reshape(-1, 5)
+        return {"time": columns[:, 0],
+                "force": columns[:, 1],
+                "measured": columns[:, 2],
+                "setpoint": columns[:, 3],
+                "frequency": columns[:, 4]}
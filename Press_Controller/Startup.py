@@ -0,0 +1,66 @@
+"""
+Timing of the start of the program. The moments it reaches (modules imported, window shown, hardware ready, first
+reading...) are kept with the time since the timer was created, so the report shows what the time to interactive is
+spent on. The global STARTUP is created by the first import of this module, run.py imports it before anything else.
+"""
+# Import relevant packages
+import threading
+import time
+
+
+class Startup_Timer:
+    """
+    Class that keeps the moments of the start of the program
+    """
+    def __init__(self, clock=time.perf_counter):
+        """
+        Initialize the class with global variables
+        Args:
+            clock: function that returns the current time in seconds
+        """
+        self.clock = clock
+        self.origin = clock()
+        self.lock = threading.Lock()
+        self.marks = {}  # name -> seconds since the origin
+
+    def mark(self, name):
+        """
+        Keep the moment a step of the start is reached, only the first time
+        Args:
+            name: (str) name of the step, e.g. "imports", "window", "hardware", "interactive"
+        Returns:
+            (float) seconds since the origin
+        """
+        elapsed = self.clock() - self.origin
+        with self.lock:
+            return self.marks.setdefault(name, elapsed)
+
+    def elapsed(self, name):
+        """
+        Seconds from the origin to a step
+        Args:
+            name: (str) name of the step
+        Returns:
+            float, None if it has not been reached
+        """
+        return self.marks.get(name)
+
+    def as_dict(self):
+        with self.lock:
+            return dict(self.marks)
+
+    def report(self):
+        """
+        Text with one line per step: time since the origin and time since the previous step
+        Returns:
+            str
+        """
+        lines = ["Startup (seconds)"]
+        previous = 0.0
+        for name, elapsed in sorted(self.as_dict().items(), key=lambda item: item[1]):
+            lines.append("  {:<14} {:8.3f}   +{:.3f}".format(name, elapsed, elapsed - previous))
+            previous = elapsed
+        return "\n".join(lines)
+
+
+STARTUP = Startup_Timer()
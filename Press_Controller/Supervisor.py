@@ -0,0 +1,228 @@
+"""
+Safety supervisor of the press. A thread of its own, independent of the workers of the service (pausing or
+blocking them does not stop it), checks every station at a fixed short period and cuts the pulses and the enable
+of the drive when:
+
+    overload        the force is over max_force (kN, absolute value)
+    force_rate      the force changes faster than max_rate (kN/s) over the last rate_window seconds
+    sensor_stale    the press is moving and the sensor gave no reading for sensor_timeout seconds
+    control_stall   the force control is on and it did no step for heartbeat_timeout seconds
+
+The limit switches and the emergency stop are also read at every check, so a trip is not lost if their edge
+interrupt was missed.
+
+A trip is latched in the faults of the station until reset_faults(). The time from the moment the condition
+became true (time of the reading, or end of the timeout) to the pulses being cut is kept as the latency of the trip
+(metric trip_latency).
+"""
+# Import relevant packages
+import os
+import time
+
+from .Metrics import METRICS
+from .Workers import Worker
+
+SUPERVISOR_FAULTS = ("overload", "force_rate", "sensor_stale", "control_stall")
+
+
+class Safety_Supervisor:
+    """
+    Class with the thread that watches the force, the sensor and the force control of the stations of a
+    Press_Service
+    """
+    def __init__(self, service, period=0.005, budget=0.02, max_force=None, max_rate=None, rate_window=0.1,
+                 sensor_timeout=0.25, heartbeat_timeout=0.5, priority=50, clock=time.perf_counter):
+        """
+        Initialize the class with global variables
+        Args:
+            service: Press_Service
+            period: (float) seconds between two checks
+            budget: (float) longest allowed time between two checks, a longer one is counted as an overrun
+            max_force: (float) highest absolute force in kN, None for no limit
+            max_rate: (float) highest rate of change of the force in kN/s, None for no limit
+            rate_window: (float) seconds of readings the rate of change is measured over
+            sensor_timeout: (float) seconds without readings while the press moves before tripping
+            heartbeat_timeout: (float) seconds without control steps while the force control is on before tripping
+            priority: (int) SCHED_FIFO priority of the thread (needs root or CAP_SYS_NICE), None to keep the
+        normal one
+            clock: function that returns the current time, the one of the sensor readings
+        """
+        self.service = service
+        self.period = period
+        self.budget = budget
+        self.defaults = {"max_force": max_force,
+                         "max_rate": max_rate,
+                         "rate_window": rate_window,
+                         "sensor_timeout": sensor_timeout,
+                         "heartbeat_timeout": heartbeat_timeout}
+        self.limits = {}  # station name -> limits that differ from the defaults
+        self.priority = priority
+        self.clock = clock
+        self.worker = Worker("supervisor", self.check, period=period, clock=clock, spin=0.0)
+        self.realtime = None  # True if the thread got the real time priority
+        self.trips = []  # one dict per trip: station, fault, value, latency
+        self.checks = 0
+        self.overruns = 0
+        self.last_check = None
+        self._heartbeat = {}  # station name -> (control steps, time they last changed)
+
+    def start(self):
+        self.last_check = None
+        self.worker.start()
+        print("Safety supervisor started, period:", self.period, "sec")
+
+    def stop(self, timeout=1.0):
+        self.worker.stop(timeout)
+
+    def set_limits(self, station=None, **limits):
+        """
+        Change the limits of one station or the defaults of all of them
+        Args:
+            station: (str) name of the station, None for the defaults
+            **limits: max_force, max_rate, rate_window, sensor_timeout, heartbeat_timeout (None disables a check)
+        Returns:
+            The limits now used
+        """
+        unknown = set(limits) - set(self.defaults)
+        if unknown:
+            raise ValueError("Unknown limits: " + ", ".join(sorted(unknown)))
+        if station is None:
+            self.defaults.update(limits)
+            return dict(self.defaults)
+        self.service.station(station)  # the station has to exist
+        self.limits.setdefault(station, {}).update(limits)
+        return self.station_limits(station)
+
+    def station_limits(self, name):
+        limits = dict(self.defaults)
+        limits.update(self.limits.get(name, {}))
+        return limits
+
+    def status(self):
+        """
+        State of the supervisor
+        Returns:
+            dict
+        """
+        return {"state": self.worker.state,
+                "realtime": self.realtime,
+                "period": self.period,
+                "budget": self.budget,
+                "checks": self.checks,
+                "overruns": self.overruns,
+                "limits": {name: self.station_limits(name) for name in self.service.stations_by_name},
+                "trips": list(self.trips[-20:])}
+
+    def _raise_priority(self):
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(self.priority))
+            self.realtime = True
+        except (AttributeError, OSError):
+            self.realtime = False
+            print("Safety supervisor without real time priority (it needs root or CAP_SYS_NICE)")
+
+    def check(self):
+        """
+        One check of every station (the task of the thread)
+        Returns:
+        """
+        if self.realtime is None and self.priority is not None:
+            self._raise_priority()
+        now = self.clock()
+        if self.last_check is not None and now - self.last_check > self.budget:
+            self.overruns += 1
+            METRICS.count("supervisor_overruns")
+        self.last_check = now
+        self.checks += 1
+        for station in list(self.service.stations_by_name.values()):
+            self.check_inputs(station)
+            found = self.check_station(station, now)
+            if found is not None:
+                self.trip(station, *found)
+
+    def check_inputs(self, station):
+        """
+        Read the limit switches and the emergency stop, in case their edge interrupt was missed
+        Args:
+            station: Station
+        Returns:
+        """
+        for name, pin in station.safety_inputs.items():
+            state = pin.state()
+            if bool(state) != (name in station.faults) and (state or name != "estop"):
+                METRICS.count("missed_input_edges")
+                print(station.name, name, "changed without an edge")
+                station.input_changed(name, state)
+
+    def check_station(self, station, now):
+        """
+        Look for a trip condition in a station
+        Args:
+            station: Station
+            now: (float) time of the check
+        Returns:
+            (fault, value, onset) with the time the condition became true, None if everything is fine
+        """
+        if any(fault in station.faults for fault in SUPERVISOR_FAULTS):
+            return None  # already stopped, until the faults are reset
+        limits = self.station_limits(station.name)
+        pulses = station.pulse.pulses()
+        moving = station.controlling or pulses.running or pulses.busy()
+        latest = station.balance.buffer.latest()
+
+        timeout = limits["sensor_timeout"]
+        if moving and timeout is not None:
+            if latest is None:
+                return "sensor_stale", None, now
+            if now - latest[0] > timeout:
+                return "sensor_stale", now - latest[0], latest[0] + timeout
+        if latest is None:
+            return None
+
+        max_force = limits["max_force"]
+        if max_force is not None:
+            force = float(station.balance.calibration.convert(latest[1]))
+            if abs(force) > max_force:
+                return "overload", force, latest[0]
+
+        max_rate = limits["max_rate"]
+        if max_rate is not None:
+            times, forces = station.balance.force_window(32)
+            keep = times >= times[-1] - limits["rate_window"]
+            times, forces = times[keep], forces[keep]
+            if len(times) > 1 and times[-1] > times[0]:
+                rate = (forces[-1] - forces[0]) / (times[-1] - times[0])
+                if abs(rate) > max_rate:
+                    return "force_rate", float(rate), float(times[-1])
+
+        timeout = limits["heartbeat_timeout"]
+        if not station.controlling or timeout is None:
+            self._heartbeat.pop(station.name, None)
+            return None
+        steps = station.controller.steps
+        beat = self._heartbeat.get(station.name)
+        if beat is None or beat[0] != steps:
+            self._heartbeat[station.name] = (steps, now)
+        elif now - beat[1] > timeout:
+            return "control_stall", now - beat[1], beat[1] + timeout
+        return None
+
+    def trip(self, station, fault, value, onset):
+        """
+        Cut the pulses and the enable of the station and keep the fault
+        Args:
+            station: Station
+            fault: (str) name of the condition
+            value: measured value (force, rate, seconds)
+            onset: (float) time the condition became true
+        Returns:
+        """
+        station.trip(fault, disable=True)
+        latency = float(self.clock() - onset)
+        self._heartbeat.pop(station.name, None)
+        METRICS.observe("trip_latency", latency)
+        METRICS.count("trips")
+        self.trips.append({"station": station.name, "fault": fault, "value": value, "latency": latency,
+                           "epoch": time.time()})
+        print(station.name, "safety supervisor:", fault, "value:", value, "latency: {:.6f} s".format(latency))
+        station.notify("faults", tuple(station.fault_list()))
@@ -0,0 +1,219 @@
+# Import relevant packages
+import threading
+import time
+
+from .Metrics import METRICS
+from .Scheduler import Fixed_Rate_Scheduler
+
+
+class Worker:
+    """
+    Class with a thread that runs a task periodically, every time it is triggered, or continuously when the task
+    blocks by itself (e.g. reading a sensor). Pausing does not end the thread: it waits on a condition without
+    using the CPU until it is resumed or stopped, and the waits between two runs are woken up at once by pause()
+    and stop()
+    """
+    def __init__(self, name, task, period=None, triggered=False, clock=time.perf_counter, spin=0.0005):
+        """
+        Initialize the class with global variables
+        Args:
+            name: (str) name of the worker, used in the messages and in the metrics
+            task: function without arguments, one run of the work
+            period: (float) seconds between two runs at a fixed rate, None to run without waiting
+            triggered: (bool) run the task only when trigger() is called (and at every period if there is one)
+            clock: function that returns the current time in seconds
+            spin: (float) busy wait at the end of every period, see Fixed_Rate_Scheduler
+        """
+        self.name = name
+        self.task = task
+        self.period = period
+        self.triggered = triggered
+        self.clock = clock
+        self.spin = spin
+        self.scheduler = None
+        self.state = 'stopped'  # status: 'stopped', 'running', 'paused'
+        self.busy = False  # the task is running
+        self.runs = 0
+        self.errors = 0
+        self.thread = None
+        self._condition = threading.Condition()
+        self._pending = False  # trigger() was called
+
+    def start(self):
+        """
+        Start the thread, or resume it if it is paused
+        Returns:
+        """
+        with self._condition:
+            if self.state == 'running':
+                return
+            if self.period is not None:
+                # A new schedule, the periods missed while paused are not counted
+                self.scheduler = Fixed_Rate_Scheduler(self.period, spin=self.spin, clock=self.clock,
+                                                      sleep=self.sleep)
+            self.state = 'running'
+            self._condition.notify_all()
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._thread_loop, name=self.name, daemon=True)
+                self.thread.start()
+
+    resume = start
+
+    def pause(self, wait=True, timeout=None):
+        """
+        Stop running the task, the thread is kept waiting
+        Args:
+            wait: (bool) return only when the task that is running has finished
+            timeout: (float) seconds to wait for the task, forever if None
+        Returns:
+            True if no task is running any more, False if it did not finish in time (it is left running)
+        """
+        with self._condition:
+            if self.state == 'running':
+                self.state = 'paused'
+                self._condition.notify_all()
+            if not wait or threading.current_thread() is self.thread:
+                return not self.busy
+            return self._condition.wait_for(lambda: not self.busy, timeout)
+
+    def stop(self, timeout=None, wait=True):
+        """
+        End the thread
+        Args:
+            timeout: (float) seconds to wait for the task that is running, forever if None
+            wait: (bool) wait for the thread to end
+        Returns:
+            True if the thread ended
+        """
+        with self._condition:
+            self.state = 'stopped'
+            self._condition.notify_all()
+        thread = self.thread
+        if not wait:
+            return thread is None or not thread.is_alive()
+        if thread is None or thread is threading.current_thread():
+            return True
+        thread.join(timeout)
+        return not thread.is_alive()
+
+    def trigger(self):
+        """
+        Run the task as soon as possible (without waiting for the end of the period)
+        Returns:
+        """
+        with self._condition:
+            self._pending = True
+            self._condition.notify_all()
+
+    def sleep(self, seconds):
+        """
+        Sleep that returns at once when the worker is paused, stopped or triggered. It is given to the schedulers
+        that pace the task so they can be interrupted
+        Args:
+            seconds: (float) seconds to sleep
+        Returns:
+        """
+        with self._condition:
+            self._condition.wait_for(self._interrupted, seconds)
+
+    def stopping(self):
+        """
+        True when the worker was paused or stopped, so a task that waits by itself can give up its wait
+        """
+        return self.state != 'running'
+
+    def _interrupted(self):
+        return self.state != 'running' or self._pending
+
+    def _wait_turn(self):
+        # Block until the task has to run. Returns False when the worker is stopped
+        with self._condition:
+            while True:
+                if self.state == 'stopped':
+                    return False
+                if self.state == 'running' and (self._pending or not self.triggered or self.period is not None):
+                    return True
+                self._condition.wait()
+
+    def _thread_loop(self):
+        while self._wait_turn():
+            if self.scheduler is not None and not self._pending:
+                deadline = self.scheduler.wait(cancelled=self._interrupted)
+                if deadline is None:
+                    continue
+                if METRICS.enabled:
+                    METRICS.observe("late_" + self.name, self.scheduler.clock() - deadline)
+            with self._condition:
+                if self.state != 'running':
+                    continue
+                self._pending = False
+                self.busy = True
+            m0 = METRICS.start()
+            try:
+                self.task()
+                self.runs += 1
+            except Exception as e:
+                self.errors += 1
+                METRICS.count("errors_" + self.name)
+                print(self.name, "failed:", e)
+            finally:
+                METRICS.stop("task_" + self.name, m0)
+                with self._condition:
+                    self.busy = False
+                    self._condition.notify_all()
+
+
+class Worker_Scheduler:
+    """
+    Class with the named workers of a program, so they can be started, paused and stopped together
+    """
+    def __init__(self):
+        self.workers = {}
+
+    def add(self, name, task, period=None, triggered=False, **kwargs):
+        """
+        Create a worker (it is not started)
+        Args:
+            name: (str) name of the worker
+            task: function without arguments
+            period: (float) seconds between two runs, None to run without waiting
+            triggered: (bool) run only when triggered
+            **kwargs: other arguments of Worker
+        Returns:
+            Worker
+        """
+        if name in self.workers:
+            raise ValueError("There is already a worker called: " + name)
+        worker = Worker(name, task, period=period, triggered=triggered, **kwargs)
+        self.workers[name] = worker
+        return worker
+
+    def get(self, name):
+        return self.workers[name]
+
+    def states(self):
+        return {name: worker.state for name, worker in self.workers.items()}
+
+    def pause_all(self, timeout=None):
+        """
+        Pause every worker
+        Args:
+            timeout: (float) seconds to wait for the task of every worker, forever if None
+        Returns:
+            Names of the workers whose task did not finish in time
+        """
+        for worker in self.workers.values():
+            worker.pause(wait=False)
+        return [name for name, worker in self.workers.items() if not worker.pause(timeout=timeout)]
+
+    def stop_all(self, timeout=2.0):
+        """
+        Stop every worker
+        Args:
+            timeout: (float) seconds to wait for every thread
+        Returns:
+            Names of the workers whose thread did not end in time
+        """
+        for worker in self.workers.values():
+            worker.stop(wait=False)
+        return [name for name, worker in self.workers.items() if not worker.stop(timeout)]
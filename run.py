@@ -1,5 +1,13 @@
 #!/usr/bin/env python3
+import sys
 
+from Press_Controller.Startup import STARTUP  # first, the startup times are measured from here
 import Press_Controller.Press_Controller as ps
-start = ps.Interface()
+STARTUP.mark("imports")
+if len(sys.argv) > 1:
+    # Connect the interface to a service already running (see run_service.py), e.g. run.py /tmp/press_controller.sock
+    from Press_Controller.Service import Service_Client
+    start = ps.Interface(service=Service_Client(sys.argv[1]))
+else:
+    start = ps.Interface()
 start.setup()
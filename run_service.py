@@ -0,0 +1,4 @@
+#!/usr/bin/env python3
+# Run the press without the GUI, e.g.: run_service.py serve --dummy --record 1
+import Press_Controller.Service as service
+service.main()
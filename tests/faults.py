@@ -0,0 +1,31 @@
+# Faults given to a dummy Station to test the Safety_Supervisor: a jump of the force, a sensor that stops giving
+# readings and a force control that hangs
+import threading
+
+
+class Fault_Injector:
+    def __init__(self, station):
+        if station.simulator is None:
+            raise ValueError("Faults can only be injected in a dummy station")
+        self.station = station
+        self.simulator = station.simulator
+        self.released = threading.Event()
+
+    def force_jump(self, force):
+        # The reading of the load cell jumps by force kN (overload, or a fast change of the force)
+        self.simulator.force_offset = force
+
+    def freeze_sensor(self):
+        # The load cell stops giving readings
+        self.simulator.load_cell().stalled = True
+
+    def stall_control(self):
+        # The next step of the force control hangs until clear() is called
+        self.released.clear()
+        self.station.control_step = lambda: self.released.wait()
+
+    def clear(self):
+        self.simulator.force_offset = 0.0
+        self.simulator.load_cell().stalled = False
+        self.station.__dict__.pop("control_step", None)
+        self.released.set()
@@ -0,0 +1,37 @@
+# Reading loop of the load cell
+import pytest
+
+from Press_Controller.Acquisition import Acquisition_Engine
+
+
+class Failing_HX711:
+    def get_raw_data(self, readings):
+        raise OSError("no data")
+
+
+def test_failed_read_waits_with_the_given_sleep():
+    slept = []
+    engine = Acquisition_Engine(Failing_HX711(), clock=lambda: 0.0, sleep=slept.append)
+    engine.read_block()
+    engine.read_block()
+    assert engine.errors == 2
+    assert slept == [0.1, 0.1]
+
+
+class Not_Ready_HX711:
+    def __init__(self, result):
+        self.result = result
+
+    def get_raw_data(self, readings):
+        return self.result
+
+
+@pytest.mark.parametrize("result", [False, None, [False, False, False]])
+def test_sensor_that_gives_no_readings_does_not_spin(result):
+    slept = []
+    engine = Acquisition_Engine(Not_Ready_HX711(result), block=3, clock=lambda: 0.0, sleep=slept.append)
+    engine.read_block()
+    engine.read_block()
+    assert engine.errors > 0
+    assert slept == [0.1, 0.1]
+    assert engine.buffer.count == 0
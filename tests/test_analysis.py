@@ -0,0 +1,177 @@
+# Summaries of the recordings: cycles, hold and creep, csv with repeated headers and the cache of a folder
+import os
+import time
+
+import numpy as np
+import pytest
+
+from Press_Controller import Analysis
+from Press_Controller.Analysis import CACHE_NAME, analyse_folder, cycles, load_recording, summarize
+
+HEADER = "Date,Time_sec,Force_kN,Setpoint_kN\n"
+START = 1.6e9  # a whole second, the resolution of the dates of the csv
+
+
+def write_csv(path, time_sec, force, setpoint=None, repeat_header_at=()):
+    with open(path, "w") as f:
+        f.write(HEADER)
+        for i, (t, v) in enumerate(zip(time_sec, force)):
+            if i in repeat_header_at:
+                f.write(HEADER)
+            s = "" if setpoint is None else repr(float(setpoint[i]))
+            f.write("{},{!r},{!r},{}\n".format(time.ctime(START + t), float(t), float(v), s))
+
+
+def triangle(periods=5, step=0.01):
+    # Load cycles from 0 to 10 kN, every period 2 s long
+    time_sec = np.arange(0, 2 * periods, step)
+    phase = time_sec % 2
+    return time_sec, np.where(phase < 1, 10 * phase, 10 * (2 - phase))
+
+
+def test_cycles_of_a_triangle():
+    time_sec, force = triangle()
+    table = cycles(time_sec, force)
+    # 5 crossings going up, the part after the last one is not a complete cycle
+    assert len(table["start"]) == 4
+    np.testing.assert_allclose(table["duration"], 2.0, atol=0.011)  # within a sample
+    np.testing.assert_allclose(table["peak"], 10.0, atol=1e-9)
+    np.testing.assert_allclose(table["minimum"], 0.0, atol=0.1)
+    np.testing.assert_allclose(table["mean"], 5.0, atol=0.1)
+
+
+def test_noise_around_the_level_does_not_start_cycles():
+    time_sec, force = triangle()
+    # Each ramp up stops a while at the level with noise of +-0.3 kN around it
+    random = np.random.default_rng(2)
+    near = np.abs(force - 5) < 0.5
+    noisy = force.copy()
+    noisy[near] = 5 + random.uniform(-0.3, 0.3, near.sum())
+    assert len(cycles(time_sec, noisy)["start"]) == 4
+    # Without the hysteresis every crossing of the noise counts
+    assert len(cycles(time_sec, noisy, hysteresis=0)["start"]) > 4
+
+
+def test_cycles_of_too_short_or_flat_recordings():
+    assert len(cycles(np.arange(2.0), np.array([0.0, 1.0]))["start"]) == 0
+    assert len(cycles(np.arange(10.0), np.full(10, 3.0))["start"]) == 0
+    assert len(cycles(np.arange(10.0), np.full(10, np.nan))["start"]) == 0
+
+
+def ramp_hold(creep=-0.002):
+    # 0 to 10 kN in 1 s, 100 s of hold losing creep kN/s, then unloaded
+    time_sec = np.round(np.arange(0, 103, 0.1), 10)
+    force = np.where(time_sec <= 1, 10 * time_sec, 10 + creep * (time_sec - 1))
+    force = np.where(time_sec > 101, 0.0, force)
+    return {"Time_sec": time_sec, "Force_kN": force, "Setpoint_kN": np.full(len(time_sec), 10.0),
+            "Epoch": time_sec + START}
+
+
+def test_hold_and_creep_of_a_ramp_hold():
+    summary = summarize(ramp_hold())
+    assert summary["samples"] == len(ramp_hold()["Time_sec"])
+    assert summary["start_epoch"] == START
+    assert summary["target_kN"] == 10.0
+    assert summary["peak_force_kN"] == pytest.approx(10.0)
+    assert summary["time_to_target_s"] == pytest.approx(1.0)
+    assert summary["hold_duration_s"] == pytest.approx(100.0)
+    assert summary["hold_mean_kN"] == pytest.approx(9.9)
+    assert summary["hold_max_deviation_kN"] == pytest.approx(0.2)
+    assert summary["creep_rate_kN_per_s"] == pytest.approx(-0.002)
+    assert summary["cycles"] == 0
+
+
+def test_target_given_and_never_reached():
+    summary = summarize(ramp_hold(), target=20.0)
+    assert summary["target_kN"] == 20.0
+    assert summary["time_to_target_s"] is None
+    assert summary["creep_rate_kN_per_s"] is None
+
+
+def test_csv_with_a_repeated_header_line(tmp_path):
+    time_sec = np.arange(20) / 80.0
+    force = np.sin(time_sec)
+    path = str(tmp_path / "test.csv")
+    write_csv(path, time_sec, force, setpoint=np.full(20, 2.5), repeat_header_at=(7, 13))
+    data = load_recording(path)
+    np.testing.assert_array_equal(data["Time_sec"], time_sec)
+    np.testing.assert_array_equal(data["Force_kN"], force)
+    np.testing.assert_array_equal(data["Setpoint_kN"], 2.5)
+    np.testing.assert_allclose(data["Epoch"], START + time_sec)
+
+
+def test_csv_without_setpoint_nor_date(tmp_path):
+    path = tmp_path / "old.csv"
+    path.write_text("Force_kN,Time_sec\n1.5,0.0\n2.5,0.5\n")
+    data = load_recording(str(path))
+    np.testing.assert_array_equal(data["Time_sec"], [0.0, 0.5])
+    np.testing.assert_array_equal(data["Force_kN"], [1.5, 2.5])
+    assert np.isnan(data["Setpoint_kN"]).all() and np.isnan(data["Epoch"]).all()
+
+
+@pytest.fixture
+def analysed(monkeypatch):
+    # Files really read by analyse_folder()
+    read = []
+    analyse_file = Analysis.analyse_file
+
+    def counting(path, target=None, tolerance=0.05):
+        read.append(os.path.basename(path))
+        return analyse_file(path, target, tolerance)
+
+    monkeypatch.setattr(Analysis, "analyse_file", counting)
+    return read
+
+
+def test_cache_is_invalidated_by_mtime_and_size(tmp_path, analysed):
+    time_sec, force = triangle(periods=3)
+    write_csv(str(tmp_path / "a.csv"), time_sec, force)
+    write_csv(str(tmp_path / "b.csv"), time_sec, 2 * force)
+    # The bins of export_window are not recordings
+    (tmp_path / "a_bins_10s.csv").write_text("time,Force_kN_min\n")
+
+    df = analyse_folder(str(tmp_path), processes=1)
+    assert sorted(analysed) == ["a.csv", "b.csv"]
+    assert list(df["file"]) == ["a.csv", "b.csv"]
+    assert list(df["peak_force_kN"]) == pytest.approx([10.0, 20.0])
+    assert list(df["cycles"]) == [2, 2]
+    assert (tmp_path / CACHE_NAME).exists()
+
+    # Nothing changed: every summary comes from the cache
+    del analysed[:]
+    again = analyse_folder(str(tmp_path), processes=1)
+    assert analysed == []
+    assert list(again["peak_force_kN"]) == list(df["peak_force_kN"])
+
+    # Other size, same modification time
+    stat = os.stat(tmp_path / "b.csv")
+    write_csv(str(tmp_path / "b.csv"), time_sec, 3 * force)
+    os.utime(tmp_path / "b.csv", ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert os.stat(tmp_path / "b.csv").st_size != stat.st_size
+    assert list(analyse_folder(str(tmp_path), processes=1)["peak_force_kN"]) == pytest.approx([10.0, 30.0])
+    assert analysed == ["b.csv"]
+
+    # Same size, other modification time
+    del analysed[:]
+    stat = os.stat(tmp_path / "a.csv")
+    os.utime(tmp_path / "a.csv", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    analyse_folder(str(tmp_path), processes=1)
+    assert analysed == ["a.csv"]
+
+    # Other options
+    del analysed[:]
+    analyse_folder(str(tmp_path), target=5.0, processes=1)
+    assert sorted(analysed) == ["a.csv", "b.csv"]
+
+    # No cache
+    del analysed[:]
+    analyse_folder(str(tmp_path), processes=1, cache=False)
+    assert sorted(analysed) == ["a.csv", "b.csv"]
+
+
+def test_errors_are_reported_and_not_cached(tmp_path, analysed):
+    (tmp_path / "broken.csv").write_bytes(b"")
+    df = analyse_folder(str(tmp_path), processes=1)
+    assert df["error"][0] is not None
+    analyse_folder(str(tmp_path), processes=1)
+    assert analysed == ["broken.csv", "broken.csv"]
@@ -0,0 +1,57 @@
+# Stopping the asyncio runtime while a sensor read or the loop hangs
+import threading
+import time
+
+from Press_Controller.Press_Controller import Press_Service
+
+TIMEOUT = 5.0  # only reached if a test fails
+
+
+class Hanging_HX711:
+    def __init__(self, hx):
+        self.hx = hx
+        self.hang = threading.Event()
+        self.hanging = threading.Event()
+        self.release = threading.Event()
+
+    def get_raw_data(self, readings):
+        if self.hang.is_set():
+            self.hanging.set()
+            self.release.wait(TIMEOUT)
+        return self.hx.get_raw_data(readings)
+
+
+def test_acquisition_thread_waits_for_the_read_in_progress():
+    service = Press_Service(is_Dummy=True, runtime="asyncio", catalogue=False, supervisor=False)
+    engine = service.station().balance.engine
+    hx = engine.hx = Hanging_HX711(engine.hx)
+    try:
+        service.setup_init()
+        hx.hang.set()
+        assert hx.hanging.wait(TIMEOUT)
+        service.runtime.stop(timeout=0.2)
+        # The executor is still in read_block: a second thread must not clock the HX711
+        assert engine.thread_status == "stopped"
+    finally:
+        hx.hang.clear()
+        hx.release.set()
+        service.shutdown()
+
+
+def test_blocked_loop_is_closed_once_it_is_released():
+    service = Press_Service(is_Dummy=True, runtime="asyncio", catalogue=False, supervisor=False)
+    try:
+        service.setup_init()
+        runtime = service.runtime
+        release = threading.Event()
+        loop, thread = runtime.loop, runtime.thread
+        loop.call_soon_threadsafe(release.wait, TIMEOUT)
+        start = time.perf_counter()
+        runtime.stop(timeout=0.2)
+        assert time.perf_counter() - start < 2.0
+        assert service.station().balance.engine.thread_status == "running"
+        release.set()
+        thread.join(TIMEOUT)
+        assert loop.is_closed()
+    finally:
+        service.shutdown()
@@ -0,0 +1,100 @@
+# Binary .prec recordings and their conversion to and from csv
+import os
+
+import numpy as np
+import pytest
+
+from Press_Controller.Binary_Recording import (Binary_Recording, MAGIC, binary_to_csv, csv_to_binary,
+                                               header_bytes, read_header, records_bytes, write_recording)
+
+START = 1.6e9  # a whole second, the resolution of the dates of the csv
+
+
+def columns(n):
+    time_sec = np.arange(n) / 80.0
+    force = np.sin(time_sec)
+    setpoint = np.where(time_sec < 1.0, np.nan, 2.5)
+    return time_sec, force, setpoint
+
+
+def test_header_is_padded_so_the_records_are_aligned():
+    for calibration in (None, {"method": "linear"}, {"points": list(range(37))}):
+        data = header_bytes(START, sample_rate=80, calibration=calibration, operator="ana")
+        assert data.startswith(MAGIC)
+        assert len(data) % 16 == 0
+
+
+def test_records_are_read_back_from_the_memory_map(tmp_path):
+    path = str(tmp_path / "test.prec")
+    time_sec, force, setpoint = columns(1000)
+    write_recording(path, time_sec, force, START, setpoint, sample_rate=80, pins={"pulse": 4}, station="A")
+    recording = Binary_Recording(path)
+    assert isinstance(recording.data, np.memmap)
+    assert recording.offset % 16 == 0
+    assert len(recording) == 1000
+    assert np.array_equal(recording.time_sec, time_sec)
+    assert np.array_equal(recording.force, force)
+    assert np.array_equal(recording.setpoint, setpoint, equal_nan=True)
+    assert recording.header["sample_rate"] == 80 and recording.header["station"] == "A"
+    assert recording.epoch[0] == START
+    assert read_header(path)[1] == recording.offset
+
+
+def test_setpoint_not_given_is_nan(tmp_path):
+    path = str(tmp_path / "test.prec")
+    write_recording(path, [0.0, 1.0], [1.0, 2.0], START)
+    assert np.isnan(Binary_Recording(path).setpoint).all()
+
+
+def test_truncated_file_keeps_the_complete_records(tmp_path):
+    path = str(tmp_path / "test.prec")
+    time_sec, force, setpoint = columns(10)
+    write_recording(path, time_sec, force, START, setpoint)
+    size = os.path.getsize(path)
+    os.truncate(path, size - 5)  # the last record is cut by a crash
+    recording = Binary_Recording(path)
+    assert len(recording) == 9
+    assert np.array_equal(recording.force, force[:9])
+    # Records appended later are read
+    with open(path, "r+b") as f:
+        f.truncate(size - 24)
+        f.seek(0, os.SEEK_END)
+        f.write(records_bytes([9 / 80.0], [force[9]], [setpoint[9]]))
+    assert np.array_equal(Binary_Recording(path).force, force)
+
+
+def test_file_cut_in_the_header_is_refused(tmp_path):
+    path = str(tmp_path / "test.prec")
+    write_recording(path, [0.0], [1.0], START)
+    os.truncate(path, 20)
+    with pytest.raises(ValueError):
+        Binary_Recording(path)
+    with open(path, "wb") as f:
+        f.write(b"Date,Time_sec,Force_kN\n")
+    with pytest.raises(ValueError):
+        Binary_Recording(path)
+
+
+def test_empty_recording(tmp_path):
+    path = str(tmp_path / "empty.prec")
+    write_recording(path, [], [], None)
+    recording = Binary_Recording(path)
+    assert len(recording) == 0
+    assert len(recording.to_dataframe()) == 0
+    back = csv_to_binary(binary_to_csv(path), str(tmp_path / "back.prec"))
+    assert len(Binary_Recording(back)) == 0
+    assert Binary_Recording(back).start_epoch is None
+
+
+def test_csv_round_trip(tmp_path):
+    path = str(tmp_path / "test.prec")
+    time_sec, force, setpoint = columns(500)
+    write_recording(path, time_sec, force, START, setpoint)
+    csv_path = binary_to_csv(path)
+    assert csv_path == str(tmp_path / "test.csv")
+    back = Binary_Recording(csv_to_binary(csv_path, str(tmp_path / "back.prec"), sample_rate=80))
+    assert back.start_epoch == START
+    assert back.header["sample_rate"] == 80
+    assert np.array_equal(back.time_sec, time_sec)
+    assert np.array_equal(back.force, force)
+    assert np.array_equal(back.setpoint, setpoint, equal_nan=True)
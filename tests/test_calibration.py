@@ -0,0 +1,27 @@
+# Conversion of the raw HX711 values
+import numpy as np
+import pytest
+
+from Press_Controller.Calibration import Calibration
+
+
+def test_piecewise_goes_through_the_points():
+    calibration = Calibration(method="piecewise", points=[(0, 0.0), (1000, 1.0), (3000, 4.0)])
+    assert np.allclose(calibration.convert([0, 500, 1000, 2000]), [0.0, 0.5, 1.0, 2.5])
+
+
+@pytest.mark.parametrize("points", [[(0, 0.0), (1000, 1.0), (1000, 1.5)],
+                                    [(0, 0.0), (1000, 2.0), (2000, 1.0)]])
+def test_bad_points_are_refused(points):
+    with pytest.raises(ValueError):
+        Calibration(method="piecewise", points=points)
+
+
+def test_bad_point_is_not_added():
+    calibration = Calibration(method="piecewise", points=[(0, 0.0), (1000, 1.0)])
+    table = calibration._table
+    with pytest.raises(ValueError):
+        calibration.add_point(1000, 2.0)
+    assert calibration.points == [(0, 0.0), (1000, 1.0)]
+    assert calibration._table is table
+    assert calibration.convert(500) == pytest.approx(0.5)
@@ -0,0 +1,25 @@
+# Catalogue of the runs of a folder
+import os
+
+from Press_Controller.Analysis import find_recordings
+from Press_Controller.Catalogue import CATALOGUE_NAME, Run_Catalogue
+
+
+def test_folder_that_does_not_exist_yet_keeps_the_catalogue_inside(tmp_path):
+    folder = tmp_path / "Recordings"
+    assert Run_Catalogue(str(folder)).path == os.path.join(str(folder), CATALOGUE_NAME)
+    assert not folder.exists()
+
+
+def test_database_file_is_used_as_given(tmp_path):
+    assert Run_Catalogue(str(tmp_path / "runs.sqlite")).path == str(tmp_path / "runs.sqlite")
+    existing = tmp_path / "runs"
+    existing.write_bytes(b"")
+    assert Run_Catalogue(str(existing)).path == str(existing)
+    assert Run_Catalogue(str(tmp_path)).path == os.path.join(str(tmp_path), CATALOGUE_NAME)
+
+
+def test_exported_bins_are_not_recordings(tmp_path):
+    for name in ("test_1.csv", "test_2_bins_60s.csv", "test_3_bins_0.5s.csv"):
+        (tmp_path / name).write_text("")
+    assert find_recordings(str(tmp_path)) == [str(tmp_path / "test_1.csv")]
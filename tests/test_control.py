@@ -0,0 +1,49 @@
+# Force control on the simulated press (virtual clock, faster than real time)
+import pytest
+
+from Press_Controller.Control import PID
+from Press_Controller.Simulator import Press_Simulation
+
+
+def test_force_control_keeps_the_frequency_of_the_operator():
+    simulation = Press_Simulation()
+    simulation.pulse.set_frequency(750)
+    result = simulation.run(setpoint=3.0, duration=5.0)
+    assert abs(result["force"][-1] - 3.0) < 0.5
+    assert simulation.pulse.frequency == 750  # the manual moves still use it
+    simulation.pulse.move_PWM()
+    assert simulation.pulse.pulses().frequency == 750
+
+
+def test_integral_does_not_grow_inside_the_deadband():
+    pid = PID(kp=100.0, ki=50.0)
+    pid.step(2.0, 1.0, 0.0)
+    pid.step(2.0, 1.0, 0.1)
+    integral = pid.integral
+    for _ in range(100):
+        pid.step(2.0, 1.9, 0.1, integrate=False)  # holding 0.1 kN under the setpoint
+    assert pid.integral == pytest.approx(integral)
+    pid.step(2.0, 1.9, 0.1)
+    assert pid.integral == pytest.approx(integral + 50.0 * 0.1 * 0.1)
+
+
+class Recording_PID(PID):
+    # PID that keeps the integral before and after every step
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.steps = []
+
+    def step(self, setpoint, measurement, dt, integrate=True):
+        before = self.integral
+        output = super().step(setpoint, measurement, dt, integrate)
+        self.steps.append((abs(setpoint - measurement), before, self.integral))
+        return output
+
+
+def test_holding_on_target_does_not_wind_up():
+    pid = Recording_PID()
+    simulation = Press_Simulation(pid=pid, deviation=0.3)
+    simulation.run(setpoint=3.0, duration=20.0)
+    held = [(before, after) for error, before, after in pid.steps if error <= 0.3]
+    assert len(held) > 100
+    assert all(after == before for before, after in held)
@@ -0,0 +1,34 @@
+# Faults of a station changed from several threads
+import threading
+
+from Press_Controller.Press_Controller import Press_Service
+
+
+class Interleaved_Set(set):
+    """
+    Set that lets another thread trip the station the first time it is read, as the supervisor can
+    """
+    def __init__(self, values, station):
+        super().__init__(values)
+        self.station = station
+        self.thread = None
+
+    def __iter__(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.station.trip, args=("overload",))
+            self.thread.start()
+            self.thread.join(0.1)  # done at once without a lock, blocked until the reader is done with one
+        return super().__iter__()
+
+
+def test_trip_during_reset_is_kept():
+    service = Press_Service(is_Dummy=True, catalogue=False, supervisor=False)
+    try:
+        station = service.station()
+        station.faults = Interleaved_Set({"control_stall"}, station)
+        station.reset_faults()
+        station.faults.thread.join(5.0)
+        assert "overload" in station.faults
+        assert "control_stall" not in station.faults
+    finally:
+        service.shutdown()
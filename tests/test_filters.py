@@ -0,0 +1,17 @@
+# Streaming filters of the load cell readings
+import numpy as np
+import pytest
+
+from Press_Controller.Filters import IIR_Filter, Median_Filter, Moving_Average, Outlier_Rejection
+
+
+@pytest.mark.parametrize("make", [lambda: Moving_Average(5), lambda: Median_Filter(5), lambda: Outlier_Rejection(7),
+                                  lambda: IIR_Filter([0.5], [1.0, -0.5])])
+def test_empty_block_gives_empty_output_and_keeps_the_stream(make):
+    data = np.sin(np.linspace(0, 10, 40))
+    data[17] = 50.0
+    whole = make().process(data)
+    fltr = make()
+    assert len(fltr.process([])) == 0
+    parts = [fltr.process(data[:13]), fltr.process(np.empty(0)), fltr.process(data[13:])]
+    assert np.allclose(np.concatenate(parts), whole)
@@ -0,0 +1,123 @@
+# Values passed from the worker threads to the widgets, with a fake Tk root instead of a display
+import threading
+
+from Press_Controller.Gui_Bridge import Gui_Bridge
+
+
+class Fake_Root:
+    """
+    Keeps the functions given to after() so the test runs the refreshes of the main loop itself
+    """
+    def __init__(self):
+        self.pending = {}
+        self.delays = []
+        self.next_id = 0
+
+    def after(self, ms, function):
+        self.next_id += 1
+        self.pending[self.next_id] = function
+        self.delays.append(ms)
+        return self.next_id
+
+    def after_cancel(self, after_id):
+        del self.pending[after_id]
+
+    def run_pending(self):
+        pending, self.pending = self.pending, {}
+        for function in pending.values():
+            function()
+
+
+def subscribed(bridge, topic):
+    values = []
+    bridge.subscribe(topic, values.append)
+    return values
+
+
+def test_only_the_latest_value_of_a_refresh_is_delivered():
+    bridge = Gui_Bridge(refresh_ms=50)
+    root = Fake_Root()
+    force = subscribed(bridge, "force")
+    active = subscribed(bridge, "active")
+    bridge.start(root)
+    assert root.delays == [50]
+
+    for value in (1.0, 2.0, 3.0):
+        bridge.publish("force", value)
+    bridge.publish("active", True)
+    bridge.publish("nobody", 1)
+    assert force == [] and active == []  # nothing reaches the widgets before the main loop runs
+    root.run_pending()
+    assert force == [3.0] and active == [True]
+    assert bridge.published == 5 and bridge.delivered == 2
+    assert root.delays == [50, 50]
+
+
+def test_unchanged_values_are_skipped():
+    bridge = Gui_Bridge()
+    root = Fake_Root()
+    force = subscribed(bridge, "force")
+    faults = subscribed(bridge, "faults")
+    bridge.start(root)
+
+    bridge.publish("force", 1.0)
+    bridge.publish("faults", ())
+    root.run_pending()
+    bridge.publish("force", 1.0)
+    bridge.publish("faults", ())
+    root.run_pending()
+    assert force == [1.0] and faults == [()]
+
+    # A value that goes away and comes back within one refresh did not change for the widgets
+    bridge.publish("force", 2.0)
+    bridge.publish("force", 1.0)
+    bridge.publish("faults", ("estop",))
+    root.run_pending()
+    assert force == [1.0] and faults == [(), ("estop",)]
+
+    bridge.publish("force", 2.0)
+    root.run_pending()
+    assert force == [1.0, 2.0]
+    assert bridge.delivered == 4
+
+
+def test_every_subscriber_is_called():
+    bridge = Gui_Bridge()
+    first, second = subscribed(bridge, "force"), subscribed(bridge, "force")
+    bridge.publish("force", 4.0)
+    bridge.refresh()
+    assert first == second == [4.0]
+    assert bridge.delivered == 2
+
+
+def test_publish_from_several_threads():
+    bridge = Gui_Bridge()
+    latest = {}
+    for n in range(4):
+        bridge.subscribe("t{}".format(n), lambda value, n=n: latest.__setitem__(n, value))
+
+    def worker(n):
+        for i in range(1000):
+            bridge.publish("t{}".format(n), i)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    bridge.refresh()
+    assert latest == {n: 999 for n in range(4)}
+    assert bridge.published == 4000 and bridge.delivered == 4
+
+
+def test_stop_cancels_the_next_refresh():
+    bridge = Gui_Bridge()
+    root = Fake_Root()
+    force = subscribed(bridge, "force")
+    bridge.start(root)
+    bridge.stop()
+    assert root.pending == {}
+    bridge.publish("force", 1.0)
+    root.run_pending()
+    assert force == []
+    bridge.stop()  # stopping twice does nothing
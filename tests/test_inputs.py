@@ -0,0 +1,84 @@
+# Edges of the limit switches and the emergency stop
+import threading
+
+import pytest
+
+import Press_Controller.Press_Controller as pc
+from Press_Controller.Press_Controller import Input_Pin, Press_Service
+
+
+class Bouncing_IO:
+    BCM = IN = PUD_UP = PUD_DOWN = BOTH = 0
+
+    def __init__(self):
+        self.level = 0
+        self.reads = []  # levels given by the next reads, then self.level
+        self.callback = None
+
+    def setmode(self, mode):
+        pass
+
+    def setup(self, channel, direction, pull_up_down=None):
+        pass
+
+    def input(self, channel):
+        return self.reads.pop(0) if self.reads else self.level
+
+    def add_event_detect(self, channel, edge, callback=None, bouncetime=None):
+        self.callback = callback
+
+    def remove_event_detect(self, channel):
+        pass
+
+
+@pytest.fixture
+def io(monkeypatch):
+    io = Bouncing_IO()
+    monkeypatch.setattr(pc, "IO", io, raising=False)
+    return io
+
+
+def test_edge_read_during_a_bounce_is_not_lost(io):
+    pin = Input_Pin(5, pull_down=False, bouncetime=20)
+    changed = threading.Event()
+    states = []
+    pin.add_callback(lambda state: (states.append(state), changed.set()))
+    # The switch opens, the first read lands on a bounce back to closed and the next edges are ignored
+    io.level = 1
+    io.reads = [0]
+    io.callback(5)
+    assert changed.wait(1.0)
+    assert states == [1]
+
+
+def test_short_pulse_is_reported_with_its_end(io):
+    pin = Input_Pin(5, pull_down=False, bouncetime=5)
+    states = []
+    pin.add_callback(states.append)
+    io.reads = [1]
+    io.callback(5)
+    threading.Event().wait(0.1)
+    assert states == [1, 0]  # a real short pulse is still reported, and its end
+
+
+def test_supervisor_trips_an_input_that_changed_without_an_edge():
+    service = Press_Service(is_Dummy=True, Estop_channel_in=6, Limit_down_channel_in=12, catalogue=False,
+                            supervisor=True)
+    try:
+        station = service.station()
+        station.enable.on()
+        station.safety_inputs["estop"].activate = True  # no callback
+        service.supervisor.check_inputs(station)
+        assert "estop" in station.faults
+        assert station.enable.state() == 0
+        station.safety_inputs["estop"].activate = False
+        service.supervisor.check_inputs(station)
+        assert "estop" in station.faults  # stays latched until reset_faults()
+        station.safety_inputs["limit_down"].activate = True
+        service.supervisor.check_inputs(station)
+        assert "limit_down" in station.faults
+        station.safety_inputs["limit_down"].activate = False
+        service.supervisor.check_inputs(station)
+        assert "limit_down" not in station.faults
+    finally:
+        service.shutdown()
@@ -0,0 +1,44 @@
+# Commands of the window while the press is still starting, without a display
+import pytest
+
+import Press_Controller.Press_Controller as pc
+from Press_Controller.Press_Controller import Interface
+
+
+class Fake_Service:
+    def __init__(self):
+        self.calls = []
+
+    def set_frequency(self, frequency):
+        self.calls.append(("set_frequency", frequency))
+
+    def metrics(self):
+        return {"enabled": False}
+
+
+@pytest.fixture
+def messages(monkeypatch):
+    shown = []
+    monkeypatch.setattr(pc.messagebox, "showinfo", lambda title, text: shown.append(title))
+    monkeypatch.setattr(pc.messagebox, "showerror", lambda title, text: shown.append(title))
+    return shown
+
+
+def test_commands_wait_until_the_window_is_connected(messages):
+    service = Fake_Service()
+    interface = Interface(service=service)
+    # The service exists but connect() has not filled the values nor started its threads yet
+    assert interface.call("set_frequency", 0) is None
+    assert interface.create_metrics_window() is None
+    assert service.calls == []
+    assert messages == ["Starting", "Starting"]
+    interface.connected = True
+    interface.call("set_frequency", 100)
+    assert service.calls == [("set_frequency", 100)]
+
+
+def test_press_that_could_not_start_gives_an_error(messages):
+    interface = Interface(service=Fake_Service())
+    interface.service_error = OSError("no GPIO")
+    assert interface.call("set_frequency", 100) is None
+    assert messages == ["Error"]
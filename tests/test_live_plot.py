@@ -0,0 +1,59 @@
+# Lines of the "Since opened" span of the live plot, without a window
+import numpy as np
+
+from Press_Controller.Live_Plot import Live_Plot, Minmax_Decimator
+from Press_Controller.Sample_Store import Sample_Store
+
+
+class Counting_Store(Sample_Store):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.read = 0
+
+    def tail(self, n):
+        self.read += n
+        return super().tail(n)
+
+
+def lines(store, max_tail=1000):
+    plot = Live_Plot.__new__(Live_Plot)
+    plot.samples = store
+    plot.max_tail = max_tail
+    plot.seen = 0
+    plot.force = Minmax_Decimator(100)
+    plot.setpoint = Minmax_Decimator(100)
+    return plot
+
+
+def record(store, start, stop):
+    times = np.arange(start, stop) / 80.0
+    force = np.sin(times)
+    force[(stop - start) // 2] = 9.0  # a peak that has to stay visible
+    store.extend(times, force, times, setpoint=np.ones_like(times))
+
+
+def test_long_recording_starts_from_the_bins():
+    store = Counting_Store(max_samples=2 ** 20, pyramid=True)
+    record(store, 0, 300000)
+    plot = lines(store)
+    assert plot.add_new_samples()
+    assert store.read == 0
+    x, y = plot.force.line_data()
+    assert y.max() == 9.0 and y.min() == store.window()["Force_kN_min"].min()
+    # The next frames only read the new samples and go on after the bins
+    record(store, 300000, 300080)
+    assert plot.add_new_samples()
+    assert store.read == 80
+    x, _ = plot.force.line_data()
+    assert np.all(np.diff(x) >= 0) and x[-1] == 300040 / 80.0  # the peak of the new samples
+    assert not plot.add_new_samples()
+
+
+def test_store_without_pyramid_keeps_the_last_samples():
+    store = Counting_Store()
+    record(store, 0, 5000)
+    plot = lines(store)
+    assert plot.add_new_samples()
+    assert store.read == 1000
+    x, _ = plot.force.line_data()
+    assert x.min() == 4000 / 80.0
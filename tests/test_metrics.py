@@ -0,0 +1,72 @@
+# Counters, histograms and gauges of the metrics
+import threading
+import time
+
+import Press_Controller.Metrics as metrics_module
+from Press_Controller.Metrics import METRICS, Histogram, Metrics
+from Press_Controller.Press_Controller import Press_Service
+
+
+def test_counts_from_many_threads_are_not_lost():
+    metrics = Metrics(enabled=True)
+
+    def count():
+        for _ in range(20000):
+            metrics.count("readings")
+
+    threads = [threading.Thread(target=count) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert metrics.snapshot()["counters"]["readings"] == 8 * 20000
+
+
+class Slow_Histogram(Histogram):
+    # The update of the histogram gives the other threads time to run in the middle of it
+    def add(self, value):
+        count = self.count
+        time.sleep(0)
+        super().add(value)
+        self.count = count + 1
+
+
+def test_durations_from_many_threads_are_not_lost(monkeypatch):
+    monkeypatch.setattr(metrics_module, "Histogram", Slow_Histogram)
+    metrics = Metrics(enabled=True)
+
+    def observe():
+        for i in range(2000):
+            metrics.observe("sensor_read", 1e-6 * (i % 7 + 1))
+
+    threads = [threading.Thread(target=observe) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    histogram = metrics.histograms["sensor_read"]
+    assert histogram.count == sum(histogram.counts) == 8 * 2000
+
+
+def test_gauge_can_be_removed():
+    metrics = Metrics(enabled=True)
+    metrics.gauge("queue", lambda: 3)
+    assert metrics.snapshot()["gauges"] == {"queue": 3}
+    metrics.remove_gauge("queue")
+    metrics.remove_gauge("unknown")
+    assert metrics.snapshot()["gauges"] == {}
+
+
+def test_removed_station_leaves_no_gauges():
+    second = dict(name="B", is_Dummy=True, Pulse_channel_out=5, Enable_channel_out=6, Dir_channel_out=13,
+                  Active_channel_in=19, balance_dt_pin=26, balance_sck_pin=16)
+    service = Press_Service(stations=[dict(name="A", is_Dummy=True), second], catalogue=False)
+    try:
+        assert "B_samples" in METRICS.gauges
+        service.remove_station("B")
+        assert service.stations() == ["A"]
+        assert not [name for name in METRICS.gauges if name.startswith("B_")]
+        assert "A_samples" in METRICS.gauges
+    finally:
+        service.shutdown()
+    assert not [name for name in METRICS.gauges if name.startswith("A_")]
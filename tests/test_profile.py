@@ -0,0 +1,56 @@
+# Test programs: the setpoint is computed from the plan of the segments, whatever the length of the program
+import pytest
+
+from Press_Controller.Profile import Profile, Profile_Executor
+from Press_Controller.Simulator import Press_Simulation
+
+creep = [{"type": "ramp", "to": 5, "rate": 0.5},
+         {"type": "hold", "duration": 3600},
+         {"type": "cycle", "repeat": 100000,
+          "segments": [{"type": "ramp", "to": 8, "rate": 2},
+                       {"type": "hold", "duration": 5},
+                       {"type": "release", "to": 2, "rate": 2}]},
+         {"type": "release", "rate": 1}]
+
+
+def test_setpoints_of_a_long_program():
+    executor = Profile_Executor(Profile(creep), start_force=1.0, dt=0.05)
+    cycles = 9.5 + 99999 * 11.0  # the first cycle starts at 5 kN, the others at 2 kN
+    assert executor.duration == pytest.approx(8 + 3600 + cycles + 2)
+    expected = {0: 1.0, 4: 3.0, 100: 5.0, 3615: 7.0, 3618: 3.0,
+                3608 + cycles - 0.5: 3.0,  # end of the last release of the cycle
+                executor.duration - 1: 1.0}
+    for t, setpoint in expected.items():
+        assert executor.setpoint(t) == pytest.approx(setpoint, abs=0.11)
+    assert executor.setpoint(executor.duration + 1) is None
+    assert len(executor.plan.items) == 4  # nothing was computed per repetition
+
+
+def test_setpoint_changes_in_steps_of_dt():
+    executor = Profile_Executor(Profile([{"type": "ramp", "to": 10, "rate": 1}]), dt=0.5)
+    assert executor.setpoint(1.2) == pytest.approx(1.0)
+    assert executor.setpoint(1.6) == pytest.approx(1.5)
+
+
+@pytest.mark.parametrize("segments", [[{"type": "cycle", "repeat": 3}],
+                                      [{"type": "cycle", "repeat": 0, "segments": [{"type": "hold", "duration": 1}]}],
+                                      [{"type": "ramp", "rate": 1}],
+                                      [{"type": "release", "rate": 0}],
+                                      [{"type": "hold"}],
+                                      [{"type": "jump"}]])
+def test_wrong_segments_are_rejected(segments):
+    with pytest.raises(ValueError):
+        Profile(segments)
+
+
+def test_program_on_the_simulated_press():
+    profile = Profile([{"type": "ramp", "to": 3, "rate": 1},
+                       {"type": "cycle", "repeat": 3,
+                        "segments": [{"type": "hold", "duration": 2}, {"type": "ramp", "to": 4, "rate": 1},
+                                     {"type": "release", "to": 3, "rate": 1}]}])
+    simulation = Press_Simulation()
+    duration = Profile_Executor(profile, start_force=simulation.model.force).duration
+    result = simulation.run(profile=profile)
+    assert result["time"][-1] == pytest.approx(duration, abs=0.1)
+    assert max(result["setpoint"]) == pytest.approx(4.0, abs=0.05)
+    assert abs(result["force"][-1] - 3.0) < 0.6
@@ -0,0 +1,62 @@
+# Pulses of the simulated drive
+import pytest
+
+from Press_Controller.Pulse import Simulated_Pulse
+from Press_Controller.Simulator import Press_Simulation
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Direction:
+    def __init__(self):
+        self.down = False
+
+    def state(self):
+        return 1 if self.down else 0
+
+
+def test_position_with_many_frequency_changes_keeps_bounded_history():
+    clock = Clock()
+    direction = Direction()
+    pulse = Simulated_Pulse(4, dir_pin=direction, clock=clock, history=1.0)
+    expected = 0.0
+    pulse.frequency = 100.0
+    pulse.start()
+    for i in range(20000):  # a new frequency every 25 ms for more than 8 minutes
+        frequency = 100.0 + i % 50
+        clock.now += 0.025
+        expected += pulse.frequency * 0.025 * (-1 if direction.down else 1)
+        if i % 4000 == 3999:
+            pulse.stop()
+            direction.down = not direction.down
+            pulse.start()
+        pulse.set_frequency(frequency)
+        assert pulse.position() == pytest.approx(expected)
+    assert len(pulse.segments) <= 1.0 / 0.025 + 5  # one second of history
+
+
+def test_moves_are_kept_until_they_end():
+    clock = Clock()
+    pulse = Simulated_Pulse(4, clock=clock, history=0.0)
+    pulse.send_pulses(1000, 500)
+    clock.now = 1.0
+    assert pulse.busy()
+    assert pulse.position() == pytest.approx(500)
+    clock.now = 5.0
+    pulse.start()  # every change folds the finished segments
+    assert pulse.segments[0][1] is None
+    assert pulse.position() == pytest.approx(1000)
+    with pytest.raises(ValueError):
+        pulse.position(1.0)
+
+
+def test_long_simulation_does_not_accumulate_segments():
+    simulation = Press_Simulation()
+    simulation.run(setpoint=3.0, duration=120.0)
+    assert len(simulation.simulator.pulse.segments) < 100
@@ -0,0 +1,124 @@
+# Bins of the resolution pyramid compared with a brute-force binning of the samples
+import numpy as np
+import pytest
+
+from Press_Controller.Pyramid import Resolution_Pyramid
+
+RESOLUTIONS = (0.1, 1, 10)
+
+
+def samples(n=3000, seed=1):
+    random = np.random.default_rng(seed)
+    times = np.cumsum(random.uniform(0.0, 0.04, n))
+    values = random.normal(size=(n, 2))
+    values[random.random(n) < 0.1, 1] = np.nan
+    return times, values
+
+
+def brute_force(times, values, level, resolutions=RESOLUTIONS, first=None):
+    # Same bin indexes as the pyramid: the index of the finest level divided by the ratios
+    index = np.floor(times / resolutions[0]).astype(np.int64) // int(round(resolutions[level] / resolutions[0]))
+    bins = np.unique(index)
+    if first is not None:
+        bins = bins[bins >= first]
+    result = {"time": bins * float(resolutions[level]), "samples": []}
+    for c, name in enumerate(("Force_kN", "Setpoint_kN")):
+        low, high, mean = [], [], []
+        for b in bins:
+            column = values[index == b, c]
+            column = column[~np.isnan(column)]
+            low.append(column.min() if len(column) else np.nan)
+            high.append(column.max() if len(column) else np.nan)
+            mean.append(column.mean() if len(column) else np.nan)
+            if c == 0:
+                result["samples"].append(len(column))
+        result[name + "_min"], result[name + "_max"], result[name + "_mean"] = low, high, mean
+    return result
+
+
+def assert_same(window, expected):
+    assert window.keys() - {"resolution"} == expected.keys()
+    for key, value in expected.items():
+        np.testing.assert_allclose(window[key], value, rtol=1e-12, atol=1e-12, err_msg=key)
+
+
+@pytest.mark.parametrize("path", ["add", "extend", "mixed"])
+def test_every_level_matches_numpy_binning(path):
+    times, values = samples()
+    pyramid = Resolution_Pyramid(resolutions=RESOLUTIONS)
+    if path == "add":
+        for t, row in zip(times, values):
+            pyramid.add(t, *row)
+    elif path == "extend":
+        for block in np.array_split(np.arange(len(times)), 7):
+            pyramid.extend(times[block], values[block])
+    else:
+        # Blocks of every size, the single samples falling in bins that extend() left open and the other way round
+        edges = [0, 1, 2, 50, 51, 333, 334, 335, 900, 1700, 1701, 2500, len(times)]
+        for i, (lo, hi) in enumerate(zip(edges[:-1], edges[1:])):
+            if i % 2:
+                pyramid.extend(times[lo:hi], values[lo:hi])
+            else:
+                for t, row in zip(times[lo:hi], values[lo:hi]):
+                    pyramid.add(t, *row)
+    assert pyramid.samples == len(times)
+    assert pyramid.last_time == times[-1]
+    for level, resolution in enumerate(RESOLUTIONS):
+        window = pyramid.window(resolution=resolution)
+        assert window["resolution"] == resolution
+        assert_same(window, brute_force(times, values, level))
+
+
+def test_window_of_the_end_of_the_recording():
+    times, values = samples()
+    pyramid = Resolution_Pyramid(resolutions=RESOLUTIONS)
+    pyramid.extend(times, values)
+    first = int((times[-1] - 5.0) // 1.0)
+    assert_same(pyramid.window(5.0, resolution=1), brute_force(times, values, 1, first=first))
+
+
+def test_ring_overflow_keeps_the_newest_bins():
+    times, values = samples()
+    pyramid = Resolution_Pyramid(resolutions=RESOLUTIONS, capacity=16)
+    half = len(times) // 2
+    for t, row in zip(times[:half], values[:half]):
+        pyramid.add(t, *row)
+    pyramid.extend(times[half:], values[half:])
+    assert pyramid._count == [16, 16, min(16, int(times[-1] // 10))]
+    assert pyramid._dropped[0] > 0 and pyramid._dropped[1] > 0
+
+    # The window still fits in the finest level: the ring gives the newest bins in order
+    seconds = 1.2
+    window = pyramid.window(seconds, resolution=0.1)
+    assert window["resolution"] == 0.1
+    first = int((times[-1] - seconds) // 0.1)
+    assert_same(window, brute_force(times, values, 0, first=first))
+
+
+def test_level_for_falls_back_to_a_coarser_level():
+    times, values = samples()
+    pyramid = Resolution_Pyramid(resolutions=RESOLUTIONS, capacity=16)
+    pyramid.extend(times, values)
+    assert pyramid.level_for(1.0) == 0
+    assert pyramid.level_for(1.0, resolution=1) == 1
+    # 16 bins of 0.1 s or of 1 s do not go back 30 s: the level of 10 s answers
+    assert pyramid.level_for(30.0) == 2
+    assert pyramid.level_for(30.0, resolution=1) == 2
+    assert pyramid.level_for() == 2
+    window = pyramid.window()
+    assert window["resolution"] == 10
+    assert_same(window, brute_force(times, values, 2))
+
+    # Nothing dropped yet: the level asked for answers, however long the window
+    short = Resolution_Pyramid(resolutions=RESOLUTIONS, capacity=16)
+    assert short.level_for(3600.0, resolution=1) == 1
+    short.extend(times[:20], values[:20])
+    assert short.level_for(3600.0) == 0
+
+
+def test_empty_pyramid():
+    pyramid = Resolution_Pyramid(resolutions=RESOLUTIONS)
+    window = pyramid.window(10.0)
+    assert len(window["time"]) == 0 and len(window["Force_kN_mean"]) == 0
+    pyramid.extend([], np.empty((0, 2)))
+    assert pyramid.samples == 0 and pyramid.last_time is None
@@ -0,0 +1,104 @@
+# Streaming of the recording to disk
+import os
+import time
+
+import pytest
+
+from Press_Controller.Recording_Writer import Recording_Writer, Writer_Pool
+
+TIMEOUT = 5.0  # only reached if a test fails
+
+
+def rows(path):
+    with open(path) as f:
+        lines = f.read().splitlines()
+    assert lines[0] == Recording_Writer.header.strip()
+    return [line.split(",") for line in lines[1:]]
+
+
+def wait_rows(path, n):
+    start = time.perf_counter()
+    while time.perf_counter() - start < TIMEOUT:
+        # The header is only on disk with the first batch
+        if os.path.exists(path) and os.path.getsize(path) > len(Recording_Writer.header) and len(rows(path)) >= n:
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_flushed_samples_survive_a_crash(tmp_path):
+    path = str(tmp_path / "test.csv")
+    writer = Recording_Writer(path, flush_interval=60, flush_size=1000)
+    writer.start()
+    for i in range(10):
+        writer.write(i * 0.5, i * 0.1, 1.6e9 + i, 2.0)
+    assert writer.flush(TIMEOUT)
+    writer.write(5.0, 1.0, 1.6e9 + 10)  # still in memory when the program dies
+    # Crash: the writer is never closed, the final name is never given
+    assert not os.path.exists(path)
+    recorded = rows(path + ".partial")
+    assert [float(r[1]) for r in recorded] == [i * 0.5 for i in range(10)]
+    assert recorded[3][3] == "2.0"
+    writer.close()
+    assert not os.path.exists(path + ".partial")
+    assert len(rows(path)) == 11
+    assert rows(path)[-1][3] == ""  # no setpoint
+
+
+def test_rotation_by_bytes(tmp_path):
+    path = str(tmp_path / "test.csv")
+    writer = Recording_Writer(path, flush_size=1, max_bytes=200, fsync="never")
+    writer.start()
+    for i in range(20):
+        writer.write(float(i), 0.0, 1.6e9)
+    files = writer.close()
+    assert files[0] == path and files[1] == str(tmp_path / "test_part1.csv")
+    assert len(files) > 2
+    assert [float(r[1]) for f in files for r in rows(f)] == [float(i) for i in range(20)]
+    assert all(os.path.getsize(f) < 200 + 100 for f in files)
+
+
+def test_rotation_by_seconds(tmp_path):
+    path = str(tmp_path / "test.csv")
+    writer = Recording_Writer(path, max_seconds=0.05, fsync="never")
+    writer.start()
+    writer.write(0.0, 0.0, 1.6e9)
+    assert writer.flush(TIMEOUT)
+    time.sleep(0.1)
+    writer.write(1.0, 0.0, 1.6e9)
+    assert writer.flush(TIMEOUT)
+    files = writer.close()
+    assert files[:2] == [path, str(tmp_path / "test_part1.csv")]
+    assert [float(r[1]) for f in files for r in rows(f)] == [0.0, 1.0]
+
+
+def test_pool_writes_every_batch_in_time(tmp_path):
+    pool = Writer_Pool()
+    writers = [pool.writer(str(tmp_path / name), flush_interval=0.05, flush_size=1000, fsync="never")
+               for name in ("a.csv", "b.csv")]
+    for writer in writers:
+        writer.start()
+    writers[0].write(0.0, 1.0, 1.6e9)
+    writers[1].write(0.0, 2.0, 1.6e9)
+    # Nothing else arrives: the deadlines alone make the pool write the batches
+    assert wait_rows(str(tmp_path / "a.csv.partial"), 1)
+    assert wait_rows(str(tmp_path / "b.csv.partial"), 1)
+    assert pool.thread is not None
+    for writer in writers:
+        writer.close()
+    assert [r[2] for r in rows(str(tmp_path / "b.csv"))] == ["2.0"]
+    assert pool.writers == []
+
+
+@pytest.mark.parametrize("pooled", [False, True])
+def test_write_after_close_is_refused(tmp_path, pooled):
+    path = str(tmp_path / "test.csv")
+    writer = Writer_Pool().writer(path) if pooled else Recording_Writer(path)
+    with pytest.raises(RuntimeError):
+        writer.write(0.0, 0.0, 1.6e9)  # not started
+    writer.start()
+    writer.write(0.0, 0.0, 1.6e9)
+    writer.close()
+    with pytest.raises(RuntimeError):
+        writer.write(1.0, 0.0, 1.6e9)
+    assert len(rows(path)) == 1
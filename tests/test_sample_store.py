@@ -0,0 +1,47 @@
+# Reading the recording while the recording thread appends
+import threading
+
+import numpy as np
+
+from Press_Controller.Sample_Store import Sample_Store
+
+
+def test_columns_stay_aligned_while_the_ring_wraps():
+    store = Sample_Store(max_samples=1000)
+    done = threading.Event()
+
+    def record():
+        t = 0
+        while not done.is_set():
+            times = np.arange(t, t + 7, dtype=np.float64)
+            store.extend(times, 2 * times, times + 100, setpoint=times + 1)
+            t += 7
+
+    writer = threading.Thread(target=record)
+    writer.start()
+    try:
+        for _ in range(2000):
+            time_sec, force, setpoint, epoch = store.get_columns("Time_sec", "Force_kN", "Setpoint_kN", "Epoch")
+            assert len(time_sec) == len(force) == len(setpoint) == len(epoch)
+            store.extend([], [], [])  # the arrays returned must not change afterwards
+            assert np.array_equal(force, 2 * time_sec)
+            assert np.array_equal(setpoint, time_sec + 1)
+            assert np.array_equal(epoch, time_sec + 100)
+            if len(time_sec) > 1:
+                assert np.all(np.diff(time_sec) == 1)
+    finally:
+        done.set()
+        writer.join()
+    df = store.to_dataframe()
+    assert len(df) == 1000
+    assert np.array_equal(df["Force_kN"].to_numpy(), 2 * df["Time_sec"].to_numpy())
+
+
+def test_chunked_store_returns_every_sample():
+    store = Sample_Store(chunk_size=16)
+    for i in range(100):
+        store.append(float(i), 2.0 * i, epoch=1000.0 + i, setpoint=1.0)
+    time_sec, force, epoch = store.snapshot()
+    assert np.array_equal(time_sec, np.arange(100.0))
+    assert np.array_equal(force, 2 * time_sec)
+    assert np.array_equal(store.column("Setpoint_kN"), np.ones(100))
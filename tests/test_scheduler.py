@@ -0,0 +1,100 @@
+# Deterministic tests of Fixed_Rate_Scheduler and wait_next: the time is a virtual clock that only moves when the
+# scheduler sleeps or the test works
+import pytest
+
+from Press_Controller.Scheduler import Fixed_Rate_Scheduler, wait_next
+
+
+class Virtual_Clock:
+    def __init__(self, now=100.0):
+        self.now = now
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def make_scheduler(clock, period=0.1):
+    return Fixed_Rate_Scheduler(period, spin=0.0, clock=clock, sleep=clock.sleep)
+
+
+def test_deadlines_do_not_drift_with_the_work():
+    clock = Virtual_Clock()
+    scheduler = make_scheduler(clock)
+    deadlines = []
+    for _ in range(5):
+        deadlines.append(scheduler.wait())
+        clock.now += 0.03  # work done in every period
+    assert deadlines == pytest.approx([100.0, 100.1, 100.2, 100.3, 100.4])
+    assert scheduler.missed == 0
+    assert scheduler.ticks == 5
+
+
+def test_missed_periods_are_skipped_and_counted():
+    clock = Virtual_Clock()
+    scheduler = make_scheduler(clock)
+    scheduler.wait()
+    clock.now += 0.35  # the work took three periods and a half
+    deadline = scheduler.wait()
+    assert scheduler.missed == 2
+    assert deadline == pytest.approx(100.3)
+    assert scheduler.max_lateness == pytest.approx(0.05)
+
+
+def test_poll_does_not_block():
+    clock = Virtual_Clock()
+    scheduler = make_scheduler(clock)
+    assert scheduler.poll() == pytest.approx(100.0)
+    assert scheduler.poll() is None
+    clock.now += 0.1
+    assert scheduler.poll() == pytest.approx(100.1)
+    assert clock.sleeps == []
+
+
+def test_cancelled_wait_serves_no_deadline():
+    clock = Virtual_Clock()
+    scheduler = make_scheduler(clock)
+    scheduler.wait()
+    assert scheduler.wait(cancelled=lambda: True) is None
+    assert scheduler.ticks == 1
+    assert scheduler.next_deadline == pytest.approx(100.1)
+
+
+def test_achieved_rate_and_reset():
+    clock = Virtual_Clock()
+    scheduler = make_scheduler(clock, period=0.25)
+    for _ in range(9):
+        scheduler.wait()
+    assert scheduler.achieved_rate() == pytest.approx(4.0)
+    assert scheduler.jitter() == pytest.approx(0.0)
+    scheduler.reset()
+    assert scheduler.ticks == 0 and scheduler.next_deadline is None
+
+
+def test_the_period_has_to_be_positive():
+    with pytest.raises(ValueError):
+        Fixed_Rate_Scheduler(0)
+
+
+def test_wait_next_ticks_the_schedulers_that_are_due():
+    clock = Virtual_Clock()
+    fast = make_scheduler(clock, period=0.1)
+    slow = make_scheduler(clock, period=0.3)
+    ticks = {id(fast): 0, id(slow): 0}
+    for _ in range(20):
+        for scheduler in wait_next([fast, slow], max_wait=1.0):
+            ticks[id(scheduler)] += 1
+        if clock.now >= 100.6 - 1e-9:
+            break
+    assert ticks[id(fast)] == 7  # 100.0 ... 100.6
+    assert ticks[id(slow)] == 3  # 100.0, 100.3, 100.6
+
+
+def test_wait_next_without_schedulers_sleeps_max_wait():
+    clock = Virtual_Clock()
+    assert wait_next([], max_wait=0.5, sleep=clock.sleep) == []
+    assert clock.sleeps == [0.5]
@@ -0,0 +1,76 @@
+# Requests of the Service_Client to a Service_Server
+import os
+import socket
+import stat
+import threading
+
+import pytest
+
+from Press_Controller.Service import Service_Client, Service_Server
+
+
+class Slow_Service:
+    commands = ("echo", "slow")
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def echo(self, value):
+        return value
+
+    def slow(self):
+        self.release.wait(5.0)
+        return "late"
+
+
+@pytest.fixture
+def server(tmp_path):
+    service = Slow_Service()
+    server = Service_Server(service, path=str(tmp_path / "press.sock"))
+    server.start()
+    yield server
+    service.release.set()
+    server.stop()
+
+
+def test_response_repeats_the_request_id(server):
+    response = server.execute(b'{"cmd": "echo", "args": [3], "id": 12}')
+    assert response == {"ok": True, "result": 3, "id": 12}
+    assert "id" not in server.execute(b'{"cmd": "echo", "args": [3]}')
+
+
+def test_timeout_closes_the_connection_and_next_call_gets_its_own_response(server):
+    client = Service_Client(path=server.path, timeout=0.2)
+    with pytest.raises(OSError):
+        client.call("slow")
+    assert client.sock is None
+    server.service.release.set()  # the late response goes to the closed connection
+    client.timeout = 5.0
+    assert client.call("echo", 1) == 1
+    assert client.call("echo", 2) == 2
+    client.close()
+
+
+def test_socket_of_a_running_service_is_not_taken(server):
+    other = Service_Server(Slow_Service(), path=server.path)
+    with pytest.raises(RuntimeError):
+        other.start()
+    client = Service_Client(path=server.path, timeout=5.0)
+    assert client.call("echo", 4) == 4
+    client.close()
+
+
+def test_stale_socket_is_replaced_and_only_its_user_can_use_it(tmp_path):
+    path = str(tmp_path / "press.sock")
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(path)
+    stale.close()  # the file stays, nobody listens
+    server = Service_Server(Slow_Service(), path=path)
+    server.start()
+    try:
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+        client = Service_Client(path=path, timeout=5.0)
+        assert client.call("echo", 5) == 5
+        client.close()
+    finally:
+        server.stop()
@@ -0,0 +1,91 @@
+# Two dummy stations served by one Press_Service
+import os
+import time
+
+import pytest
+
+from Press_Controller.Metrics import METRICS
+from Press_Controller.Press_Controller import Press_Service
+
+TIMEOUT = 5.0  # only reached if a test fails
+SECOND = dict(name="B", is_Dummy=True, Pulse_channel_out=5, Enable_channel_out=6, Dir_channel_out=13,
+              Active_channel_in=19, balance_dt_pin=26, balance_sck_pin=16)
+
+
+@pytest.fixture
+def service():
+    service = Press_Service(stations=[dict(name="A", is_Dummy=True), SECOND], catalogue=False, supervisor=False)
+    yield service
+    service.shutdown()
+
+
+def wait_for(condition):
+    deadline = time.perf_counter() + TIMEOUT
+    while not condition():
+        assert time.perf_counter() < deadline
+        time.sleep(0.01)
+
+
+def counting(function, counts, key):
+    def wrapper(*args, **kwargs):
+        counts[key] += 1
+        return function(*args, **kwargs)
+    return wrapper
+
+
+def test_stations_share_no_pin(service):
+    with pytest.raises(ValueError):
+        service.add_station(dict(SECOND, name="C"))
+    assert service.stations() == ["A", "B"]
+
+
+def test_force_control_of_one_station(service):
+    a, b = service.station("A"), service.station("B")
+    steps = {"A": 0, "B": 0}
+    for station in (a, b):
+        station.control_step = counting(station.control_step, steps, station.name)
+    service.setup_init()
+    service.start_force(1.0, station="A")
+    assert a.controlling and not b.controlling
+    assert service.force_thread_status == "running"
+    wait_for(lambda: steps["A"] >= 5)
+    assert steps["B"] == 0
+    service.stop_force(station="A")
+    assert not a.controlling
+    wait_for(lambda: service.force_thread_status == "paused")
+
+
+def test_recordings_of_every_station(service, tmp_path):
+    a, b = service.station("A"), service.station("B")
+    service.set_folder(str(tmp_path))
+    service.setup_init()
+    service.start_record(0.01, station="A")
+    service.start_record(0.02, station="B")
+    wait_for(lambda: len(a.samples) >= 10 and len(b.samples) >= 10)
+    service.pause_record(station="A")
+    # A record step of A that was running at the pause can still add its sample
+    wait_for(lambda: len(b.samples) >= len(a.samples) + 10)
+    recorded = len(a.samples)
+    wait_for(lambda: len(b.samples) >= 2 * recorded)
+    assert len(a.samples) == recorded
+    service.pause_record(station="B")
+
+    saved_a = service.save_data(station="A")
+    saved_b = service.save_data(station="B")
+    assert [os.path.basename(f)[:2] for f in saved_a + saved_b] == ["A_", "B_"]
+    assert sorted(os.listdir(tmp_path)) == sorted(os.path.basename(f) for f in saved_a + saved_b)
+    for files, station in ((saved_a, a), (saved_b, b)):
+        with open(files[0]) as f:
+            assert len(f.readlines()) == 1 + len(station.samples)
+
+
+def test_remove_station(service):
+    gauges = ("sensor_rate", "sensor_errors", "samples")
+    assert all(prefix + g in METRICS.gauges for prefix in ("A_", "B_") for g in gauges)
+    b = service.remove_station("B")
+    assert service.stations() == ["A"]
+    assert not any(name in METRICS.gauges for name in ("B_" + g for g in gauges))
+    assert all("A_" + g in METRICS.gauges for g in gauges)
+    assert b.balance.engine.thread_status == "stopped"
+    with pytest.raises(ValueError):
+        service.remove_station("A")
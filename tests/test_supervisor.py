@@ -0,0 +1,117 @@
+# Fault injection on the simulated press: every trip of the Safety_Supervisor has to cut the pulses and the enable,
+# and stopping the press has to work while the force control hangs
+import time
+
+import pytest
+
+from Press_Controller.Press_Controller import Press_Service
+from Press_Controller.Supervisor import SUPERVISOR_FAULTS
+
+from .faults import Fault_Injector
+
+LIMITS = {"max_force": 4.0, "max_rate": 5.0, "sensor_timeout": 0.25, "heartbeat_timeout": 0.5, "period": 0.005}
+TIMEOUT = 3.0
+
+
+@pytest.fixture
+def press(request):
+    """
+    Service of a dummy press with the force control running at 2 kN, and the injector of its faults
+    """
+    runtime, limits = getattr(request, "param", ("threads", {}))
+    service = Press_Service(is_Dummy=True, runtime=runtime, catalogue=False, supervisor=dict(LIMITS, **limits))
+    station = service.station()
+    faults = Fault_Injector(station)
+    service.setup_init()
+    station.enable.on()
+    service.start_force(2.0)
+    yield service, station, faults
+    service.shutdown()  # before releasing the faults: the shutdown must not depend on it
+    faults.clear()
+
+
+def wait_trip(service, timeout=TIMEOUT):
+    start = time.perf_counter()
+    while not service.supervisor.trips and time.perf_counter() - start < timeout:
+        time.sleep(0.001)
+    return service.supervisor.trips[0] if service.supervisor.trips else None
+
+
+def is_cut(station):
+    return not station.pulse.pulses().running and not station.enable.state()
+
+
+# Case -> (runtime, limits changed, settle seconds, injection, faults accepted). A jump of the force also trips the
+# rate, so it is off for the overload. With the asyncio runtime a hung control step blocks the event loop, where the
+# sensor is read too, so the stall is caught as a stale sensor
+cases = {"overload": ("threads", {"max_rate": None}, 0.5, lambda f: f.force_jump(4.0), {"overload"}),
+         "force_rate": ("threads", {}, 1.5, lambda f: f.force_jump(1.5), {"force_rate"}),
+         "sensor_stale": ("threads", {}, 0.5, lambda f: f.freeze_sensor(), {"sensor_stale"}),
+         "control_stall": ("threads", {}, 0.5, lambda f: f.stall_control(), {"control_stall"}),
+         "overload_asyncio": ("asyncio", {"max_rate": None}, 0.5, lambda f: f.force_jump(4.0), {"overload"}),
+         "control_stall_asyncio": ("asyncio", {}, 0.5, lambda f: f.stall_control(),
+                                   {"control_stall", "sensor_stale"})}
+
+
+@pytest.mark.parametrize("press, settle, inject, expected",
+                         [((runtime, limits), settle, inject, expected)
+                          for runtime, limits, settle, inject, expected in cases.values()],
+                         ids=list(cases), indirect=["press"])
+def test_fault_trips_and_cuts_the_drive(press, settle, inject, expected):
+    service, station, faults = press
+    time.sleep(settle)
+    assert service.supervisor.trips == []
+    inject(faults)
+    trip = wait_trip(service)
+    assert trip is not None and trip["fault"] in expected
+    assert trip["latency"] < 0.05  # from the condition being true to the cut, the period is 5 ms
+    assert is_cut(station)
+    assert trip["fault"] in station.faults
+    assert not station.controlling
+
+
+def test_no_trip_while_the_control_works(press):
+    service, station, faults = press
+    time.sleep(1.5)
+    assert service.supervisor.trips == []
+    assert service.supervisor.status()["checks"] > 100
+
+
+def test_trip_is_latched_until_the_faults_are_reset(press):
+    service, station, faults = press
+    time.sleep(0.5)
+    faults.force_jump(4.0)
+    assert wait_trip(service) is not None
+    faults.clear()
+    with pytest.raises(Exception, match="reset the faults"):
+        service.start_force(2.0)
+    service.reset_faults()
+    assert not set(SUPERVISOR_FAULTS) & station.faults
+    station.enable.on()
+    service.start_force(2.0)
+    assert station.controlling
+
+
+@pytest.mark.parametrize("press", [("threads", {}), ("asyncio", {})], ids=["threads", "asyncio"], indirect=True)
+@pytest.mark.parametrize("stop", ["stop_all", "shutdown"])
+def test_stop_returns_while_the_control_step_hangs(press, stop):
+    service, station, faults = press
+    service.set_limits(heartbeat_timeout=None, sensor_timeout=None)  # only the stop cuts the drive here
+    time.sleep(0.3)
+    faults.stall_control()
+    time.sleep(0.2)
+    start = time.perf_counter()
+    getattr(service, stop)()
+    assert time.perf_counter() - start < 6.0
+    assert is_cut(station)
+    assert service.supervisor.trips == []
+
+
+def test_limits_are_checked(press):
+    service, station, faults = press
+    with pytest.raises(ValueError):
+        service.set_limits(max_speed=1.0)
+    with pytest.raises(ValueError):
+        service.set_limits("no station", max_force=1.0)
+    assert service.set_limits(station.name, max_force=3.0)["max_force"] == 3.0
+    assert service.supervisor_status()["limits"][station.name]["max_force"] == 3.0
@@ -0,0 +1,194 @@
+# Tests of Worker and Worker_Scheduler. The tasks are synchronized with events instead of sleeps, so the results do
+# not depend on the speed of the machine
+import threading
+import time
+
+import pytest
+
+from Press_Controller.Press_Controller import Press_Service
+from Press_Controller.Workers import Worker, Worker_Scheduler
+
+TIMEOUT = 5.0  # only reached if a test fails
+
+
+class Blocking_Task:
+    """
+    Task that tells when it starts and waits until it is released
+    """
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.runs = 0
+
+    def __call__(self):
+        self.runs += 1
+        self.started.set()
+        assert self.release.wait(TIMEOUT)
+
+
+@pytest.fixture
+def workers():
+    created = []
+
+    def make(*args, **kwargs):
+        worker = Worker(*args, **kwargs)
+        created.append(worker)
+        return worker
+
+    yield make
+    for worker in created:
+        worker.stop(timeout=TIMEOUT)
+
+
+def test_triggered_worker_runs_once_per_trigger(workers):
+    done = threading.Semaphore(0)
+    worker = workers("triggered", done.release, triggered=True)
+    worker.start()
+    assert not done.acquire(timeout=0.05)
+    for _ in range(3):
+        worker.trigger()
+        assert done.acquire(timeout=TIMEOUT)
+    assert worker.runs == 3
+
+
+def test_pause_waits_for_the_running_task(workers):
+    task = Blocking_Task()
+    worker = workers("blocking", task)
+    worker.start()
+    assert task.started.wait(TIMEOUT)
+    threading.Timer(0.05, task.release.set).start()
+    assert worker.pause() is True
+    assert not worker.busy
+    assert worker.state == 'paused'
+
+
+def test_pause_gives_up_on_a_task_that_hangs(workers):
+    # A hung task must not block the caller (stop_all of the press) forever
+    task = Blocking_Task()
+    worker = workers("hung", task)
+    worker.start()
+    assert task.started.wait(TIMEOUT)
+    start = time.perf_counter()
+    assert worker.pause(timeout=0.1) is False
+    assert time.perf_counter() - start < 1.0
+    assert worker.state == 'paused' and worker.busy
+    task.release.set()
+    assert worker.pause(timeout=TIMEOUT) is True
+
+
+def test_paused_worker_does_not_run_nor_read_the_clock(workers):
+    calls = []
+
+    def clock():
+        calls.append(1)
+        return time.perf_counter()
+
+    done = threading.Semaphore(0)
+    worker = workers("periodic", done.release, period=0.001, clock=clock, spin=0.0)
+    worker.start()
+    assert done.acquire(timeout=TIMEOUT)
+    worker.pause()
+    runs, reads = worker.runs, len(calls)
+    time.sleep(0.05)
+    assert (worker.runs, len(calls)) == (runs, reads)  # idle: waiting on the condition, not polling
+    worker.resume()
+    # runs is counted after the task returns: wait for it rather than for the task
+    deadline = time.perf_counter() + TIMEOUT
+    while worker.runs <= runs:
+        assert time.perf_counter() < deadline
+        time.sleep(0.001)
+
+
+def test_pause_from_the_task_itself_does_not_deadlock(workers):
+    paused = threading.Event()
+
+    def task():
+        worker.pause()
+        paused.set()
+
+    worker = workers("self-pausing", task)
+    worker.start()
+    assert paused.wait(TIMEOUT)
+    assert worker.state == 'paused'
+
+
+def test_errors_are_counted_and_the_worker_goes_on(workers):
+    done = threading.Semaphore(0)
+
+    def task():
+        done.release()
+        raise RuntimeError("sensor")
+
+    worker = workers("failing", task, triggered=True)
+    worker.start()
+    for _ in range(2):
+        worker.trigger()
+        assert done.acquire(timeout=TIMEOUT)
+    worker.pause(timeout=TIMEOUT)
+    assert worker.errors == 2 and worker.runs == 0
+
+
+def test_stop_ends_the_thread(workers):
+    worker = workers("idle", lambda: None, triggered=True)
+    worker.start()
+    assert worker.stop(timeout=TIMEOUT) is True
+    assert not worker.thread.is_alive()
+    assert worker.state == 'stopped'
+
+
+def test_scheduler_reports_the_workers_that_do_not_end():
+    scheduler = Worker_Scheduler()
+    task = Blocking_Task()
+    scheduler.add("hung", task)
+    scheduler.add("idle", lambda: None, triggered=True)
+    with pytest.raises(ValueError):
+        scheduler.add("idle", lambda: None)
+    for worker in scheduler.workers.values():
+        worker.start()
+    assert task.started.wait(TIMEOUT)
+    assert scheduler.pause_all(timeout=0.1) == ["hung"]
+    assert scheduler.stop_all(timeout=0.1) == ["hung"]
+    assert scheduler.states() == {"hung": 'stopped', "idle": 'stopped'}
+    task.release.set()
+    assert scheduler.stop_all(timeout=TIMEOUT) == []
+
+
+class Racing_Station:
+    """
+    Station that starts to control right after the force worker saw that nobody was controlling
+    """
+    def __init__(self, service):
+        self.service = service
+        self.reads = 0
+        self.steps = 0
+
+    @property
+    def controlling(self):
+        self.reads += 1
+        if self.reads == 1:
+            # start_force() in another thread: the worker is still running, so start() does nothing
+            self.service.force_worker.start()
+            return False
+        return True
+
+    def control_step(self):
+        self.steps += 1
+
+
+def test_force_worker_is_not_left_paused_by_a_start_during_its_check():
+    service = Press_Service(is_Dummy=True, catalogue=False, supervisor=False)
+    stations = service.stations_by_name
+    station = Racing_Station(service)
+    service.stations_by_name = {"A": station}
+    try:
+        service.force_worker.state = 'running'  # as seen from its own step
+        service.force()
+        assert service.force_worker.state == 'running'
+        start = time.perf_counter()
+        while station.steps == 0 and time.perf_counter() - start < TIMEOUT:
+            time.sleep(0.001)
+        assert station.steps > 0
+    finally:
+        service.force_worker.stop(TIMEOUT)
+        service.stations_by_name = stations
+        service.shutdown()